@@ -6,25 +6,26 @@ from pathlib import Path
 from pydantic import BaseModel
 from typing import List
 from google.cloud import aiplatform
-from google.auth import default
-import google.auth.transport.requests
 from PIL import Image
 import io
 import base64
 from datetime import datetime, timedelta
+from src.services.vertex_client import get_vertex_client, VERTEX_CONNECT_TIMEOUT, VERTEX_READ_TIMEOUT
+from src.services.google_credentials import get_credential_provider
 
 
 load_dotenv()  # This will automatically find .env in the project root or use environment variables
 PROJECT_ID = os.getenv("PROJECT_ID")
-GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 
-def identify_object_from_image(image_url=None, image_path=None):
+def identify_object_from_image(image_url=None, image_path=None, image_bytes=None, mime_type="image/jpeg"):
     """
     Use Google Vertex AI Gemini model to identify objects in an image
     
     Args:
-        image_url (str, optional): URL to an image
+        image_url (str, optional): URL to an image (a `data:` URL is decoded in place)
         image_path (str, optional): Local path to an image file
+        image_bytes (bytes, optional): Encoded image already in memory, e.g. an upload
+        mime_type (str): MIME type of `image_bytes`
         
     Returns:
         dict: Response with items and their expiration dates
@@ -32,23 +33,34 @@ def identify_object_from_image(image_url=None, image_path=None):
     if not PROJECT_ID:
         raise ValueError("PROJECT_ID not found in environment variables")
     
-    if not GOOGLE_APPLICATION_CREDENTIALS:
-        raise ValueError("GOOGLE_APPLICATION_CREDENTIALS not found in environment variables")
-    
-    if image_url is None and image_path is None:
-        raise ValueError("Either image_url or image_path must be provided")
-    
-    # Set up authentication
-    os.environ["GOOGLE_APPLICATION_CREDENTIALS"] = GOOGLE_APPLICATION_CREDENTIALS
+    if image_url is None and image_path is None and image_bytes is None:
+        raise ValueError("One of image_url, image_path or image_bytes must be provided")
     
     try:
-        # Get credentials and create authenticated session
-        credentials, _ = default()
-        auth_req = google.auth.transport.requests.Request()
-        credentials.refresh(auth_req)
+        # Cached token from the shared provider (service-account file or ADC); refreshed in the background, not per image
+        access_token = get_credential_provider().get_token()
+        if not access_token:
+            raise ValueError("Could not obtain a Google Cloud access token")
         
         # Prepare the image data
-        if image_path:
+        if image_url and image_url.startswith("data:") and "base64," in image_url:
+            # Inline data URL: already base64, nothing to download
+            header, image_data = image_url.split("base64,", 1)
+            image_part = {
+                "inlineData": {
+                    "mimeType": header[len("data:"):].rstrip(";") or "image/jpeg",
+                    "data": image_data
+                }
+            }
+        elif image_bytes is not None:
+            # In-memory upload: base64 only for the request body
+            image_part = {
+                "inlineData": {
+                    "mimeType": mime_type,
+                    "data": base64.b64encode(image_bytes).decode('utf-8')
+                }
+            }
+        elif image_path:
             # For local images, encode as base64
             with open(image_path, "rb") as image_file:
                 image_data = base64.b64encode(image_file.read()).decode('utf-8')
@@ -72,7 +84,7 @@ def identify_object_from_image(image_url=None, image_path=None):
             }
         else:
             # For image URLs, we need to download and encode
-            response = requests.get(image_url)
+            response = requests.get(image_url, timeout=(VERTEX_CONNECT_TIMEOUT, VERTEX_READ_TIMEOUT))
             if response.status_code == 200:
                 image_data = base64.b64encode(response.content).decode('utf-8')
                 # Try to determine MIME type from response headers
@@ -116,16 +128,9 @@ def identify_object_from_image(image_url=None, image_path=None):
             }
         }
         
-        # Make the API request to Vertex AI
-        url = f"https://aiplatform.googleapis.com/v1/projects/{PROJECT_ID}/locations/global/publishers/google/models/gemini-2.0-flash:generateContent"
-        
-        headers = {
-            "Authorization": f"Bearer {credentials.token}",
-            "Content-Type": "application/json"
-        }
-        
+        # Make the API request to Vertex AI over the shared keep-alive session
         print("Sending request to Vertex AI Gemini...")
-        response = requests.post(url, headers=headers, json=payload)
+        response = get_vertex_client().generate_content(PROJECT_ID, "gemini-2.0-flash", payload, access_token)
         
         if response.status_code != 200:
             print(f"Error: {response.status_code} - {response.text}")
@@ -0,0 +1,292 @@
+# backend/src/helper/image_ingress.py
+"""
+In-memory ingress for uploaded images.
+
+An upload is read into memory once and decoded at most once; the same bytes and the
+same PIL image are then shared by the similarity search, Gemini identification and
+vector storage, with no temporary files in between.
+
+Decoding also normalises the image: EXIF orientation is applied, JPEGs are decoded in
+draft mode at the smallest DCT scale that still covers what is needed, and two outputs
+are produced once per upload - a bounded working image for CLIP and a size-capped
+re-encoded payload for Vertex and storage.
+"""
+import base64
+import io
+import os
+import threading
+import time
+from PIL import Image, ImageOps
+from src.services.model_registry import ENCODER_INPUT_SHORT_SIDE, prepare_encoder_image
+
+# Long side of the re-encoded payload sent to Vertex and stored on items; 0 sends the upload as-is
+INGRESS_PAYLOAD_MAX_SIDE = int(os.getenv("INGRESS_PAYLOAD_MAX_SIDE", "1536"))
+INGRESS_PAYLOAD_FORMAT = os.getenv("INGRESS_PAYLOAD_FORMAT", "JPEG").upper()  # JPEG or WEBP
+INGRESS_PAYLOAD_QUALITY = int(os.getenv("INGRESS_PAYLOAD_QUALITY", "85"))
+
+_PAYLOAD_MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF8", "image/gif"),
+)
+
+
+def sniff_mime_type(data, default="image/jpeg"):
+    """Return the MIME type implied by the image's magic bytes."""
+    for signature, mime_type in _SIGNATURES:
+        if data.startswith(signature):
+            return mime_type
+    if data[:4] == b"RIFF" and data[8:12] == b"WEBP":
+        return "image/webp"
+    return default
+
+
+class _IngressStats:
+    """Process-wide totals for /debug, plus the calibration used to estimate decode time saved."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.images = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.normalize_ms = 0.0
+        self.estimated_ms_saved = 0.0
+        self.full_decode_ms_per_mp = None
+
+    def record(self, stats):
+        with self._lock:
+            self.images += 1
+            self.bytes_in += stats["source_bytes"]
+            self.bytes_out += stats["payload_bytes"]
+            self.normalize_ms += stats["normalize_ms"]
+            self.estimated_ms_saved += stats["estimated_decode_ms_saved"] or 0.0
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                "images": self.images,
+                "bytes_in": self.bytes_in,
+                "bytes_out": self.bytes_out,
+                "bytes_saved": self.bytes_in - self.bytes_out,
+                "avg_normalize_ms": round(self.normalize_ms / self.images, 2) if self.images else None,
+                "estimated_decode_ms_saved": round(self.estimated_ms_saved, 1),
+                "full_decode_ms_per_mp": round(self.full_decode_ms_per_mp, 2) if self.full_decode_ms_per_mp else None,
+                "clip_short_side": ENCODER_INPUT_SHORT_SIDE,
+                "payload_max_side": INGRESS_PAYLOAD_MAX_SIDE,
+                "payload_format": INGRESS_PAYLOAD_FORMAT,
+            }
+
+
+_stats = _IngressStats()
+
+
+def get_ingress_stats():
+    """Return totals for every image normalised by this process."""
+    return _stats.snapshot()
+
+
+def calibrate_decode_cost(size=(2000, 1500)):
+    """
+    Measure the per-megapixel cost of a full-resolution JPEG decode on this machine.
+
+    Run once from the startup warm-up (never on the request path); until it has run,
+    uploads report their measured decode time but no estimated saving.
+
+    Returns:
+        float: Milliseconds per megapixel
+    """
+    width, height = size
+    # Noise plus a gradient roughly matches the entropy of a photo, which drives decode cost
+    noise = Image.effect_noise(size, 48)
+    gradient = Image.linear_gradient("L").resize(size)
+    image = Image.merge("RGB", (noise, gradient, Image.blend(noise, gradient, 0.5)))
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    data = buffer.getvalue()
+
+    Image.open(io.BytesIO(data)).load()  # Warm the codec before timing
+    start = time.perf_counter()
+    Image.open(io.BytesIO(data)).load()
+    ms_per_mp = (time.perf_counter() - start) * 1000 / (width * height / 1e6)
+    with _stats._lock:
+        _stats.full_decode_ms_per_mp = ms_per_mp
+    print(f"Ingress: full JPEG decode costs {ms_per_mp:.1f} ms per megapixel")
+    return ms_per_mp
+
+
+def _required_scale(size):
+    """Return the smallest scale (<= 1) of `size` that still covers both the CLIP and the payload output."""
+    clip_scale = ENCODER_INPUT_SHORT_SIDE / min(size) if ENCODER_INPUT_SHORT_SIDE else 1.0
+    payload_scale = INGRESS_PAYLOAD_MAX_SIDE / max(size) if INGRESS_PAYLOAD_MAX_SIDE else 1.0
+    return min(1.0, max(clip_scale, payload_scale))
+
+
+def _scaled(size, scale):
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+class IngressImage:
+    """
+    An uploaded image: its raw bytes plus the lazily normalised working image and payload.
+
+    `image` feeds the similarity search and vector storage; `payload` (with
+    `payload_mime_type`) is what goes to Vertex and onto the stored item. `stats` holds the
+    per-request byte and time savings once normalised. There is deliberately no base64 accessor: bytes travel as bytes and are only
+    base64-encoded where a JSON body is built (the Vertex request, API responses).
+
+    Args:
+        data (bytes): Encoded image bytes as uploaded
+        mime_type (str, optional): MIME type reported by the client, used if the bytes aren't recognised
+    """
+
+    def __init__(self, data, mime_type=None):
+        if not data:
+            raise ValueError("Empty image upload")
+        self.data = data
+        self._mime_type = mime_type
+        self._image = None
+        self._payload = None
+        self._payload_mime_type = None
+        self.stats = None
+
+    @property
+    def image(self):
+        """The working image for CLIP: EXIF-rotated, RGB, short side bounded (normalised on first access)."""
+        if self._image is None:
+            self._normalize()
+        return self._image
+
+    @property
+    def payload(self):
+        """Size-capped encoded bytes for the Vertex request and item storage."""
+        if self._payload is None:
+            self._normalize()
+        return self._payload
+
+    @property
+    def payload_mime_type(self):
+        if self._payload is None:
+            self._normalize()
+        return self._payload_mime_type
+
+    @property
+    def mime_type(self):
+        fallback = self._mime_type if self._mime_type and self._mime_type.startswith("image/") else "image/jpeg"
+        return sniff_mime_type(self.data, fallback)
+
+    def _normalize(self):
+        start = time.perf_counter()
+        image = Image.open(io.BytesIO(self.data))
+        source_size = image.size
+        source_format = image.format
+        orientation = image.getexif().get(0x0112, 1)
+
+        # Decode only as many pixels as the larger of the two outputs needs
+        needed = _required_scale(source_size)
+        if source_format == "JPEG" and needed < 1.0:
+            image.draft("RGB", _scaled(source_size, needed))
+        decoded_size = image.size
+
+        decode_start = time.perf_counter()
+        image.load()
+        decode_ms = (time.perf_counter() - decode_start) * 1000
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        # Resize before rotating so the transpose touches fewer pixels
+        payload_image = image
+        if INGRESS_PAYLOAD_MAX_SIDE and max(image.size) > INGRESS_PAYLOAD_MAX_SIDE:
+            payload_image = image.resize(_scaled(image.size, INGRESS_PAYLOAD_MAX_SIDE / max(image.size)), Image.BICUBIC)
+        rotated = orientation != 1
+        if rotated:
+            payload_image = ImageOps.exif_transpose(payload_image)
+
+        if INGRESS_PAYLOAD_MAX_SIDE and (payload_image is not image or self.mime_type not in _PAYLOAD_MIME_TYPES.values()):
+            buffer = io.BytesIO()
+            payload_format = INGRESS_PAYLOAD_FORMAT if INGRESS_PAYLOAD_FORMAT in _PAYLOAD_MIME_TYPES else "JPEG"
+            payload_image.save(buffer, format=payload_format, quality=INGRESS_PAYLOAD_QUALITY)
+            self._payload = buffer.getvalue()
+            self._payload_mime_type = _PAYLOAD_MIME_TYPES[payload_format]
+        if self._payload is None or len(self._payload) >= len(self.data) and not rotated:
+            # Small uploads: the original is already the cheapest thing to send
+            self._payload = self.data
+            self._payload_mime_type = self.mime_type
+
+        # The working image comes from the payload-sized one when that is at least as large as CLIP needs
+        if ENCODER_INPUT_SHORT_SIDE and min(payload_image.size) >= ENCODER_INPUT_SHORT_SIDE:
+            image = payload_image
+        elif rotated:
+            image = ImageOps.exif_transpose(image)
+        # The encoders' own preprocessing, so they receive this image unchanged
+        image = prepare_encoder_image(image)
+        self._image = image
+
+        self.stats = {
+            "source_bytes": len(self.data),
+            "payload_bytes": len(self._payload),
+            "bytes_saved": len(self.data) - len(self._payload),
+            "source_size": list(source_size),
+            "decoded_size": list(decoded_size),
+            "working_size": list(image.size),
+            "decode_ms": round(decode_ms, 2),
+            "normalize_ms": round((time.perf_counter() - start) * 1000, 2),
+            "estimated_decode_ms_saved": self._estimate_decode_ms_saved(source_format, source_size,
+                                                                         decoded_size, decode_ms),
+        }
+        _stats.record(self.stats)
+        print(f"Ingress: {self.stats['source_bytes'] / 1024:.0f} KB {source_size[0]}x{source_size[1]} -> "
+              f"payload {self.stats['payload_bytes'] / 1024:.0f} KB, working {image.size[0]}x{image.size[1]} "
+              f"in {self.stats['normalize_ms']:.0f} ms (saved {self.stats['bytes_saved'] / 1024:.0f} KB, "
+              f"~{self.stats['estimated_decode_ms_saved'] or 0:.0f} ms decode)")
+
+    def _estimate_decode_ms_saved(self, source_format, source_size, decoded_size, decode_ms):
+        """
+        Estimate decode time saved by draft mode against a full-resolution decode.
+
+        Uses the per-megapixel cost measured by calibrate_decode_cost at warm-up; returns
+        None (no estimate) if that has not run, so no upload ever pays for a full decode.
+        """
+        if source_format != "JPEG" or decoded_size == source_size:
+            return 0.0
+        if _stats.full_decode_ms_per_mp is None:
+            return None
+        source_mp = source_size[0] * source_size[1] / 1e6
+        return round(max(0.0, _stats.full_decode_ms_per_mp * source_mp - decode_ms), 2)
+
+    def __len__(self):
+        return len(self.data)
+
+
+def read_upload(file_storage):
+    """
+    Read a werkzeug FileStorage upload into memory.
+
+    Returns:
+        IngressImage: The upload's bytes, decodable on demand
+    """
+    return IngressImage(file_storage.read(), file_storage.mimetype or None)
+
+
+def from_base64(base64_image):
+    """
+    Build an IngressImage from base64 text, with or without a `data:image/...;base64,` prefix.
+
+    Returns:
+        IngressImage: The decoded bytes
+    """
+    mime_type = None
+    if base64_image.startswith("data:") and "base64," in base64_image:
+        header, base64_image = base64_image.split("base64,", 1)
+        mime_type = header[len("data:"):].rstrip(";") or None
+    return IngressImage(base64.b64decode(base64_image), mime_type)
+
+
+def as_ingress_image(image):
+    """Accept an IngressImage, raw bytes or base64 text and return an IngressImage (None stays None)."""
+    if image is None or isinstance(image, IngressImage):
+        return image
+    if isinstance(image, (bytes, bytearray)):
+        return IngressImage(bytes(image))
+    return from_base64(image)
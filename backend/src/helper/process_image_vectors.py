@@ -1,66 +1,40 @@
-import os
-import tempfile
-import base64
-from PIL import Image
 from datetime import datetime, timedelta
+from pymongo import ReturnDocument
 from src.db_connector import get_db_instance
-from src.models.item import Item
+from src.models.item import Item, normalize_quantity
+from src.services.image_store import get_image_store
 from src.services.image_vector_service import ImageVectorService
+from src.helper.image_ingress import as_ingress_image
 
-def save_base64_image(base64_image, prefix="img"):
-    """
-    Save a base64 image to a temporary file.
-    
-    Args:
-        base64_image (str): Base64 encoded image
-        prefix (str): Prefix for the temporary file
-        
-    Returns:
-        str: Path to the saved image file
-    """
-    # Create a temporary file
-    temp_file = tempfile.NamedTemporaryFile(prefix=prefix, suffix=".jpg", delete=False)
-    temp_file.close()
-    
-    # Decode base64 string and save to file
-    try:
-        # Remove data:image/jpeg;base64, if present
-        if "base64," in base64_image:
-            base64_image = base64_image.split("base64,")[1]
-        
-        with open(temp_file.name, "wb") as f:
-            f.write(base64.b64decode(base64_image))
-        
-        return temp_file.name
-    except Exception as e:
-        print(f"Error saving base64 image: {str(e)}")
-        if os.path.exists(temp_file.name):
-            os.unlink(temp_file.name)
-        raise
+# Shared across calls; the CLIP model itself comes from the process-wide registry
+vector_service = ImageVectorService()
 
-def process_image_pair(first_image_base64=None, second_image_base64=None):
+def process_image_pair(first_image=None, second_image=None):
     """
     Process a pair of images (adding to fridge and removing from fridge).
     
     Args:
-        first_image_base64 (str): Base64 encoded image of items being added to fridge
-        second_image_base64 (str): Base64 encoded image of items being removed from fridge, or None
+        first_image (IngressImage or str): Image of items being added to fridge (base64 text is accepted too)
+        second_image (IngressImage or str): Image of items being removed from fridge, or None
         
     Returns:
         dict: Results of processing
     """
     results = {"added": [], "removed": [], "errors": [], "updated": []}
     db = get_db_instance()
-    vector_service = ImageVectorService()
     
     try:
+        first_image = as_ingress_image(first_image)
+        second_image = as_ingress_image(second_image)
+        
         # Process first image (adding to fridge)
-        if first_image_base64:
+        if first_image:
             print("Processing first image (items being added to fridge)...")
-            first_image_path = save_base64_image(first_image_base64, prefix="add_")
             
             # Check if the image is already in the database
-            similar_images = vector_service.search_similar_images(first_image_path, limit=1, threshold=0.75)
+            similar_images, first_image_embedding = vector_service.search_similar_images(
+                first_image.image, limit=1, threshold=0.75, return_embedding=True
+            )
             
             if similar_images:
                 # Image already exists, use stored information
@@ -70,17 +44,11 @@ def process_image_pair(first_image_base64=None, second_image_base64=None):
                 expiration_period = similar_item.get("expirationPeriod", 7)  # Default to 7 days
                 
                 # Check if item already exists in inventory
-                existing_item = db.items.find_one({"name": item_name.lower()})
+                existing_item = db.items.find_one({"name": item_name.lower()}, {"quantity": 1})
                 
                 if existing_item:
                     # Item exists in inventory - calculate proposed update
-                    current_quantity = existing_item.get("quantity", 0)
-                    # Convert to int if it's stored as string
-                    if isinstance(current_quantity, str):
-                        try:
-                            current_quantity = int(current_quantity)
-                        except (ValueError, TypeError):
-                            current_quantity = 0
+                    current_quantity = normalize_quantity(existing_item.get("quantity"), default=0)
                     new_quantity = current_quantity + 1
                     
                     # Instead of updating the database, just return the proposed update
@@ -99,16 +67,14 @@ def process_image_pair(first_image_base64=None, second_image_base64=None):
                     # Calculate expiration date
                     expiration_date = datetime.utcnow() + timedelta(days=expiration_period)
                     
-                    # Add to items collection with image data
+                    # Add to items collection, referencing the photo in the image store
                     new_item = Item(
                         name=item_name.lower(),
                         quantity=1,
                         expiration_date=expiration_date.isoformat(),
-                        image_data=first_image_base64  # Store the base64 image data
+                        image_hash=get_image_store(db).put(first_image.payload, first_image.payload_mime_type)
                     )
-                    item_dict = new_item.to_dict()
-                    if "_id" in item_dict:
-                        del item_dict["_id"]
+                    item_dict = new_item.to_document()
                     
                     db.items.insert_one(item_dict)
                     results["added"].append(item_name)
@@ -116,71 +82,57 @@ def process_image_pair(first_image_base64=None, second_image_base64=None):
                 # Image not in database, let Perplexity process it
                 print("Image not found in database, use Perplexity for identification")
                 # Don't do anything here - return special flag so upload_image knows to continue with Perplexity
-                results["need_ai"] = first_image_path
+                results["need_ai"] = True
+                # Hand the query embedding back so storing the vector doesn't re-encode the image
+                results["need_ai_embedding"] = first_image_embedding
                 
                 # Note: After Perplexity identifies the item, we need to store it in the vector index
                 # This will be handled in the upload-image route after perplexity processing
         
         # Process second image (removing from fridge)
-        if second_image_base64:
+        if second_image:
             print("Processing second image (items being removed from fridge)...")
-            second_image_path = save_base64_image(second_image_base64, prefix="remove_")
             
             # Identify the item using vector search
-            similar_images = vector_service.search_similar_images(second_image_path, limit=1, threshold=0.7)
+            similar_images = vector_service.search_similar_images(second_image.image, limit=1, threshold=0.7)
             
             if similar_images:
                 # Found similar image, check quantity before removing
                 similar_item = similar_images[0]
                 item_name = similar_item.get("name")
                 
-                # Find the item in the database
-                existing_item = db.items.find_one({"name": item_name.lower()})
+                # Decrement atomically; the item is removed below only if this took it to zero
+                existing_item = db.items.find_one_and_update(
+                    {"name": item_name.lower(), "quantity": {"$gt": 0}},
+                    {"$inc": {"quantity": -1}},
+                    projection={"quantity": 1},
+                    return_document=ReturnDocument.AFTER
+                )
                 
                 if existing_item:
-                    current_quantity = existing_item.get("quantity", 0)
-                    # Convert to int if it's stored as string
-                    if isinstance(current_quantity, str):
-                        try:
-                            current_quantity = int(current_quantity)
-                        except (ValueError, TypeError):
-                            current_quantity = 0
-                    
-                    if current_quantity > 1:
-                        # Update quantity instead of removing
-                        new_quantity = current_quantity - 1
-                        update_result = db.items.update_one(
-                            {"name": item_name.lower()},
-                            {"$set": {"quantity": new_quantity}}
-                        )
-                        
-                        if update_result.modified_count > 0:
-                            results["updated"].append({
-                                "name": item_name,
-                                "new_quantity": new_quantity,
-                                "old_quantity": current_quantity,
-                                "item_id": str(existing_item["_id"])
-                            })
-                            print(f"Updated {item_name} quantity from {current_quantity} to {new_quantity}")
-                        else:
-                            results["errors"].append({
-                                "name": item_name,
-                                "action": "update",
-                                "error": "Failed to update quantity"
-                            })
+                    new_quantity = existing_item["quantity"]
+                    if new_quantity > 0:
+                        results["updated"].append({
+                            "name": item_name,
+                            "new_quantity": new_quantity,
+                            "old_quantity": new_quantity + 1,
+                            "item_id": str(existing_item["_id"])
+                        })
+                        print(f"Updated {item_name} quantity from {new_quantity + 1} to {new_quantity}")
                     else:
-                        # Remove item if quantity is 1 or less
-                        delete_result = db.items.delete_one({"name": item_name.lower()})
+                        # Conditional on the quantity, so a concurrent increment keeps the item
+                        delete_result = db.items.delete_one({"_id": existing_item["_id"], "quantity": {"$lte": 0}})
                         
                         if delete_result.deleted_count > 0:
                             results["removed"].append(item_name)
                             print(f"Removed {item_name} from items collection")
                         else:
-                            results["errors"].append({
-                                "name": item_name,
-                                "action": "remove",
-                                "error": "Item not found in inventory"
-                            })
+                            print(f"Kept {item_name}: its quantity was raised again before removal")
+                elif db.items.find_one_and_delete({"name": item_name.lower(), "quantity": {"$not": {"$gt": 0}}},
+                                                  projection={"_id": 1}):
+                    # Nothing left to decrement (quantity zero or unset): remove the row, don't report it missing
+                    results["removed"].append(item_name)
+                    print(f"Removed {item_name} from items collection")
                 else:
                     results["errors"].append({
                         "name": item_name,
@@ -194,10 +146,6 @@ def process_image_pair(first_image_base64=None, second_image_base64=None):
                     "action": "remove",
                     "error": "No matching item found in image database"
                 })
-            
-            # Clean up temp file
-            if os.path.exists(second_image_path):
-                os.unlink(second_image_path)
                 
     except Exception as e:
         print(f"Error processing image pair: {str(e)}")
@@ -208,42 +156,31 @@ def process_image_pair(first_image_base64=None, second_image_base64=None):
     
     return results
 
-def store_image_vector(image_path, item_name, expiration_period):
+def store_image_vector(image, item_name, expiration_period, embedding=None):
     """
     Store an image vector in the database.
     
     Args:
-        image_path (str): Path to the image file
+        image (PIL.Image.Image or str): Decoded image (or a path to one)
         item_name (str): Name of the item
         expiration_period (int): Expiration period in days
+        embedding (np.ndarray, optional): Precomputed embedding for the image
         
     Returns:
         str: ID of the stored document
     """
-    vector_service = ImageVectorService()
-    
     try:
         # Store the image vector
         doc_id = vector_service.store_image_embedding(
-            image_path=image_path,
+            image=image,
             item_name=item_name,
             expiration_period=expiration_period,
-            metadata={"date_added": datetime.utcnow().isoformat()}
+            metadata={"date_added": datetime.utcnow().isoformat()},
+            embedding=embedding
         )
         
         print(f"Successfully stored image vector for {item_name} with ID: {doc_id}")
-        
-        # Clean up temp file
-        if os.path.exists(image_path):
-            os.unlink(image_path)
-            print(f"Cleaned up temporary file: {image_path}")
-            
         return doc_id
     except Exception as e:
         print(f"Error storing image vector: {str(e)}")
-        # Still clean up temp file even if storage failed
-        if os.path.exists(image_path):
-            os.unlink(image_path)
         raise
-    finally:
-        vector_service.close() 
\ No newline at end of file
@@ -5,7 +5,11 @@ import os
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
 
 from src.db_connector import get_db_instance
-from src.models.item import Item
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from src.models.item import Item, normalize_quantity
+from src.services.image_store import get_image_store
+from src.services.inventory_meta import ITEM_NAME_COLLATION
 
 db = get_db_instance()
 
@@ -13,9 +17,14 @@ def process_ai_response(ai_response, image_data=None):
     """
     Process Vertex AI response and update inventory accordingly.
     
+    All identified items are applied in one unordered bulk write of upserts: an item
+    with the same name (case-insensitive) and expiration date gets its quantity
+    incremented with `$inc`, otherwise a new item is inserted. The unique
+    (name, expiration_date) index keeps concurrent uploads from creating duplicates.
+    
     Args:
         ai_response (dict): Response containing items list from Vertex AI
-        image_data (str, optional): Base64 encoded image data to store with items
+        image_data (bytes, optional): Image bytes; stored once in the image store and referenced by new items
         
     Returns:
         tuple: (results dict, status code)
@@ -30,81 +39,75 @@ def process_ai_response(ai_response, image_data=None):
             print("DEBUG: No items found in response")
             return results, 200
         
+        # Merge repeats of the same item so each key gets exactly one upsert
+        counts = {}
+        display_names = {}
         for item in items:
             item_name = item.get('name')
-            count = item.get('count', 1)
             expiration_date = item.get('expiration_date')
-            
             if not item_name or not expiration_date:
                 print(f"DEBUG: Skipping item with missing data: {item}")
                 continue
-                
-            print(f"DEBUG: Processing item: {item_name}")
-            
-            # Check if item exists in inventory with same expiration date (case-insensitive)
-            existing_item = db.items.find_one({
-                "name": item_name.lower(),
-                "expiration_date": expiration_date
-            })
-            
-            if existing_item:
-                print(f"DEBUG: Item {item_name} exists with same expiration date")
-                try:
-                    current_quantity = int(existing_item.get('quantity', '1'))
-                    new_quantity = str(current_quantity + count)
-                    
-                    update_result = db.items.update_one(
-                        {"_id": existing_item["_id"]},
-                        {"$set": {"quantity": new_quantity}}
-                    )
-                    
-                    if update_result.modified_count > 0:
-                        print(f"DEBUG: Updated quantity for {item_name}")
-                        results["updated"].append({
-                            "name": item_name,
-                            "new_quantity": new_quantity
-                        })
-                    else:
-                        print(f"DEBUG: Failed to update quantity for {item_name}")
-                        results["errors"].append({
-                            "name": item_name,
-                            "action": "update",
-                            "error": "Failed to update quantity"
-                        })
-                except Exception as e:
-                    print(f"DEBUG: Error updating item {item_name}: {str(e)}")
-                    results["errors"].append({
-                        "name": item_name,
-                        "action": "update",
-                        "error": str(e)
-                    })
+            key = (item_name.lower(), expiration_date)
+            counts[key] = counts.get(key, 0) + normalize_quantity(item.get('count', 1))
+            display_names.setdefault(key, item_name)
+        if not counts:
+            return results, 200
+        
+        image_hash = None
+        if image_data:
+            try:
+                image_hash = get_image_store(db).put(image_data)
+            except Exception as e:
+                print(f"DEBUG: Could not store image, adding items without it: {str(e)}")
+        
+        keys = list(counts)
+        operations = []
+        for name, expiration_date in keys:
+            new_item = Item(name=name, quantity=0, expiration_date=expiration_date, image_hash=image_hash)
+            insert_fields = new_item.to_document()
+            for field in ("name", "expiration_date", "quantity"):
+                insert_fields.pop(field)  # Set by the filter or the $inc
+            operations.append(UpdateOne(
+                {"name": name, "expiration_date": expiration_date},
+                {"$inc": {"quantity": counts[(name, expiration_date)]}, "$setOnInsert": insert_fields},
+                upsert=True,
+                collation=ITEM_NAME_COLLATION
+            ))
+        
+        upserted_ids, failed = _bulk_upsert(operations)
+        print(f"DEBUG: Bulk upsert of {len(operations)} items: {len(upserted_ids)} added, "
+              f"{len(operations) - len(upserted_ids) - len(failed)} updated, {len(failed)} failed")
+        
+        # One read for the resulting quantities of the items that already existed
+        matched = [keys[index] for index in range(len(keys)) if index not in upserted_ids and index not in failed]
+        new_quantities = {}
+        if matched:
+            cursor = db.items.find(
+                {"$or": [{"name": name, "expiration_date": expiration_date} for name, expiration_date in matched]},
+                {"name": 1, "expiration_date": 1, "quantity": 1}
+            ).collation(ITEM_NAME_COLLATION)
+            new_quantities = {(doc["name"].lower(), doc["expiration_date"]): doc["quantity"] for doc in cursor}
+        
+        for index, key in enumerate(keys):
+            item_name = display_names[key]
+            if index in failed:
+                results["errors"].append({
+                    "name": item_name,
+                    "action": "upsert",
+                    "error": failed[index]
+                })
+            elif index in upserted_ids:
+                results["added"].append({
+                    "name": item_name,
+                    "quantity": counts[key],
+                    "action": "new_item_from_ai"
+                })
             else:
-                # Item doesn't exist or has different expiration date, add as new item
-                try:
-                    new_item = Item(
-                        name=item_name.lower(),  # Add lowercase version for searching
-                        quantity=str(count),
-                        expiration_date=expiration_date,
-                        image_data=image_data  # Store the base64 image data
-                    )
-                    item_dict = new_item.to_dict()
-                    if "_id" in item_dict:
-                        del item_dict["_id"]
-                        
-                    db.items.insert_one(item_dict)
-                    print(f"DEBUG: Added new item {item_name}")
-                    results["added"].append({
-                        "name": item_name,
-                        "quantity": count,
-                        "action": "new_item_from_ai"
-                    })
-                except Exception as e:
-                    print(f"DEBUG: Error adding new item {item_name}: {str(e)}")
-                    results["errors"].append({
-                        "name": item_name,
-                        "action": "add",
-                        "error": str(e)
-                    })
+                results["updated"].append({
+                    "name": item_name,
+                    "new_quantity": new_quantities.get(key)
+                })
         
         print(f"DEBUG: Processing complete. Results: {results}")
         return results, 200
@@ -113,6 +116,38 @@ def process_ai_response(ai_response, image_data=None):
         print(f"DEBUG: Error in process_ai_response: {str(e)}")
         return {"error": str(e)}, 500
 
+def _bulk_upsert(operations):
+    """
+    Run upserts as one unordered bulk write, retrying duplicate-key races once.
+    
+    Two uploads inserting the same new item can both miss and both try to insert; the
+    loser fails with a duplicate key error and succeeds as an update on retry.
+    
+    Returns:
+        tuple: ({operation index: upserted _id}, {operation index: error message})
+    """
+    upserted_ids, failed = {}, {}
+    pending = list(range(len(operations)))
+    for attempt in range(2):
+        try:
+            result = db.items.bulk_write([operations[index] for index in pending], ordered=False)
+            upserted_ids.update({pending[position]: _id for position, _id in result.upserted_ids.items()})
+            return upserted_ids, failed
+        except BulkWriteError as e:
+            details = e.details
+            upserted_ids.update({pending[entry["index"]]: entry["_id"] for entry in details.get("upserted", [])})
+            retry = []
+            for error in details.get("writeErrors", []):
+                index = pending[error["index"]]
+                if error.get("code") == 11000 and attempt == 0:
+                    retry.append(index)
+                else:
+                    failed[index] = error.get("errmsg", "Bulk write error")
+            if not retry:
+                return upserted_ids, failed
+            pending = retry
+    return upserted_ids, failed
+
 # Legacy function for backward compatibility
 def process_perplexity_response(perplexity_response, image_data=None):
     """
@@ -9,31 +9,127 @@ load_dotenv("../../.venv/.env", override=True)
 # THIS IS CRITICAL FOR THE FLASK APP TO FIND MODULES IN THE SRC DIRECTORY
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import threading
+import time
 from flask import Flask, jsonify
 from flask_cors import CORS  # Import CORS
-from routes.inventory_routes import inventory_bp
+from routes.inventory_routes import inventory_bp, vector_service
 from routes.recipe_routes import recipe_bp
 from routes.notification_routes import notification_bp
 from db_connector import get_db_instance  # Import to initialize DB connection at startup
+# The routes import these through the `src.` package, so readiness must check the same module state
+from src.db_connector import get_db_instance as get_routes_db_instance
+from src.services.model_registry import warm_up_encoder, is_encoder_ready
+from src.services.inventory_meta import ensure_inventory_indexes
+from src.services.google_credentials import get_credential_provider
+from src.helper.image_ingress import calibrate_decode_cost
 
 app = Flask(__name__)
-CORS(app)  # Enable CORS for all routes
+CORS(app, expose_headers=["X-Next-Cursor"])  # Enable CORS for all routes; expose the pagination header
 
 # Register Blueprints
 app.register_blueprint(inventory_bp)
 app.register_blueprint(recipe_bp)
 app.register_blueprint(notification_bp)
 
+# Warm the model in the background at import, so it also happens under gunicorn/WSGI; with it off the
+# model loads on the first image request and readiness doesn't wait for it
+WARMUP_ON_STARTUP = os.environ.get('WARMUP_ON_STARTUP', 'true').lower() in ('1', 'true', 'yes')
+WARMUP_RETRY_SECONDS = float(os.environ.get('WARMUP_RETRY_SECONDS', '5'))
+DEBUG = os.environ.get('FLASK_ENV', 'development') == 'development'
+
+_warmup_state = {"started": False, "finished": False, "model": False, "mongo": False, "vertex": False,
+                 "errors": {}}
+
+def _warm_up_model():
+    if WARMUP_ON_STARTUP:
+        warm_up_encoder()
+    return True
+
+def _warm_up_mongo():
+    db = get_routes_db_instance()
+    if db is None:
+        raise ConnectionError("connection unavailable")
+    # Check indexes once here so requests never have to; a failure is reported but doesn't block readiness
+    try:
+        ensure_inventory_indexes(db)
+    except Exception as e:
+        print(f"Warm-up: failed to create inventory indexes (run `python -m src.manage dedupe-items` "
+              f"if duplicates block the unique index): {str(e)}")
+        _warmup_state["errors"]["inventory indexes"] = str(e)
+    try:
+        vector_service.ensure_indexes()
+    except Exception as e:
+        print(f"Warm-up: failed to check vector search index: {str(e)}")
+        _warmup_state["errors"]["indexes"] = str(e)
+    return True
+
+def _warm_up_vertex():
+    # Mints the first token and starts the background refresher
+    if get_credential_provider().get_token() is None:
+        raise ConnectionError("credentials unavailable")
+    return True
+
+def _warm_up_dependencies():
+    """Warm the image encoder, connect to Mongo and mint a Vertex token, retrying until each succeeds."""
+    try:
+        # Only feeds the "decode time saved" statistic, so it is measured here rather than per upload
+        calibrate_decode_cost()
+    except Exception as e:
+        print(f"Warm-up: could not calibrate JPEG decode cost: {str(e)}")
+
+    steps = {"model": _warm_up_model, "mongo": _warm_up_mongo, "vertex": _warm_up_vertex}
+    while True:
+        for name, step in steps.items():
+            if _warmup_state.get(name):
+                continue
+            try:
+                _warmup_state[name] = step()
+                _warmup_state["errors"].pop(name, None)
+            except Exception as e:
+                print(f"Warm-up: {name} unavailable, retrying in {WARMUP_RETRY_SECONDS:.0f}s: {str(e)}")
+                _warmup_state["errors"][name] = str(e)
+        if all(_warmup_state.get(name) for name in steps):
+            break
+        time.sleep(WARMUP_RETRY_SECONDS)
+
+    _warmup_state["finished"] = True
+    errors = _warmup_state["errors"]
+    print("Warm-up finished" + (f" with errors: {errors}" if errors else ""))
+
+def start_background_warmup():
+    """Start the warm-up thread once per process."""
+    if _warmup_state["started"]:
+        return
+    _warmup_state["started"] = True
+    threading.Thread(target=_warm_up_dependencies, name="warmup", daemon=True).start()
+
+# With the debug reloader only the child process (WERKZEUG_RUN_MAIN) serves requests
+if not (__name__ == "__main__" and DEBUG and os.environ.get('WERKZEUG_RUN_MAIN') != 'true'):
+    start_background_warmup()
+
 @app.route("/")
 def health_check():
     return jsonify({"status": "healthy", "message": "Smart Fridge API is running!"})
 
+@app.route("/ready")
+def readiness_check():
+    """Readiness probe: 200 only once the model, Mongo connection and Vertex credentials are warm. No I/O."""
+    checks = {
+        "model": is_encoder_ready() if WARMUP_ON_STARTUP else True,
+        "mongo": _warmup_state["mongo"],
+        # The warm-up creates the provider; until then don't construct it (ADC lookup) here
+        "vertex": _warmup_state["vertex"] and get_credential_provider().has_token(),
+    }
+    ready = all(checks.values())
+    body = {"status": "ready" if ready else "warming_up", "checks": checks}
+    if _warmup_state["errors"]:
+        body["warmup_errors"] = [f"{name}: {error}" for name, error in _warmup_state["errors"].items()]
+    return jsonify(body), 200 if ready else 503
+
 if __name__ == "__main__":
     # Get port from environment variable or default to 5001
     port = int(os.environ.get('PORT', 5001))
-    # Enable debug mode in development
-    debug = os.environ.get('FLASK_ENV', 'development') == 'development'
-    
     # Ensure MongoDB Atlas environment variables are available
     mongo_uri = os.environ.get('MONGODB_URI')
     if mongo_uri:
@@ -47,5 +143,5 @@ if __name__ == "__main__":
         print("Failed to connect to MongoDB. Check your configuration.")
     
     # Make sure to run on 0.0.0.0 to be accessible externally if needed (e.g. for frontend dev)
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    app.run(host="0.0.0.0", port=port, debug=DEBUG)
 
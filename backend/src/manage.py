@@ -0,0 +1,314 @@
+# backend/src/manage.py
+"""
+Admin commands for the Smart Fridge backend.
+
+Run from the backend directory, e.g.:
+    python -m src.manage migrate-embeddings --rebuild-index
+"""
+import argparse
+import sys
+import time
+from pymongo import UpdateOne, DeleteMany
+from src.db_connector import get_db_instance, close_db_connection
+from src.models.item import normalize_quantity
+from src.services.image_store import get_image_store, inline_image_bytes
+from src.services.inventory_meta import (
+    bump_inventory_version, ensure_inventory_indexes, ITEM_KEY_INDEX, ITEM_NAME_COLLATION
+)
+from src.services.embedding_codec import encode_embedding, decode_embedding, EMBEDDING_STORAGE_DTYPE
+from src.services.image_vector_service import ImageVectorService, LEGACY_VECTOR_MODEL
+from src.services.model_registry import DEFAULT_CLIP_MODEL
+from src.services.onnx_encoder import export_clip_onnx, ONNX_MODEL_DIR
+from src.services.reembedding import reembed_collection
+
+
+def migrate_embeddings(db, dtype=EMBEDDING_STORAGE_DTYPE, batch_size=500, dry_run=False, rebuild_index=False):
+    """
+    Convert image_vectors embeddings from lists of doubles to packed binary vectors in place.
+
+    Only documents still in the legacy format are touched, so the command can be
+    interrupted and re-run safely.
+
+    Args:
+        db: MongoDB database
+        dtype (str): Target storage dtype ("float32" or "float16")
+        batch_size (int): Documents converted per bulk write
+        dry_run (bool): Only count the documents that would be converted
+        rebuild_index (bool): Replace a legacy knnVector index with a vectorSearch index
+
+    Returns:
+        int: Number of documents converted (or that would be converted)
+    """
+    collection = db["image_vectors"]
+    legacy_filter = {"embedding": {"$type": "array"}}
+    pending = collection.count_documents(legacy_filter)
+    print(f"Found {pending} image_vectors documents with list embeddings")
+    if dry_run or pending == 0:
+        converted = pending
+    else:
+        converted = 0
+        start = time.perf_counter()
+        operations = []
+        for doc in collection.find(legacy_filter, {"embedding": 1}):
+            packed = encode_embedding(decode_embedding(doc["embedding"]), dtype)
+            # Match on the legacy type too, so a concurrent re-store isn't overwritten
+            operations.append(UpdateOne({"_id": doc["_id"], **legacy_filter}, {"$set": {"embedding": packed}}))
+            if len(operations) >= batch_size:
+                converted += collection.bulk_write(operations, ordered=False).modified_count
+                operations = []
+                print(f"Converted {converted}/{pending} documents...")
+        if operations:
+            converted += collection.bulk_write(operations, ordered=False).modified_count
+        print(f"Converted {converted} documents to packed {dtype} vectors in {time.perf_counter() - start:.2f}s")
+
+    if rebuild_index and not dry_run:
+        ensure_indexes(db, recreate_legacy=True)
+    return converted
+
+
+def migrate_images(db, batch_size=200, dry_run=False):
+    """
+    Move inline item images (`image_data`, data-URL `image_url`) into the image store.
+
+    Each distinct image is stored once; items get its `image_hash` and lose the inline
+    copies. Re-running only touches items that still carry inline images.
+
+    Args:
+        db: MongoDB database
+        batch_size (int): Items updated per bulk write
+        dry_run (bool): Only count the items that would be migrated
+
+    Returns:
+        int: Number of items migrated (or that would be migrated)
+    """
+    legacy_filter = {"$or": [{"image_data": {"$nin": [None]}}, {"image_url": {"$regex": "^data:image"}}]}
+    pending = db.items.count_documents(legacy_filter)
+    print(f"Found {pending} items with inline images")
+    if dry_run or pending == 0:
+        return pending
+
+    store = get_image_store(db)
+    migrated, unreadable, hashes = 0, 0, set()
+    bytes_before = 0
+    start = time.perf_counter()
+    operations = []
+    for doc in db.items.find(legacy_filter, {"image_data": 1, "image_url": 1}):
+        data = inline_image_bytes(doc)
+        update = {"$unset": {"image_data": ""}}
+        if isinstance(doc.get("image_url"), str) and doc["image_url"].startswith("data:image"):
+            update["$set"] = {"image_url": None}
+        if data:
+            image_hash = store.put(data)
+            hashes.add(image_hash)
+            bytes_before += len(data)
+            update.setdefault("$set", {})["image_hash"] = image_hash
+        else:
+            unreadable += 1
+        operations.append(UpdateOne({"_id": doc["_id"]}, update))
+        if len(operations) >= batch_size:
+            migrated += db.items.bulk_write(operations, ordered=False).modified_count
+            operations = []
+            print(f"Migrated {migrated}/{pending} items...")
+    if operations:
+        migrated += db.items.bulk_write(operations, ordered=False).modified_count
+    bump_inventory_version(db)
+
+    print(f"Migrated {migrated} items to {len(hashes)} stored images ({bytes_before / 1e6:.1f} MB inline before) "
+          f"in {time.perf_counter() - start:.2f}s")
+    if unreadable:
+        print(f"{unreadable} items had unreadable inline images; those were dropped")
+    return migrated
+
+
+def migrate_quantities(db, batch_size=500, dry_run=False):
+    """
+    Convert item quantities stored as strings (or doubles, or missing) to integers.
+
+    Quantity updates use `$inc`, which fails on non-numeric values, so this must run
+    before deploying the atomic update paths. Unparseable quantities become 1.
+
+    Args:
+        db: MongoDB database
+        batch_size (int): Items updated per bulk write
+        dry_run (bool): Only count the items that would be converted
+
+    Returns:
+        int: Number of items converted (or that would be converted)
+    """
+    legacy_filter = {"quantity": {"$not": {"$type": ["int", "long"]}}}
+    pending = db.items.count_documents(legacy_filter)
+    print(f"Found {pending} items with non-integer quantities")
+    if dry_run or pending == 0:
+        return pending
+
+    converted = 0
+    operations = []
+    for doc in db.items.find(legacy_filter, {"quantity": 1}):
+        quantity = normalize_quantity(doc.get("quantity"))
+        # Match on the legacy type too, so a concurrent integer write isn't overwritten
+        operations.append(UpdateOne({"_id": doc["_id"], **legacy_filter}, {"$set": {"quantity": quantity}}))
+        if len(operations) >= batch_size:
+            converted += db.items.bulk_write(operations, ordered=False).modified_count
+            operations = []
+    if operations:
+        converted += db.items.bulk_write(operations, ordered=False).modified_count
+    bump_inventory_version(db)
+    print(f"Converted {converted} quantities to integers")
+    return converted
+
+
+def dedupe_items(db, dry_run=False):
+    """
+    Merge items that share a name and expiration date under the unique index's collation.
+
+    Grouping uses ITEM_NAME_COLLATION, the same equivalence the index enforces (case-insensitive
+    by the locale's rules rather than $toLower), so no group the index would reject is missed.
+
+    The oldest item of each group is kept with the summed quantity (and the first image
+    found in the group); the others are deleted. Afterwards the unique
+    (name, expiration_date) index can be built, which this command then does.
+
+    Args:
+        db: MongoDB database
+        dry_run (bool): Only report the duplicate groups
+
+    Returns:
+        int: Number of duplicate items removed (or that would be removed)
+    """
+    groups = list(db.items.aggregate([
+        {"$match": {"expiration_date": {"$type": "string"}}},
+        {"$sort": {"_id": 1}},
+        {"$group": {
+            "_id": {"name": "$name", "expiration_date": "$expiration_date"},
+            "items": {"$push": {"_id": "$_id", "quantity": "$quantity", "image_hash": "$image_hash"}},
+        }},
+        {"$match": {"items.1": {"$exists": True}}},
+    ], collation=ITEM_NAME_COLLATION))
+    duplicates = sum(len(group["items"]) - 1 for group in groups)
+    print(f"Found {len(groups)} items with duplicates ({duplicates} documents to merge)")
+    for group in groups[:20]:
+        print(f"  {group['_id']['name']} / {group['_id']['expiration_date']}: {len(group['items'])} documents")
+    if dry_run:
+        return duplicates
+
+    if groups:
+        operations = []
+        for group in groups:
+            keep, *rest = group["items"]
+            quantity = sum(normalize_quantity(item.get("quantity"), default=0) for item in group["items"])
+            image_hash = next((item["image_hash"] for item in group["items"] if item.get("image_hash")), None)
+            operations.append(UpdateOne({"_id": keep["_id"]}, {"$set": {
+                "quantity": max(quantity, 1), "image_hash": image_hash
+            }}))
+            operations.append(DeleteMany({"_id": {"$in": [item["_id"] for item in rest]}}))
+        result = db.items.bulk_write(operations, ordered=True)
+        bump_inventory_version(db)
+        print(f"Merged {len(groups)} groups, deleted {result.deleted_count} duplicate items")
+
+    ensure_inventory_indexes(db)
+    print(f"Index {ITEM_KEY_INDEX} is in place")
+    return duplicates
+
+
+def ensure_indexes(db, recreate_legacy=False):
+    """
+    Create or verify the indexes the request path relies on.
+
+    Args:
+        db: MongoDB database
+        recreate_legacy (bool): Replace a legacy knnVector vector index with a vectorSearch index
+    """
+    ensure_inventory_indexes(db)
+
+    vector_service = ImageVectorService()
+    vector_service.db = db
+    vector_service.ensure_indexes(recreate_legacy=recreate_legacy)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Smart Fridge admin commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    migrate_parser = subparsers.add_parser(
+        "migrate-embeddings", help="Convert list embeddings in image_vectors to packed binary vectors")
+    migrate_parser.add_argument("--dtype", choices=["float32", "float16"], default=EMBEDDING_STORAGE_DTYPE,
+                                help="Storage dtype (float16 is not searchable by Atlas Vector Search)")
+    migrate_parser.add_argument("--batch-size", type=int, default=500, help="Documents per bulk write")
+    migrate_parser.add_argument("--dry-run", action="store_true", help="Only report how many documents would change")
+    migrate_parser.add_argument("--rebuild-index", action="store_true",
+                                help="Replace a legacy knnVector 'vector_index' with a vectorSearch index")
+
+    ensure_parser = subparsers.add_parser("ensure-indexes", help="Create or verify database and search indexes")
+    ensure_parser.add_argument("--recreate-legacy", action="store_true",
+                               help="Replace a legacy knnVector 'vector_index' with a vectorSearch index")
+
+    reembed_parser = subparsers.add_parser(
+        "reembed", help="Re-embed stored image vectors with another model (resumable, runs alongside the API)")
+    reembed_parser.add_argument("--target-model", required=True, help="Model to produce the new vectors with")
+    reembed_parser.add_argument("--source-model", default=LEGACY_VECTOR_MODEL,
+                                help="Model whose vectors are migrated (default: %(default)s)")
+    reembed_parser.add_argument("--batch-size", type=int, default=64, help="Documents encoded per batch")
+    reembed_parser.add_argument("--catch-up", action="store_true",
+                                help="Rescan from the start to pick up vectors stored since the last run")
+    reembed_parser.add_argument("--dry-run", action="store_true", help="Only report how many documents are pending")
+    reembed_parser.add_argument("--allow-missing-sources", action="store_true",
+                                help="Finish even if some vectors have no source image or item photo to re-embed from")
+
+    images_parser = subparsers.add_parser(
+        "migrate-images", help="Move inline item images into the content-addressed image store")
+    images_parser.add_argument("--batch-size", type=int, default=200, help="Items per bulk write")
+    images_parser.add_argument("--dry-run", action="store_true", help="Only report how many items would change")
+
+    quantities_parser = subparsers.add_parser(
+        "migrate-quantities", help="Store every item quantity as an integer (required before $inc updates)")
+    quantities_parser.add_argument("--batch-size", type=int, default=500, help="Items per bulk write")
+    quantities_parser.add_argument("--dry-run", action="store_true", help="Only report how many items would change")
+
+    dedupe_parser = subparsers.add_parser(
+        "dedupe-items", help="Merge items with the same name and expiration date, then build the unique index")
+    dedupe_parser.add_argument("--dry-run", action="store_true", help="Only list the duplicate groups")
+
+    export_parser = subparsers.add_parser(
+        "export-onnx", help="Export the CLIP image encoder to ONNX (fp32 and int8) for EMBEDDING_BACKEND=onnx")
+    export_parser.add_argument("--model", default=DEFAULT_CLIP_MODEL, help="sentence-transformers model id")
+    export_parser.add_argument("--output-dir", default=ONNX_MODEL_DIR, help="Where to write the graphs")
+    export_parser.add_argument("--no-quantize", action="store_true", help="Skip the int8 quantised copy")
+    export_parser.add_argument("--opset", type=int, default=17, help="ONNX opset version")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "export-onnx":
+        # Doesn't touch the database
+        export_clip_onnx(args.model, args.output_dir, not args.no_quantize, args.opset)
+        return 0
+
+    db = get_db_instance()
+    if db is None:
+        print("Failed to connect to MongoDB. Check your configuration.")
+        return 1
+
+    try:
+        if args.command == "migrate-embeddings":
+            migrate_embeddings(db, args.dtype, args.batch_size, args.dry_run, args.rebuild_index)
+        elif args.command == "ensure-indexes":
+            ensure_indexes(db, args.recreate_legacy)
+        elif args.command == "reembed":
+            try:
+                reembed_collection(db, args.target_model, args.source_model, args.batch_size, args.catch_up,
+                                   args.dry_run, args.allow_missing_sources)
+            except RuntimeError as e:
+                print(f"Re-embedding incomplete: {str(e)}")
+                return 1
+        elif args.command == "migrate-images":
+            migrate_images(db, args.batch_size, args.dry_run)
+        elif args.command == "migrate-quantities":
+            migrate_quantities(db, args.batch_size, args.dry_run)
+        elif args.command == "dedupe-items":
+            dedupe_items(db, args.dry_run)
+        return 0
+    finally:
+        close_db_connection()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,28 +1,74 @@
 # /home/ubuntu/smart_fridge_app/backend/smart_fridge_api/src/models/item.py
+import base64
 import datetime
 
+
+def normalize_quantity(value, default=1, strict=False):
+    """
+    Coerce a quantity from the API, the AI or a legacy document to an int.
+
+    Strings like "3" or "3.0" are accepted; anything unparseable (including "inf" and "nan")
+    falls back to `default`. Lenient mode truncates fractions, as legacy documents and AI
+    counts may carry them; strict mode (for API input) returns `default` for non-integral
+    or negative values instead.
+
+    Returns:
+        int: The quantity
+    """
+    if isinstance(value, bool):
+        return default
+    if isinstance(value, int):
+        return default if strict and value < 0 else value
+    try:
+        number = float(str(value).strip())
+        quantity = int(number)
+    except (TypeError, ValueError, OverflowError):
+        return default
+    if strict and (quantity != number or quantity < 0):
+        return default
+    return quantity
+
+
 class Item:
-    def __init__(self, name, quantity, expiration_date=None, date_added=None, image_url=None, image_data=None, _id=None):
+    def __init__(self, name, quantity, expiration_date=None, date_added=None, image_url=None, image_data=None,
+                 image_hash=None, _id=None):
         self._id = _id # MongoDB ObjectId
         self.name = name
-        self.quantity = quantity
+        self.quantity = normalize_quantity(quantity)
         self.date_added = date_added if date_added else datetime.datetime.utcnow()
         self.expiration_date = expiration_date
         self.image_url = image_url
-        self.image_data = image_data  # Base64 encoded image data
+        self.image_hash = image_hash  # Key into the image store (GridFS); the bytes live there
+        self.image_data = image_data  # Legacy inline image, until `manage.py migrate-images` has run
 
     def to_dict(self):
-        data = {
+        """JSON representation for API responses; images are referenced by URL, not inlined."""
+        data = self.to_document()
+        if self.image_hash:
+            data["image_path"] = f"/api/inventory/images/{self.image_hash}"
+            data["thumbnail_path"] = f"/api/inventory/images/{self.image_hash}?variant=thumb"
+        if isinstance(self.image_data, (bytes, bytearray, memoryview)):
+            data["image_data"] = base64.b64encode(self.image_data).decode("utf-8")
+        if self._id:
+            data["_id"] = str(self._id) # Convert ObjectId to string for JSON serialization
+        return data
+
+    def to_document(self):
+        """MongoDB representation; only the image hash is kept on the item."""
+        document = {
             "name": self.name,
             "quantity": self.quantity,
             "date_added": self.date_added,
             "expiration_date": self.expiration_date,
             "image_url": self.image_url,
-            "image_data": self.image_data
+            "image_hash": self.image_hash
         }
-        if self._id:
-            data["_id"] = str(self._id) # Convert ObjectId to string for JSON serialization
-        return data
+        if self.image_data is not None:
+            image_data = self.image_data
+            if isinstance(image_data, (bytearray, memoryview)):
+                image_data = bytes(image_data)
+            document["image_data"] = image_data
+        return document
 
     @staticmethod
     def from_dict(data):
@@ -33,6 +79,7 @@ class Item:
             date_added=data.get("date_added"),
             image_url=data.get("image_url"),
             image_data=data.get("image_data"),
+            image_hash=data.get("image_hash"),
             _id=data.get("_id")
         )
 
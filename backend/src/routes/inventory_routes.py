@@ -1,28 +1,50 @@
 # /home/ubuntu/smart_fridge_app/backend/smart_fridge_api/src/routes/inventory_routes.py
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, make_response
 from src.db_connector import get_db_instance
-from src.models.item import Item
+from src.models.item import Item, normalize_quantity
 from src.services.ai_service import AIService
 from src.services.image_processing_service import ImageProcessingService
 from src.services.image_vector_service import ImageVectorService
+from src.services.model_registry import get_model_stats, get_encoder_stats
+from src.services.embedding_cache import get_embedding_cache
+from src.services.shelf_life_cache import get_shelf_life_cache
+from src.services.image_store import get_image_store, is_image_hash, VARIANTS
+from src.services.inventory_meta import bump_inventory_version, get_inventory_version, ITEM_NAME_COLLATION
 from src.helper.identify_object_from_picutre import identify_object_from_image
 from src.helper.process_inventory import process_perplexity_response
 from src.helper.process_image_vectors import process_image_pair, store_image_vector
+from src.helper.image_ingress import read_upload, get_ingress_stats
 from bson import ObjectId # For converting string ID to ObjectId for MongoDB queries
+from bson.errors import InvalidId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+import base64
+import binascii
 import datetime
+import hashlib
+import json
 import traceback
 import sys
-import base64
-import tempfile
-import os
 from PIL import Image
 
 inventory_bp = Blueprint("inventory_bp", __name__, url_prefix="/api/inventory")
 db = get_db_instance()
-ai_service = AIService()
+ai_service = AIService(shelf_life_cache=get_shelf_life_cache(db))
 image_service = ImageProcessingService()
 vector_service = ImageVectorService()
 
+# Fields `GET /items` can return; image_data (legacy inline images) only when asked for
+ITEM_FIELDS = ("name", "quantity", "expiration_date", "date_added", "image_url", "image_hash", "image_data")
+DEFAULT_ITEM_FIELDS = tuple(field for field in ITEM_FIELDS if field != "image_data")
+MAX_ITEMS_PAGE_SIZE = 500
+
+@inventory_bp.after_request
+def track_inventory_changes(response):
+    """Bump the inventory version after every successful write, so conditional GETs see it."""
+    if request.method in ("POST", "PUT", "PATCH", "DELETE") and response.status_code < 400 and db is not None:
+        bump_inventory_version(db)
+    return response
+
 @inventory_bp.route("/debug", methods=["GET"])
 def debug_connection():
     """Debug route to check MongoDB connection"""
@@ -40,7 +62,14 @@ def debug_connection():
         return jsonify({
             "status": "Database connection successful",
             "db_object": str(db),
-            "collections": collections
+            "collections": collections,
+            "models": get_model_stats(),
+            "encoders": get_encoder_stats(),
+            "embedding_cache": get_embedding_cache(db).stats(),
+            "ingress": get_ingress_stats(),
+            "shelf_life_cache": ai_service.shelf_life_cache.stats(),
+            "vertex_client": ai_service.vertex_client.stats(),
+            "google_credentials": ai_service.credential_provider.stats()
         }), 200
     except Exception as e:
         exc_type, exc_value, exc_traceback = sys.exc_info()
@@ -59,7 +88,9 @@ def add_item_to_inventory():
         return jsonify({"error": "Missing item name or quantity"}), 400
 
     item_name = data.get("name")
-    quantity = data.get("quantity")
+    quantity = normalize_quantity(data.get("quantity"), default=None, strict=True)
+    if quantity is None:
+        return jsonify({"error": "quantity must be a non-negative integer"}), 400
     image_url = data.get("image_url") # Optional
 
     # Simulate getting expiration date from AI service
@@ -71,29 +102,41 @@ def add_item_to_inventory():
     if expiration_date_dt:
         expiration_date_iso = expiration_date_dt.isoformat()
     
-    # Convert image_url to image_data if it's a base64 string
+    # Decode a data URL once and keep only a reference to the stored image on the item
     image_data = None
     if image_url and image_url.startswith('data:image'):
-        # Extract the base64 part after the comma
-        image_data = image_url.split(',')[1]
+        try:
+            image_data = base64.b64decode(image_url.split(',', 1)[1])
+        except (IndexError, binascii.Error):
+            return jsonify({"error": "image_url is not a valid base64 data URL"}), 400
+        image_url = None  # Don't keep a second, base64 copy of the same image
     
     new_item = Item(
         name=item_name,
         quantity=quantity,
         expiration_date=expiration_date_iso, # Store as ISO string or datetime object
-        image_data=image_data,  # Store the base64 image data
-        image_url=image_url     # Keep the original URL for reference
+        image_url=image_url     # Keep a real URL for reference
     )
 
     try:
         if db is None:
             return jsonify({"error": "Database connection failed. Check backend logs."}), 500
             
-        item_dict = new_item.to_dict()
-        if "_id" in item_dict:
-            del item_dict["_id"] # Remove _id if present, MongoDB will generate it
+        if image_data:
+            new_item.image_hash = get_image_store(db).put(image_data)
+        item_dict = new_item.to_document()  # No _id, MongoDB will generate it
         
-        result = db.items.insert_one(item_dict)
+        try:
+            result = db.items.insert_one(item_dict)
+        except DuplicateKeyError:
+            existing_item = db.items.find_one(
+                {"name": new_item.name, "expiration_date": new_item.expiration_date}, {"_id": 1},
+                collation=ITEM_NAME_COLLATION
+            )
+            return jsonify({
+                "error": "An item with this name and expiration date already exists; update its quantity instead",
+                "item_id": str(existing_item["_id"]) if existing_item else None
+            }), 409
         created_item = db.items.find_one({"_id": result.inserted_id})
         return jsonify(Item.from_dict(created_item).to_dict()), 201
     except Exception as e:
@@ -102,16 +145,95 @@ def add_item_to_inventory():
         print("ERROR in add_item_to_inventory:", error_details)
         return jsonify({"error": str(e), "details": error_details}), 500
 
+def _encode_items_cursor(item_doc):
+    """Opaque pagination token for the position right after `item_doc` in expiration order."""
+    position = {"e": item_doc.get("expiration_date"), "i": str(item_doc["_id"])}
+    return base64.urlsafe_b64encode(json.dumps(position).encode()).decode().rstrip("=")
+
+def _items_after_cursor(token):
+    """Query matching items after the position encoded in `token` (sorted by expiration_date, then _id)."""
+    position = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+    expiration_date, item_id = position["e"], ObjectId(position["i"])
+    if expiration_date is None:
+        # Missing/null dates sort first; everything with a date comes after them
+        return {"$or": [{"expiration_date": {"$ne": None}},
+                        {"expiration_date": None, "_id": {"$gt": item_id}}]}
+    return {"$or": [{"expiration_date": {"$gt": expiration_date}},
+                    {"expiration_date": expiration_date, "_id": {"$gt": item_id}}]}
+
 @inventory_bp.route("/items", methods=["GET"])
 def get_all_items():
+    """
+    List items sorted by expiration date (soonest first, undated first).
+
+    Query parameters:
+        limit: Page size, clamped to MAX_ITEMS_PAGE_SIZE; without it every item is returned
+        after: Cursor from a previous page's X-Next-Cursor header
+        fields: Comma-separated fields to return (default: all but the legacy image_data)
+
+    The body stays a JSON list; the next page's cursor is sent in X-Next-Cursor. Responses
+    carry an ETag and Last-Modified derived from the inventory version and answer
+    If-None-Match with 304 while nothing has changed.
+    """
     try:
         if db is None:
             return jsonify({"error": "Database connection failed. Check backend logs."}), 500
-            
-        # Try to access the items collection
-        items_cursor = db.items.find()
-        items_list = [Item.from_dict(item_data).to_dict() for item_data in items_cursor]
-        return jsonify(items_list), 200
+
+        fields = DEFAULT_ITEM_FIELDS
+        if request.args.get("fields"):
+            fields = tuple(field.strip() for field in request.args["fields"].split(",") if field.strip())
+            unknown = [field for field in fields if field not in ITEM_FIELDS]
+            if unknown:
+                return jsonify({"error": f"Unknown fields: {', '.join(unknown)}"}), 400
+        limit = None
+        if "limit" in request.args:
+            # type=int would turn ?limit=abc into None, i.e. the unpaginated list
+            try:
+                limit = int(request.args["limit"])
+            except ValueError:
+                limit = 0
+            if limit < 1:
+                return jsonify({"error": "limit must be a positive integer"}), 400
+            limit = min(limit, MAX_ITEMS_PAGE_SIZE)
+        after = request.args.get("after")
+
+        version, updated_at = get_inventory_version(db)
+        query_key = f"{sorted(fields)}|{limit}|{after}"
+        etag = f"{version}-{hashlib.sha1(query_key.encode()).hexdigest()[:12]}"
+        if request.if_none_match.contains_weak(etag):
+            response = make_response("", 304)
+        else:
+            try:
+                query = _items_after_cursor(after) if after else {}
+            except (ValueError, KeyError, TypeError, binascii.Error, InvalidId):
+                return jsonify({"error": "Invalid cursor"}), 400
+
+            # Needed for the cursor even when not requested
+            projection = {field: 1 for field in set(fields) | {"expiration_date"}}
+            items_cursor = db.items.find(query, projection).sort([("expiration_date", 1), ("_id", 1)])
+            if limit is not None:
+                items_cursor = items_cursor.limit(limit + 1)  # One extra to know whether another page exists
+            item_docs = list(items_cursor)
+
+            next_cursor = None
+            if limit is not None and len(item_docs) > limit:
+                item_docs = item_docs[:limit]
+                next_cursor = _encode_items_cursor(item_docs[-1])
+
+            items_list = []
+            for item_doc in item_docs:
+                item = Item.from_dict(item_doc).to_dict()
+                items_list.append({key: value for key, value in item.items()
+                                   if key in fields or key in ("_id", "image_path", "thumbnail_path")})
+
+            response = make_response(jsonify(items_list), 200)
+            if next_cursor:
+                response.headers["X-Next-Cursor"] = next_cursor
+        response.set_etag(etag, weak=True)
+        if updated_at:
+            response.last_modified = updated_at
+        response.headers["Cache-Control"] = "no-cache"  # Always revalidate; the 304 makes that cheap
+        return response
     except Exception as e:
         exc_type, exc_value, exc_traceback = sys.exc_info()
         error_details = traceback.format_exception(exc_type, exc_value, exc_traceback)
@@ -137,7 +259,10 @@ def update_item(item_id):
 
     update_fields = {}
     if "name" in data: update_fields["name"] = data["name"]
-    if "quantity" in data: update_fields["quantity"] = data["quantity"]
+    if "quantity" in data:
+        update_fields["quantity"] = normalize_quantity(data["quantity"], default=None, strict=True)
+        if update_fields["quantity"] is None:
+            return jsonify({"error": "quantity must be a non-negative integer"}), 400
     if "expiration_date" in data: update_fields["expiration_date"] = data["expiration_date"] # Expecting ISO date string
     if "image_url" in data: update_fields["image_url"] = data["image_url"]
 
@@ -167,6 +292,35 @@ def delete_item(item_id):
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@inventory_bp.route("/images/<image_hash>", methods=["GET"])
+def get_image(image_hash):
+    """
+    Serve a stored image, or its thumbnail with `?variant=thumb`.
+
+    Images are addressed by content hash, so a response never changes: it is cached
+    for a year and revalidation with If-None-Match always gets a 304.
+    """
+    variant = request.args.get("variant", "original")
+    if variant not in VARIANTS or not is_image_hash(image_hash):
+        return jsonify({"error": "Invalid image hash or variant"}), 400
+
+    etag = f"{image_hash}.{variant}"
+    if etag in request.if_none_match:
+        response = make_response("", 304)
+    else:
+        try:
+            stored = get_image_store(db).get(image_hash, variant)
+        except Exception as e:
+            return jsonify({"error": str(e)}), 500
+        if stored is None:
+            return jsonify({"error": "Image not found"}), 404
+        data, content_type = stored
+        response = make_response(data)
+        response.headers["Content-Type"] = content_type
+    response.set_etag(etag)
+    response.headers["Cache-Control"] = "public, max-age=31536000, immutable"
+    return response
+
 # Enhanced image processing route with similarity checking
 @inventory_bp.route("/process-image", methods=["POST"])
 def process_fridge_image():
@@ -196,24 +350,18 @@ def _process_image_with_similarity_check():
     if image_file.filename == '':
         return jsonify({"error": "No selected file"}), 400
 
-    # Save uploaded image to temporary file
-    temp_image_path = None
     results = {"added": [], "updated": [], "errors": [], "similar_items_found": []}
     
     try:
-        # Create temporary file for the uploaded image
-        temp_image_file = tempfile.NamedTemporaryFile(prefix="process_", suffix=".jpg", delete=False)
-        temp_image_path = temp_image_file.name
-        temp_image_file.close()
-        
-        # Save uploaded image to temporary file
-        image_file.save(temp_image_path)
+        # Read the upload once; the bytes and the decoded image are shared below
+        upload = read_upload(image_file)
         
         # Search for similar images in the database
-        similar_images = vector_service.search_similar_images(
-            temp_image_path, 
+        similar_images, query_embedding = vector_service.search_similar_images(
+            upload.image, 
             limit=3, 
-            threshold=0.85  # 85% similarity threshold
+            threshold=0.85,  # 85% similarity threshold
+            return_embedding=True  # Reused below if the image turns out to be new
         )
         
         if similar_images:
@@ -229,43 +377,23 @@ def _process_image_with_similarity_check():
                     "similarity_score": round(similarity_score, 4)
                 })
                 
-                # Find the item in the inventory and update quantity
-                item_doc = db.items.find_one({"name": item_name.lower()})
+                # Increment the item's quantity in one atomic step
+                item_doc = db.items.find_one_and_update(
+                    {"name": item_name.lower()},
+                    {"$inc": {"quantity": 1}, "$set": {"date_added": datetime.datetime.utcnow()}},
+                    projection={"quantity": 1},
+                    return_document=ReturnDocument.AFTER
+                )
                 if item_doc:
-                    # Update quantity (increment by 1) - ensure quantity is treated as integer
-                    current_quantity = item_doc.get("quantity", 0)
-                    # Convert to int if it's stored as string
-                    if isinstance(current_quantity, str):
-                        try:
-                            current_quantity = int(current_quantity)
-                        except (ValueError, TypeError):
-                            current_quantity = 0
-                    new_quantity = current_quantity + 1
-                    update_result = db.items.update_one(
-                        {"_id": item_doc["_id"]},
-                        {
-                            "$set": {
-                                "quantity": new_quantity,
-                                "date_added": datetime.datetime.utcnow()
-                            }
-                        }
-                    )
-                    
-                    if update_result.modified_count > 0:
-                        results["updated"].append({
-                            "name": item_name,
-                            "new_quantity": new_quantity,
-                            "old_quantity": current_quantity,  # Include old quantity for comparison
-                            "similarity_score": round(similarity_score, 4),
-                            "action": "quantity_updated"
-                        })
-                        print(f"Updated quantity for {item_name} to {new_quantity}")
-                    else:
-                        results["errors"].append({
-                            "name": item_name,
-                            "action": "update_quantity",
-                            "error": "Failed to update quantity in database"
-                        })
+                    new_quantity = item_doc["quantity"]
+                    results["updated"].append({
+                        "name": item_name,
+                        "new_quantity": new_quantity,
+                        "old_quantity": new_quantity - 1,  # Include old quantity for comparison
+                        "similarity_score": round(similarity_score, 4),
+                        "action": "quantity_updated"
+                    })
+                    print(f"Updated quantity for {item_name} to {new_quantity}")
                 else:
                     # Similar image found but item not in inventory - create new item using original approach
                     print(f"Similar image found for {item_name} but not in inventory, creating new item")
@@ -280,9 +408,7 @@ def _process_image_with_similarity_check():
                         quantity=1,
                         expiration_date=expiration_date.isoformat()
                     )
-                    item_dict = new_item.to_dict()
-                    if "_id" in item_dict:
-                        del item_dict["_id"]
+                    item_dict = new_item.to_document()
                     
                     try:
                         db.items.insert_one(item_dict)
@@ -303,26 +429,18 @@ def _process_image_with_similarity_check():
             # No similar images found - identify items and add as new
             print("No similar images found, processing as new items")
             
-            # Use AI to identify items in the image
-            image_data = None
-            with open(temp_image_path, "rb") as f:
-                image_data = f.read()
-            
-            base64_image = base64.b64encode(image_data).decode('utf-8')
-            
             # Use Vertex AI to identify objects
-            perplexity_response = identify_object_from_image(
-                image_url=f"data:image/jpeg;base64,{base64_image}"
-            )
+            perplexity_response = identify_object_from_image(image_bytes=upload.payload, mime_type=upload.payload_mime_type)
             
             # Process the AI response to get identified items
-            ai_results, _ = process_perplexity_response(perplexity_response, base64_image)
+            ai_results, _ = process_perplexity_response(perplexity_response, upload.payload)
             
             if "added" in ai_results:
                 results["added"].extend(ai_results["added"])
                 
                 # Store image vectors for newly identified items
-                for item_name in ai_results["added"]:
+                for added_item in ai_results["added"]:
+                    item_name = added_item.get("name") if isinstance(added_item, dict) else added_item
                     try:
                         # Find the item in the database to get its expiration date
                         item_doc = db.items.find_one({"name": item_name.lower()})
@@ -333,7 +451,7 @@ def _process_image_with_similarity_check():
                             expiration_period = max(1, (exp_date - current_date).days)
                             
                             # Store the image vector
-                            store_image_vector(temp_image_path, item_name, expiration_period)
+                            store_image_vector(upload.image, item_name, expiration_period, embedding=query_embedding)
                             print(f"Stored image vector for new item: {item_name}")
                     except Exception as e:
                         print(f"Error storing vector for {item_name}: {str(e)}")
@@ -352,10 +470,6 @@ def _process_image_with_similarity_check():
             "action": "process_image",
             "error": str(e)
         })
-    finally:
-        # Clean up temporary file
-        if temp_image_path and os.path.exists(temp_image_path):
-            os.unlink(temp_image_path)
     
     return jsonify(results), 200
 
@@ -380,13 +494,13 @@ def _process_simulated_image():
     # 4. Process changes
     results = {"added": [], "removed": [], "errors": []}
 
+    # One batched Vertex call for all new names instead of one call per item
+    exp_dates = ai_service.get_expiration_dates_batch(added_names) if added_names else {}
     for name in added_names:
-        exp_date_dt = ai_service.get_general_expiration_info(name)
+        exp_date_dt = exp_dates.get(name)
         exp_date_iso = exp_date_dt.isoformat() if exp_date_dt else None
         new_item = Item(name=name, quantity=1, expiration_date=exp_date_iso) # Default quantity 1
-        item_dict = new_item.to_dict()
-        if "_id" in item_dict:
-            del item_dict["_id"]
+        item_dict = new_item.to_document()
         try:
             db.items.insert_one(item_dict)
             results["added"].append(name)
@@ -416,34 +530,34 @@ def upload_image_pair():
     try:
         if 'take_in_image' not in request.files and 'take_out_image' not in request.files:
             return jsonify({"error": "Image file is required"}), 400
-        take_in_base64_image = None
-        take_out_base64_image = None
+        take_in_image = None
+        take_out_image = None
 
         if 'take_in_image' in request.files:
             take_in_image_file = request.files['take_in_image']
             if take_in_image_file.filename == '':
                 return jsonify({"error": "Empty first image file"}), 400 
-            # Read the first image file and convert to base64
-            take_in_image_data = take_in_image_file.read()
-            take_in_base64_image = base64.b64encode(take_in_image_data).decode('utf-8')
+            # Read the first image once; its bytes and decoded pixels are shared from here on
+            take_in_image = read_upload(take_in_image_file)
         if 'take_out_image' in request.files:
             take_out_image_file = request.files['take_out_image']
             if take_out_image_file.filename != '':
-                take_out_image_data = take_out_image_file.read()
-                take_out_base64_image = base64.b64encode(take_out_image_data).decode('utf-8')
+                take_out_image = read_upload(take_out_image_file)
         
         # Process the image pair
-        results = process_image_pair(take_in_base64_image, take_out_base64_image)
+        results = process_image_pair(take_in_image, take_out_image)
         
         # Check if we need to use AI for the first image
-        if "need_ai" in results:
-            temp_image_path = results.pop("need_ai")
+        if results.pop("need_ai", False):
+            query_embedding = results.pop("need_ai_embedding", None)
             
             print("Using Vertex AI to identify objects in the image...")
-            perplexity_response = identify_object_from_image(image_url=f"data:image/jpeg;base64,{take_in_base64_image}")
+            perplexity_response = identify_object_from_image(
+                image_bytes=take_in_image.payload, mime_type=take_in_image.payload_mime_type
+            )
             
             # Process the response
-            perplexity_results, status_code = process_perplexity_response(perplexity_response, take_in_base64_image)
+            perplexity_results, status_code = process_perplexity_response(perplexity_response, take_in_image.payload)
             
             # Ensure all required keys exist in results before merging
             for key in ["added", "updated", "errors"]:
@@ -454,7 +568,8 @@ def upload_image_pair():
             
             # Store image vectors for newly identified items
             if "added" in perplexity_results and perplexity_results["added"]:
-                for item_name in perplexity_results["added"]:
+                for added_item in perplexity_results["added"]:
+                    item_name = added_item.get("name") if isinstance(added_item, dict) else added_item
                     # Find the item in the database to get its expiration date
                     item_doc = db.items.find_one({"name": item_name.lower()})
                     if item_doc:
@@ -469,7 +584,7 @@ def upload_image_pair():
                             
                             # Store the image vector
                             print(f"Storing image vector for {item_name} with expiration period {expiration_period} days")
-                            store_image_vector(temp_image_path, item_name, expiration_period)
+                            store_image_vector(take_in_image.image, item_name, expiration_period, embedding=query_embedding)
                             results["vector_stored"] = True
                         except Exception as e:
                             print(f"Error storing vector for {item_name}: {str(e)}")
@@ -487,57 +602,122 @@ def upload_image_pair():
         print(f"Error in upload_image_pair: {str(e)}")
         return jsonify({"error": str(e)}), 500
 
+class _StaleConfirmation(Exception):
+    """Raised inside the confirm-updates transaction to roll the whole batch back."""
+
 @inventory_bp.route("/confirm-updates", methods=["POST"])
 def confirm_updates():
     """
     Endpoint to confirm and apply pending updates to item quantities.
+
+    The batch is applied as one unordered bulk write. An update that carries the
+    `old_quantity` the client saw is only applied while the item still has that
+    quantity (or already has the new one), so a concurrent change isn't overwritten.
+    With `?atomic=true` the batch runs in a transaction and is rolled back unless every
+    update applies. A present but invalid `old_quantity` rejects the request with a 400
+    rather than silently dropping the check.
     """
     try:
         data = request.get_json()
         if not data or not isinstance(data, list):
             return jsonify({"error": "Expected list of updates"}), 400
+        atomic = request.args.get("atomic", "false").lower() in ("1", "true", "yes")
+
+        invalid_old = [
+            update for update in data
+            if isinstance(update, dict) and update.get("old_quantity") is not None
+            and normalize_quantity(update["old_quantity"], default=None, strict=True) is None
+        ]
+        if invalid_old:
+            return jsonify({"error": "old_quantity must be a non-negative integer", "updates": invalid_old}), 400
 
         results = {"updated": [], "errors": []}
+        now = datetime.datetime.utcnow()
+        operations, planned, seen_ids = [], [], set()
         
         for update in data:
             item_id = update.get("item_id")
-            new_quantity = update.get("new_quantity")
+            new_quantity = normalize_quantity(update.get("new_quantity"), default=None, strict=True)
+            old_quantity = normalize_quantity(update.get("old_quantity"), default=None, strict=True)
             
-            if not item_id or new_quantity is None:
+            if not item_id or new_quantity is None or not ObjectId.is_valid(item_id):
                 results["errors"].append({
-                    "error": "Missing item_id or new_quantity",
+                    "error": "Missing or invalid item_id or new_quantity",
                     "update": update
                 })
                 continue
-                
-            try:
-                # Update the item quantity
-                result = db.items.update_one(
-                    {"_id": ObjectId(item_id)},
-                    {
-                        "$set": {
-                            "quantity": new_quantity,
-                            "date_added": datetime.datetime.utcnow()
-                        }
-                    }
-                )
-                
-                if result.modified_count > 0:
-                    results["updated"].append({
-                        "item_id": item_id,
-                        "new_quantity": new_quantity
-                    })
-                else:
-                    results["errors"].append({
-                        "error": "Item not found or no changes made",
-                        "item_id": item_id
-                    })
-            except Exception as e:
+            if item_id in seen_ids:
                 results["errors"].append({
-                    "error": str(e),
+                    "error": "Duplicate item_id in batch",
                     "item_id": item_id
                 })
+                continue
+            seen_ids.add(item_id)
+                
+            query = {"_id": ObjectId(item_id)}
+            if old_quantity is not None:
+                query["quantity"] = {"$in": [old_quantity, new_quantity]}
+            change = {"$set": {"quantity": new_quantity, "date_added": now}}
+            operations.append(UpdateOne(query, change))
+            planned.append((item_id, new_quantity, old_quantity, query, change))
+
+        if atomic and results["errors"]:
+            return jsonify({**results, "error": "Batch rejected; nothing was applied"}), 400
+        if not operations:
+            return jsonify(results), 200
+
+        def apply_batch(session=None):
+            result = db.items.bulk_write(operations, ordered=False, session=session)
+            outcome = {"updated": [], "errors": []}
+            if result.matched_count == len(operations):
+                outcome["updated"] = [{"item_id": item_id, "new_quantity": new_quantity}
+                                      for item_id, new_quantity, *_ in planned]
+                return outcome
+
+            # Some updates didn't match. Each filter still matches once its own update applied
+            # (the quantity is then new_quantity), so re-applying them one by one tells which did
+            unmatched = []
+            for item_id, new_quantity, old_quantity, query, change in planned:
+                applied = db.items.find_one_and_update(query, change, projection={"_id": 1},
+                                                       return_document=ReturnDocument.AFTER, session=session)
+                if applied is not None:
+                    outcome["updated"].append({"item_id": item_id, "new_quantity": new_quantity})
+                else:
+                    unmatched.append((item_id, old_quantity))
+
+            current = {
+                str(doc["_id"]): doc
+                for doc in db.items.find({"_id": {"$in": [ObjectId(item_id) for item_id, _ in unmatched]}},
+                                         {"quantity": 1}, session=session)
+            } if unmatched else {}
+            for item_id, old_quantity in unmatched:
+                doc = current.get(item_id)
+                if doc is None:
+                    outcome["errors"].append({"error": "Item not found", "item_id": item_id})
+                else:
+                    outcome["errors"].append({
+                        "error": "Quantity changed since it was read",
+                        "item_id": item_id,
+                        "expected_quantity": old_quantity,
+                        "current_quantity": doc.get("quantity")
+                    })
+            if session is not None and outcome["errors"]:
+                raise _StaleConfirmation(outcome)
+            return outcome
+
+        if atomic:
+            try:
+                with db.client.start_session() as session:
+                    outcome = session.with_transaction(apply_batch)
+            except _StaleConfirmation as stale:
+                outcome = stale.args[0]
+                return jsonify({"updated": [], "errors": outcome["errors"],
+                                "error": "Batch rolled back; nothing was applied"}), 409
+        else:
+            outcome = apply_batch()
         
+        results["updated"].extend(outcome["updated"])
+        results["errors"].extend(outcome["errors"])
         return jsonify(results), 200
         
     except Exception as e:
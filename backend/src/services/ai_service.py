@@ -6,51 +6,55 @@ import json
 import requests
 from dotenv import load_dotenv
 from typing import List
-from google.auth.transport.requests import Request
-from google.oauth2 import service_account
+from src.services.shelf_life_cache import get_shelf_life_cache, normalize_item_name
+from src.services.vertex_client import get_vertex_client
+from src.services.google_credentials import get_credential_provider
 
 # Load environment variables for API keys
 load_dotenv("../../../.venv/.env")
 GOOGLE_APPLICATION_CREDENTIALS = os.getenv("GOOGLE_APPLICATION_CREDENTIALS")
 PROJECT_ID = os.getenv("PROJECT_ID")
+# Item names per batched shelf-life prompt; larger lists are split into several calls
+SHELF_LIFE_BATCH_SIZE = int(os.getenv("SHELF_LIFE_BATCH_SIZE", "40"))
+
+# Structured output for batched shelf-life estimates: one {name, shelf_life_days} per item
+SHELF_LIFE_BATCH_SCHEMA = {
+    "type": "ARRAY",
+    "items": {
+        "type": "OBJECT",
+        "properties": {
+            "name": {"type": "STRING"},
+            "shelf_life_days": {"type": "INTEGER", "nullable": True}
+        },
+        "required": ["name", "shelf_life_days"]
+    }
+}
 
 class AIService:
-    def __init__(self):
+    def __init__(self, shelf_life_cache=None, vertex_client=None, credential_provider=None):
         # Initialize Google Cloud credentials and project
         self.project_id = PROJECT_ID
+        # Pooled keep-alive session with timeouts and retries, shared by every Vertex caller
+        self.vertex_client = vertex_client or get_vertex_client()
+        # Shelf lives never change for a given item, so Vertex is only asked on a cache miss
+        self.shelf_life_cache = shelf_life_cache or get_shelf_life_cache()
         self.credentials_path = GOOGLE_APPLICATION_CREDENTIALS
         
         if not self.project_id:
             print("Warning: PROJECT_ID not found in environment variables.")
         if not self.credentials_path:
-            print("Warning: GOOGLE_APPLICATION_CREDENTIALS not found in environment variables.")
+            print("GOOGLE_APPLICATION_CREDENTIALS not set; using application default credentials.")
             
-        # Set up authentication
-        self.credentials = None
-        if self.credentials_path and os.path.exists(self.credentials_path):
-            try:
-                self.credentials = service_account.Credentials.from_service_account_file(
-                    self.credentials_path,
-                    scopes=['https://www.googleapis.com/auth/cloud-platform']
-                )
-                print("Successfully loaded Google Cloud credentials.")
-            except Exception as e:
-                print(f"Error loading Google Cloud credentials: {str(e)}")
-        else:
-            print("Warning: Google Cloud credentials file not found. AI services may fail.")
+        # Set up authentication: one provider per process, shared by every AIService instance,
+        # keeps the token fresh in the background
+        self.credential_provider = credential_provider or get_credential_provider()
+        self.credentials = self.credential_provider.credentials
 
     def _get_access_token(self):
-        """Get a valid access token for Google Cloud API calls."""
-        if not self.credentials:
-            return None
-            
-        # Refresh the token if needed
-        if not self.credentials.valid:
-            self.credentials.refresh(Request())
-            
-        return self.credentials.token
+        """Get a valid access token for Google Cloud API calls (cached by the credential provider)."""
+        return self.credential_provider.get_token()
 
-    def _call_vertex_ai_api(self, prompt, model="gemini-2.0-flash", image_data=None, mime_type=None):
+    def _call_vertex_ai_api(self, prompt, model="gemini-2.0-flash", image_data=None, mime_type=None, generation_config=None):
         """
         Make a call to the Vertex AI Gemini API with optional image support.
         
@@ -59,6 +63,8 @@ class AIService:
             model (str): The model to use (default: gemini-2.0-flash)
             image_data (bytes, optional): Image data for multimodal requests
             mime_type (str, optional): MIME type of the image (e.g., 'image/jpeg')
+            generation_config (dict, optional): Overrides merged into the default generationConfig
+                (e.g. responseMimeType/responseSchema for structured output)
             
         Returns:
             str: The model's response text, or None on error
@@ -72,15 +78,6 @@ class AIService:
             print("Error: Could not get valid access token.")
             return None
             
-        # Construct the API endpoint
-        url = f"https://aiplatform.googleapis.com/v1/projects/{self.project_id}/locations/global/publishers/google/models/{model}:generateContent"
-        
-        # Set up headers
-        headers = {
-            "Authorization": f"Bearer {access_token}",
-            "Content-Type": "application/json"
-        }
-        
         # Construct the request body parts
         parts = []
         
@@ -113,9 +110,11 @@ class AIService:
                 "topK": 40
             }
         }
+        if generation_config:
+            request_body["generationConfig"].update(generation_config)
         
         try:
-            response = requests.post(url, headers=headers, json=request_body)
+            response = self.vertex_client.generate_content(self.project_id, model, request_body, access_token)
             response.raise_for_status()
             
             response_data = response.json()
@@ -141,6 +140,8 @@ class AIService:
         """
         Uses Google Vertex AI Gemini API to get general expiration information for a given food item.
 
+        Shelf lives are looked up in the shelf-life cache first; Vertex is only called on a miss.
+
         Args:
             item_name (str): The name of the food item (e.g., "apple", "milk_carton").
 
@@ -148,6 +149,11 @@ class AIService:
             datetime.date or None: An estimated expiration date (today + estimated shelf life),
                                    or None if information cannot be found or parsed.
         """
+        cached_days = self.shelf_life_cache.get(item_name)
+        if cached_days is not None:
+            print(f"AI Service: Cached shelf life for '{item_name}': {cached_days} days")
+            return datetime.date.today() + datetime.timedelta(days=cached_days)
+
         print(f"AI Service: Querying Vertex AI for general expiration of '{item_name}'...")
 
         # First try using the AI API if available
@@ -167,6 +173,7 @@ class AIService:
                     # Parse the AI response to extract duration
                     days_to_add = self._parse_expiration_duration(response_text)
                     if days_to_add is not None:
+                        self.shelf_life_cache.put(item_name, days_to_add)
                         estimated_expiration_date = datetime.date.today() + datetime.timedelta(days=days_to_add)
                         print(f"AI Service: Estimated expiration for '{item_name}' is {estimated_expiration_date}.")
                         return estimated_expiration_date
@@ -176,6 +183,129 @@ class AIService:
                 print(f"AI Service: Error querying Vertex AI for '{item_name}': {str(e)}. Using fallback.")
 
         # Fallback to simulated responses if AI API is not available or fails
+        days_to_add = self._get_fallback_expiration_days(item_name)
+        
+        if days_to_add is not None:
+            estimated_expiration_date = datetime.date.today() + datetime.timedelta(days=days_to_add)
+            print(f"AI Service: Estimated expiration for '{item_name}' is {estimated_expiration_date}.")
+            return estimated_expiration_date
+        else:
+            print(f"AI Service: Could not parse a specific duration for '{item_name}'.")
+            return None
+
+    def get_expiration_days_batch(self, item_names, batch_size=SHELF_LIFE_BATCH_SIZE):
+        """
+        Estimate shelf lives for several food items with one Vertex AI call per chunk.
+
+        Cached names are answered from the shelf-life cache; the rest are sent together in
+        a structured-output prompt (at most `batch_size` names per call). Names Vertex does
+        not answer fall back to the simulated responses, like get_general_expiration_info.
+
+        Args:
+            item_names (list): Food item names; duplicates are estimated once
+            batch_size (int): Maximum number of names per Vertex AI call
+
+        Returns:
+            dict: {item name: shelf life in days, or None if it could not be estimated}
+        """
+        results = {}
+        missing = []
+        for item_name in dict.fromkeys(item_names):
+            cached_days = self.shelf_life_cache.get(item_name)
+            if cached_days is not None:
+                results[item_name] = cached_days
+            else:
+                missing.append(item_name)
+        print(f"AI Service: Shelf life batch of {len(results) + len(missing)} items, {len(results)} cached")
+
+        if missing and self.project_id and self.credentials:
+            for start in range(0, len(missing), max(1, batch_size)):
+                chunk = missing[start:start + max(1, batch_size)]
+                estimates = self._query_shelf_life_batch(chunk)
+                for item_name in chunk:
+                    days = estimates.get(normalize_item_name(item_name))
+                    if days is not None:
+                        self.shelf_life_cache.put(item_name, days)
+                        results[item_name] = days
+
+        for item_name in missing:
+            if item_name not in results:
+                results[item_name] = self._get_fallback_expiration_days(item_name)
+        return results
+
+    def get_expiration_dates_batch(self, item_names):
+        """
+        Batched counterpart of get_general_expiration_info.
+
+        Args:
+            item_names (list): Food item names
+
+        Returns:
+            dict: {item name: datetime.date estimated expiration, or None}
+        """
+        today = datetime.date.today()
+        return {
+            item_name: today + datetime.timedelta(days=days) if days is not None else None
+            for item_name, days in self.get_expiration_days_batch(item_names).items()
+        }
+
+    def _query_shelf_life_batch(self, item_names):
+        """
+        Ask Vertex AI for the shelf lives of several items in one structured-output call.
+
+        Args:
+            item_names (list): Food item names (one chunk)
+
+        Returns:
+            dict: {normalised item name: days} for the items Vertex answered; empty on error
+        """
+        names_json = json.dumps(item_names)
+        prompt = (
+            f"For each food item in this JSON list, give its typical shelf life in days when stored properly "
+            f"(use the most common storage method if it varies): {names_json}. "
+            f"Answer with one entry per item, copying each name exactly as given. "
+            f"Use null for shelf_life_days if there is no sensible generic estimate."
+        )
+        generation_config = {
+            "temperature": 0.2,
+            "responseMimeType": "application/json",
+            "responseSchema": SHELF_LIFE_BATCH_SCHEMA
+        }
+
+        try:
+            print(f"AI Service: Querying Vertex AI for shelf lives of {len(item_names)} items...")
+            response_text = self._call_vertex_ai_api(prompt, generation_config=generation_config)
+            if not response_text:
+                print("AI Service: No response from Vertex AI for shelf life batch. Using fallback.")
+                return {}
+            entries = json.loads(response_text)
+        except (ValueError, TypeError) as e:
+            print(f"AI Service: Could not parse shelf life batch response: {str(e)}. Using fallback.")
+            return {}
+        except Exception as e:
+            print(f"AI Service: Error querying Vertex AI for shelf life batch: {str(e)}. Using fallback.")
+            return {}
+
+        estimates = {}
+        for entry in entries if isinstance(entries, list) else []:
+            if not isinstance(entry, dict):
+                continue
+            days = entry.get("shelf_life_days")
+            if isinstance(days, (int, float)) and not isinstance(days, bool) and days > 0:
+                estimates[normalize_item_name(entry.get("name"))] = int(days)
+        print(f"AI Service: Vertex AI estimated {len(estimates)}/{len(item_names)} shelf lives")
+        return estimates
+
+    def _get_fallback_expiration_days(self, item_name):
+        """
+        Shelf life in days from the simulated responses, used when Vertex AI is unavailable.
+
+        Args:
+            item_name (str): The name of the food item
+
+        Returns:
+            int or None: Number of days until expiration, or None if unknown
+        """
         print(f"AI Service: Using fallback data for '{item_name}'...")
         simulated_ai_responses = {
             "apple": "Apples typically last for 1-2 weeks in the refrigerator.",
@@ -194,15 +324,7 @@ class AIService:
         print(f"AI Service: Fallback response for '{item_name}': '{response_text}'")
 
         # Parse the response to extract a duration
-        days_to_add = self._parse_expiration_duration(response_text)
-        
-        if days_to_add is not None:
-            estimated_expiration_date = datetime.date.today() + datetime.timedelta(days=days_to_add)
-            print(f"AI Service: Estimated expiration for '{item_name}' is {estimated_expiration_date}.")
-            return estimated_expiration_date
-        else:
-            print(f"AI Service: Could not parse a specific duration for '{item_name}'.")
-            return None
+        return self._parse_expiration_duration(response_text)
 
     def _parse_expiration_duration(self, response_text):
         """
@@ -529,9 +651,10 @@ if __name__ == "__main__":
 
     # Test expiration info with real AI queries
     items_to_check = ["apple", "milk_carton", "banana", "unknown_item"]
+    exp_dates = ai.get_expiration_dates_batch(items_to_check)
     for item in items_to_check:
         print(f"\n🔍 Testing expiration info for: {item}")
-        exp_date = ai.get_general_expiration_info(item)
+        exp_date = exp_dates.get(item)
         if exp_date:
             print(f"✅ Estimated expiration for {item}: {exp_date.strftime('%Y-%m-%d')}")
         else:
@@ -0,0 +1,127 @@
+# backend/src/services/batching_encoder.py
+import os
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+ENCODER_MAX_BATCH_SIZE = int(os.getenv("ENCODER_MAX_BATCH_SIZE", "8"))
+ENCODER_MAX_WAIT_MS = float(os.getenv("ENCODER_MAX_WAIT_MS", "5"))
+
+
+class BatchingEncoder:
+    """
+    Micro-batching front-end for a shared encoder.
+
+    Concurrent callers submit single images; a worker thread collects requests for up to
+    `max_wait_ms` (or until `max_batch_size` are waiting), runs one batched `encode` call
+    and hands each caller its own row through a Future. Only the worker touches the model,
+    so request threads no longer contend for it. If a batch fails, its images are retried
+    one at a time, so one bad image only fails its own request.
+
+    Args:
+        model: Object with a SentenceTransformer-style `encode(list_of_images)` method
+        max_batch_size (int): Largest batch passed to the model
+        max_wait_ms (float): How long the first request in a batch waits for company
+    """
+
+    def __init__(self, model, max_batch_size=ENCODER_MAX_BATCH_SIZE, max_wait_ms=ENCODER_MAX_WAIT_MS):
+        self.model = model
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait_seconds = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._stats_lock = threading.Lock()
+        self._batches = 0
+        self._items = 0
+        self._encode_seconds = 0.0
+        self._batch_failures = 0
+        self._failed_items = 0
+        self._worker = threading.Thread(target=self._run, name="batching-encoder", daemon=True)
+        self._worker.start()
+
+    def submit(self, image):
+        """Queue one image for encoding and return a Future for its embedding."""
+        future = Future()
+        self._queue.put((image, future))
+        return future
+
+    def encode(self, image):
+        """
+        Encode a single image, batched with whatever other requests arrive at the same time.
+
+        Args:
+            image (PIL.Image.Image): Image to encode
+
+        Returns:
+            np.ndarray: The image embedding
+        """
+        return self.submit(image).result()
+
+    def _collect_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.perf_counter() + self.max_wait_seconds
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.perf_counter()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect_batch()
+            images = [image for image, _ in batch]
+            start = time.perf_counter()
+            try:
+                embeddings = self.model.encode(images, batch_size=len(images))
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    with self._stats_lock:
+                        self._failed_items += 1
+                    continue
+                print(f"Batched encode of {len(batch)} images failed ({str(e)}), retrying them one by one")
+                self._encode_individually(batch)
+                continue
+            elapsed = time.perf_counter() - start
+
+            for (_, future), embedding in zip(batch, embeddings):
+                future.set_result(embedding)
+
+            with self._stats_lock:
+                self._batches += 1
+                self._items += len(batch)
+                self._encode_seconds += elapsed
+
+    def _encode_individually(self, batch):
+        """Encode each request of a failed batch on its own so only the bad ones fail."""
+        failed = 0
+        start = time.perf_counter()
+        for image, future in batch:
+            try:
+                future.set_result(self.model.encode([image], batch_size=1)[0])
+            except Exception as e:
+                failed += 1
+                future.set_exception(e)
+        with self._stats_lock:
+            self._batch_failures += 1
+            self._failed_items += failed
+            self._batches += 1
+            self._items += len(batch) - failed
+            self._encode_seconds += time.perf_counter() - start
+
+    def stats(self):
+        """Return batching counters."""
+        with self._stats_lock:
+            return {
+                "batches": self._batches,
+                "items": self._items,
+                "avg_batch_size": round(self._items / self._batches, 2) if self._batches else 0.0,
+                "encode_seconds": round(self._encode_seconds, 3),
+                "batch_failures": self._batch_failures,
+                "failed_items": self._failed_items,
+                "queue_depth": self._queue.qsize(),
+                "max_batch_size": self.max_batch_size,
+                "max_wait_ms": self.max_wait_seconds * 1000,
+            }
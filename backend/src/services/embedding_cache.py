@@ -0,0 +1,141 @@
+# backend/src/services/embedding_cache.py
+import datetime
+import hashlib
+import os
+import threading
+import numpy as np
+from bson.binary import Binary
+from src.helper.lru_cache import LRUCache
+
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "2048"))
+EMBEDDING_CACHE_PERSISTENT = os.getenv("EMBEDDING_CACHE_PERSISTENT", "false").lower() in ("1", "true", "yes")
+EMBEDDING_CACHE_COLLECTION = "embedding_cache"
+
+
+def image_content_hash(image):
+    """
+    Hash the decoded pixels of a PIL image.
+
+    Hashing pixels rather than file bytes means re-uploads of the same photo match even
+    if the container (EXIF, re-encoding by the client) differs.
+
+    Args:
+        image (PIL.Image.Image): Decoded image
+
+    Returns:
+        str: Hex digest identifying the image content
+    """
+    digest = hashlib.blake2b(digest_size=20)
+    digest.update(f"{image.mode}:{image.size[0]}x{image.size[1]}:".encode())
+    digest.update(image.tobytes())
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Two-level cache of image embeddings keyed by (model, image content hash).
+
+    The first level is an in-process LRU; the optional second level is a MongoDB
+    collection shared by every worker, holding embeddings as packed float32 bytes.
+    """
+
+    def __init__(self, max_size=EMBEDDING_CACHE_SIZE, collection=None):
+        self.memory = LRUCache(max_size)
+        self.collection = collection
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(model_name, content_hash):
+        return f"{model_name}:{content_hash}"
+
+    def get(self, model_name, content_hash):
+        """
+        Look up an embedding.
+
+        Args:
+            model_name (str): Encoder that produced the embedding
+            content_hash (str): Result of image_content_hash()
+
+        Returns:
+            np.ndarray or None: The cached embedding, or None on a miss
+        """
+        key = self._key(model_name, content_hash)
+        embedding = self.memory.get(key)
+        if embedding is not None or self.collection is None:
+            return embedding
+
+        try:
+            doc = self.collection.find_one({"_id": key}, {"embedding": 1})
+        except Exception as e:
+            print(f"Embedding cache lookup failed: {str(e)}")
+            doc = None
+
+        with self._lock:
+            if doc is None:
+                self.persistent_misses += 1
+                return None
+            self.persistent_hits += 1
+        embedding = np.frombuffer(doc["embedding"], dtype=np.float32)
+        self.memory.put(key, embedding)
+        return embedding
+
+    def put(self, model_name, content_hash, embedding):
+        """Store an embedding in memory and, if enabled, in the persistent collection."""
+        key = self._key(model_name, content_hash)
+        embedding = np.asarray(embedding, dtype=np.float32)
+        self.memory.put(key, embedding)
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {
+                    "_id": key,
+                    "model": model_name,
+                    "embedding": Binary(embedding.tobytes()),
+                    "created_at": datetime.datetime.utcnow()
+                },
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Embedding cache write failed: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters for both cache levels."""
+        memory_stats = self.memory.stats()
+        with self._lock:
+            persistent_hits = self.persistent_hits
+            persistent_misses = self.persistent_misses
+        lookups = memory_stats["hits"] + memory_stats["misses"]
+        return {
+            "memory": memory_stats,
+            "persistent_enabled": self.collection is not None,
+            "persistent_hits": persistent_hits,
+            "persistent_misses": persistent_misses,
+            "hit_rate": round((memory_stats["hits"] + persistent_hits) / lookups, 4) if lookups else 0.0,
+        }
+
+
+_embedding_cache = None
+_embedding_cache_lock = threading.Lock()
+
+
+def get_embedding_cache(db=None):
+    """
+    Return the process-wide embedding cache, creating it on first use.
+
+    Args:
+        db: MongoDB database for the persistent level (used only if EMBEDDING_CACHE_PERSISTENT is set)
+
+    Returns:
+        EmbeddingCache: The shared cache
+    """
+    global _embedding_cache
+    if _embedding_cache is None:
+        with _embedding_cache_lock:
+            if _embedding_cache is None:
+                collection = db[EMBEDDING_CACHE_COLLECTION] if (EMBEDDING_CACHE_PERSISTENT and db is not None) else None
+                _embedding_cache = EmbeddingCache(collection=collection)
+    return _embedding_cache
@@ -0,0 +1,69 @@
+# backend/src/services/embedding_codec.py
+import os
+import numpy as np
+from bson.binary import Binary, USER_DEFINED_SUBTYPE
+
+# BSON binary vector subtype (what Atlas Vector Search indexes natively) and its float32 dtype byte
+BSON_VECTOR_SUBTYPE = 9
+BSON_VECTOR_FLOAT32 = 0x27
+_FLOAT32_HEADER = bytes([BSON_VECTOR_FLOAT32, 0])
+
+# float32 (default) is indexable by Atlas; float16 halves storage again but is only
+# searchable through the in-process caches, since Atlas has no float16 vector type
+EMBEDDING_STORAGE_DTYPE = os.getenv("EMBEDDING_STORAGE_DTYPE", "float32").lower()
+if EMBEDDING_STORAGE_DTYPE not in ("float32", "float16"):
+    raise ValueError(f"EMBEDDING_STORAGE_DTYPE must be float32 or float16, not {EMBEDDING_STORAGE_DTYPE!r}")
+# Whether Atlas $vectorSearch can see the stored vectors; if not, searches go to the in-process index
+ATLAS_SEARCHABLE_STORAGE = EMBEDDING_STORAGE_DTYPE == "float32"
+
+
+def encode_embedding(embedding, dtype=None):
+    """
+    Pack an embedding into a compact BSON binary value.
+
+    Args:
+        embedding (array-like): The vector to store
+        dtype (str, optional): "float32" or "float16"; defaults to EMBEDDING_STORAGE_DTYPE
+
+    Returns:
+        bson.binary.Binary: float32 as a BSON vector (subtype 9), float16 as user-defined binary
+    """
+    dtype = (dtype or EMBEDDING_STORAGE_DTYPE).lower()
+    vector = np.asarray(embedding)
+    if dtype == "float16":
+        return Binary(vector.astype("<f2").tobytes(), USER_DEFINED_SUBTYPE)
+    if dtype != "float32":
+        raise ValueError(f"Unsupported embedding storage dtype: {dtype}")
+    return Binary(_FLOAT32_HEADER + vector.astype("<f4").tobytes(), BSON_VECTOR_SUBTYPE)
+
+
+def decode_embedding(value):
+    """
+    Turn a stored embedding back into a float32 numpy array.
+
+    Reads packed float32 vectors without copying, and still understands the legacy
+    format where embeddings were stored as a list of BSON doubles.
+
+    Args:
+        value: The stored `embedding` field (Binary, bytes or list)
+
+    Returns:
+        np.ndarray or None: The vector, or None if the value is missing or empty
+    """
+    if value is None or len(value) == 0:
+        return None
+    if isinstance(value, Binary):
+        if value.subtype == BSON_VECTOR_SUBTYPE:
+            if value[0] != BSON_VECTOR_FLOAT32:
+                raise ValueError(f"Unsupported BSON vector dtype: {value[0]:#x}")
+            return np.frombuffer(value, dtype="<f4", offset=2)
+        if value.subtype == USER_DEFINED_SUBTYPE:
+            return np.frombuffer(value, dtype="<f2").astype(np.float32)
+        raise ValueError(f"Unsupported embedding binary subtype: {value.subtype}")
+    # Legacy documents store a list of doubles
+    return np.asarray(value, dtype=np.float32)
+
+
+def is_legacy_embedding(value):
+    """Return True if the stored embedding still uses the list-of-doubles format."""
+    return isinstance(value, list)
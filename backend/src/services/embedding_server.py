@@ -0,0 +1,393 @@
+# backend/src/services/embedding_server.py
+"""
+Out-of-process image embedding server.
+
+One sidecar process owns torch and the CLIP model; Flask workers send it raw pixels over
+a local Unix socket and get float32 vectors back, so each worker stays small.
+
+Run from the backend directory:
+    python -m src.services.embedding_server --socket /tmp/smart-fridge-embeddings.sock
+
+and start the API with EMBEDDING_BACKEND=sidecar.
+
+Wire format (both directions): a frame is two big-endian uint32s (header length, payload
+length), a JSON header and a binary payload. Requests are {"op": "encode", "model",
+"mode", "size"} with the image's raw pixels as payload, or {"op": "stats"}. Encode
+responses carry {"ok": true, "dims": n} and the embedding as float32 bytes; stats include
+the server's `encoder_id` (e.g. "clip-ViT-L-14/onnx-int8"), which clients use as their
+embedding cache key.
+"""
+import argparse
+import collections
+import json
+import os
+import socket
+import socketserver
+import struct
+import threading
+import time
+import numpy as np
+from PIL import Image
+from src.services.model_registry import DEFAULT_CLIP_MODEL, ENCODER_INPUT_SHORT_SIDE, prepare_encoder_image
+
+EMBEDDING_SOCKET_PATH = os.getenv("EMBEDDING_SOCKET_PATH", "/tmp/smart-fridge-embeddings.sock")
+EMBEDDING_SIDECAR_TIMEOUT = float(os.getenv("EMBEDDING_SIDECAR_TIMEOUT", "30"))
+
+_FRAME_HEADER = struct.Struct(">II")
+_LATENCY_WINDOW = 1000
+
+
+def _send_frame(sock, header, payload=b""):
+    header_bytes = json.dumps(header).encode("utf-8")
+    sock.sendall(_FRAME_HEADER.pack(len(header_bytes), len(payload)) + header_bytes)
+    if payload:
+        sock.sendall(payload)
+
+
+def _recv_exact(sock, size):
+    buffer = bytearray(size)
+    view = memoryview(buffer)
+    received = 0
+    while received < size:
+        n = sock.recv_into(view[received:], size - received)
+        if n == 0:
+            raise ConnectionError("Embedding socket closed mid-frame")
+        received += n
+    return buffer
+
+
+def _recv_frame(sock):
+    """Read one frame; returns (None, None) if the peer closed the connection between frames."""
+    first = sock.recv(_FRAME_HEADER.size)
+    if not first:
+        return None, None
+    if len(first) < _FRAME_HEADER.size:
+        first += _recv_exact(sock, _FRAME_HEADER.size - len(first))
+    header_size, payload_size = _FRAME_HEADER.unpack(first)
+    header = json.loads(_recv_exact(sock, header_size).decode("utf-8"))
+    payload = _recv_exact(sock, payload_size) if payload_size else b""
+    return header, payload
+
+
+def _latency_summary(latencies):
+    if not latencies:
+        return {"p50_ms": None, "p99_ms": None}
+    values = np.asarray(latencies) * 1000
+    return {
+        "p50_ms": round(float(np.percentile(values, 50)), 2),
+        "p99_ms": round(float(np.percentile(values, 99)), 2),
+    }
+
+
+class _EmbeddingRequestHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        server = self.server.embedding_server
+        server._connection_opened()
+        try:
+            while True:
+                header, payload = _recv_frame(self.request)
+                if header is None:
+                    return
+                _send_frame(self.request, *server.handle_request(header, payload))
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            server._connection_closed()
+
+
+class _UnixServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class EmbeddingServer:
+    """
+    Serves `encoder.encode(image)` to other processes over a Unix socket.
+
+    Each client connection gets its own thread; pass a BatchingEncoder so requests from
+    different workers are encoded together.
+
+    Args:
+        encoder: Object exposing `encode(image)` (typically from get_image_encoder)
+        socket_path (str): Filesystem path of the Unix socket
+        model_name (str): Model the encoder runs; requests for another model are rejected
+        encoder_id (str, optional): Identifier of the embeddings produced (see get_encoder_id);
+                                    defaults to the model name
+    """
+
+    def __init__(self, encoder, socket_path=EMBEDDING_SOCKET_PATH, model_name=DEFAULT_CLIP_MODEL, encoder_id=None):
+        self.encoder = encoder
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.encoder_id = encoder_id or model_name
+        self._server = None
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+        self._requests = 0
+        self._errors = 0
+        self._in_flight = 0
+        self._connections = 0
+        self._started_at = None
+
+    def handle_request(self, header, payload):
+        """Run one request and return the (header, payload) response."""
+        op = header.get("op")
+        if op == "stats":
+            return {"ok": True, "stats": self.stats()}, b""
+        if op != "encode":
+            return {"ok": False, "error": f"Unknown op: {op}"}, b""
+        if header.get("model", self.model_name) != self.model_name:
+            return {"ok": False, "error": f"Server runs {self.model_name}, not {header.get('model')}"}, b""
+
+        with self._lock:
+            self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            image = Image.frombytes(header["mode"], tuple(header["size"]), bytes(payload))
+            embedding = np.asarray(self.encoder.encode(image), dtype=np.float32)
+            response = {"ok": True, "dims": int(embedding.shape[-1])}, embedding.tobytes()
+        except Exception as e:
+            print(f"Embedding server: encode failed: {str(e)}")
+            response = {"ok": False, "error": str(e)}, b""
+        elapsed = time.perf_counter() - start
+
+        with self._lock:
+            self._in_flight -= 1
+            self._requests += 1
+            if response[0]["ok"]:
+                self._latencies.append(elapsed)
+            else:
+                self._errors += 1
+        return response
+
+    def _connection_opened(self):
+        with self._lock:
+            self._connections += 1
+
+    def _connection_closed(self):
+        with self._lock:
+            self._connections -= 1
+
+    def _bind(self):
+        if os.path.exists(self.socket_path):
+            # Refuse to steal the socket from a live server; clear a stale one
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                raise RuntimeError(f"An embedding server is already listening on {self.socket_path}")
+            except (ConnectionRefusedError, FileNotFoundError):
+                os.unlink(self.socket_path)
+            finally:
+                probe.close()
+        self._server = _UnixServer(self.socket_path, _EmbeddingRequestHandler)
+        self._server.embedding_server = self
+        self._started_at = time.time()
+        print(f"Embedding server for {self.model_name} listening on {self.socket_path}")
+
+    def serve_forever(self):
+        """Bind the socket and serve until shutdown() is called."""
+        self._bind()
+        try:
+            self._server.serve_forever()
+        finally:
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def start(self):
+        """Bind the socket and serve from a daemon thread; returns the thread."""
+        self._bind()
+        thread = threading.Thread(target=self._server.serve_forever, name="embedding-server", daemon=True)
+        thread.start()
+        return thread
+
+    def shutdown(self):
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            if os.path.exists(self.socket_path):
+                os.unlink(self.socket_path)
+
+    def stats(self):
+        """Return request counts, queue depth and latency percentiles."""
+        with self._lock:
+            stats = {
+                "model_name": self.model_name,
+                "encoder_id": self.encoder_id,
+                "pid": os.getpid(),
+                "uptime_seconds": round(time.time() - self._started_at, 1) if self._started_at else None,
+                "connections": self._connections,
+                "requests": self._requests,
+                "errors": self._errors,
+                "in_flight": self._in_flight,
+                **_latency_summary(list(self._latencies)),
+            }
+        if hasattr(self.encoder, "stats"):
+            stats["encoder"] = self.encoder.stats()
+            stats["queue_depth"] = stats["encoder"].get("queue_depth", 0)
+        else:
+            stats["queue_depth"] = 0
+        return stats
+
+
+class SidecarEncoder:
+    """
+    Client for EmbeddingServer with the same `encode(image)` interface as the in-process model.
+
+    Each calling thread keeps its own persistent connection; a broken connection is
+    re-opened once before the error is raised.
+
+    Args:
+        socket_path (str): Filesystem path of the server's Unix socket
+        model_name (str): Model the server is expected to run
+        timeout (float): Socket timeout in seconds
+        max_side (int): Downscale images whose short side exceeds this before sending (0 disables);
+                        keep it equal to ENCODER_INPUT_SHORT_SIDE so vectors match the in-process path
+    """
+
+    def __init__(self, socket_path=EMBEDDING_SOCKET_PATH, model_name=DEFAULT_CLIP_MODEL,
+                 timeout=EMBEDDING_SIDECAR_TIMEOUT, max_side=ENCODER_INPUT_SHORT_SIDE):
+        self.socket_path = socket_path
+        self.model_name = model_name
+        self.timeout = timeout
+        self.max_side = max_side
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._latencies = collections.deque(maxlen=_LATENCY_WINDOW)
+        self._requests = 0
+        self._errors = 0
+        self._reconnects = 0
+        self._encoder_id = None
+
+    def _connection(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.socket_path)
+            self._local.sock = sock
+        return sock
+
+    def _reset_connection(self):
+        sock = getattr(self._local, "sock", None)
+        self._local.sock = None
+        self._encoder_id = None  # The server may have been restarted with another backend
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _request(self, header, payload=b""):
+        for attempt in range(2):
+            try:
+                sock = self._connection()
+                _send_frame(sock, header, payload)
+                response, body = _recv_frame(sock)
+                if response is None:
+                    raise ConnectionError("Embedding server closed the connection")
+                return response, body
+            except (ConnectionError, OSError):
+                self._reset_connection()
+                if attempt:
+                    raise
+                with self._lock:
+                    self._reconnects += 1
+
+    def encode(self, image):
+        """
+        Encode a PIL image (or a list of them) on the embedding server.
+
+        Returns:
+            np.ndarray: The image embedding (or a 2-D array for a list)
+        """
+        if isinstance(image, list):
+            return np.stack([self.encode(single) for single in image])
+        # Same preprocessing as the in-process path; RGB also because raw palette/alpha pixels don't survive frombytes
+        image = prepare_encoder_image(image, self.max_side)
+
+        start = time.perf_counter()
+        try:
+            response, body = self._request(
+                {"op": "encode", "model": self.model_name, "mode": image.mode, "size": list(image.size)},
+                image.tobytes(),
+            )
+        except Exception:
+            with self._lock:
+                self._errors += 1
+            raise
+        if not response.get("ok"):
+            with self._lock:
+                self._errors += 1
+            raise RuntimeError(f"Embedding server error: {response.get('error')}")
+
+        with self._lock:
+            self._requests += 1
+            self._latencies.append(time.perf_counter() - start)
+        return np.frombuffer(body, dtype=np.float32)
+
+    def server_stats(self):
+        """Return the server's stats, or None if it cannot be reached."""
+        try:
+            response, _ = self._request({"op": "stats"})
+            return response.get("stats")
+        except (ConnectionError, OSError):
+            self._reset_connection()
+            return None
+
+    def ping(self):
+        """Return True if the embedding server is reachable."""
+        return self.server_stats() is not None
+
+    def get_encoder_id(self):
+        """
+        Return the encoder id the server reports, asking it once per connection.
+
+        Raises:
+            ConnectionError: If the server cannot be reached
+        """
+        encoder_id = self._encoder_id
+        if encoder_id is None:
+            stats = self.server_stats()
+            if stats is None:
+                raise ConnectionError(f"Embedding server not reachable at {self.socket_path}")
+            encoder_id = self._encoder_id = stats.get("encoder_id") or self.model_name
+        return encoder_id
+
+    def stats(self):
+        """Return client-side round-trip stats plus the server's own stats."""
+        with self._lock:
+            stats = {
+                "backend": "sidecar",
+                "socket_path": self.socket_path,
+                "requests": self._requests,
+                "errors": self._errors,
+                "reconnects": self._reconnects,
+                **_latency_summary(list(self._latencies)),
+            }
+        stats["server"] = self.server_stats()
+        return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve CLIP image embeddings over a Unix socket")
+    parser.add_argument("--socket", default=EMBEDDING_SOCKET_PATH, help="Unix socket path")
+    parser.add_argument("--model", default=DEFAULT_CLIP_MODEL, help="sentence-transformers model id")
+    parser.add_argument("--device", default=None, help="Torch device, e.g. cpu or cuda")
+    parser.add_argument("--backend", choices=["inprocess", "onnx"], default="inprocess",
+                        help="Run sentence-transformers or the exported ONNX graph")
+    args = parser.parse_args(argv)
+
+    from src.services.model_registry import get_image_encoder, get_encoder_id
+
+    encoder = get_image_encoder(args.model, args.device, backend=args.backend)
+    encoder.encode(Image.new("RGB", (224, 224), color="white"))  # Warm-up before accepting requests
+    server = EmbeddingServer(encoder, args.socket, args.model, get_encoder_id(args.model, backend=args.backend))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Embedding server stopped")
+    return 0
+
+
+if __name__ == "__main__":
+    main()
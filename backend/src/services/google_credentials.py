@@ -0,0 +1,167 @@
+# backend/src/services/google_credentials.py
+import datetime
+import os
+import threading
+import google.auth
+from google.auth.transport.requests import Request
+from google.oauth2 import service_account
+
+CLOUD_PLATFORM_SCOPES = ["https://www.googleapis.com/auth/cloud-platform"]
+# Refresh this many seconds before the token expires (google-auth itself treats tokens as stale ~4 minutes early)
+GOOGLE_TOKEN_REFRESH_MARGIN = int(os.getenv("GOOGLE_TOKEN_REFRESH_MARGIN", "600"))
+# Wait before retrying a failed background refresh
+GOOGLE_TOKEN_RETRY_SECONDS = int(os.getenv("GOOGLE_TOKEN_RETRY_SECONDS", "30"))
+
+
+class CredentialProvider:
+    """
+    Process-wide Google Cloud credentials with an access token kept warm in the background.
+
+    Credentials are loaded once, from the service-account file if it exists, otherwise from
+    Application Default Credentials. After the first token is minted a daemon thread refreshes
+    it `refresh_margin` seconds before it expires, so request handlers read a cached token and
+    never wait on the OAuth endpoint. A refresh only happens on the request path if there is
+    no usable token yet (first call, or the background refresh kept failing).
+    """
+
+    def __init__(self, credentials_path=None, scopes=CLOUD_PLATFORM_SCOPES,
+                 refresh_margin=GOOGLE_TOKEN_REFRESH_MARGIN, retry_seconds=GOOGLE_TOKEN_RETRY_SECONDS):
+        self.credentials_path = credentials_path
+        self.refresh_margin = datetime.timedelta(seconds=refresh_margin)
+        self.retry_seconds = retry_seconds
+        self.credentials = self._load_credentials(credentials_path, scopes)
+        self.background_refreshes = 0
+        self.blocking_refreshes = 0
+        self.refresh_failures = 0
+        self.last_error = None
+        self._refresh_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self._stop = threading.Event()
+
+    @staticmethod
+    def _load_credentials(credentials_path, scopes):
+        if credentials_path and os.path.exists(credentials_path):
+            try:
+                credentials = service_account.Credentials.from_service_account_file(credentials_path, scopes=scopes)
+                print("Successfully loaded Google Cloud credentials.")
+                return credentials
+            except Exception as e:
+                print(f"Error loading Google Cloud credentials: {str(e)}")
+                return None
+
+        print("Warning: Google Cloud credentials file not found, trying application default credentials.")
+        try:
+            credentials, _ = google.auth.default(scopes=scopes)
+            return credentials
+        except Exception as e:
+            print(f"Warning: No Google Cloud credentials available. AI services may fail: {str(e)}")
+            return None
+
+    def get_token(self):
+        """
+        Return a valid access token, minting one only if none is usable yet.
+
+        Returns:
+            str or None: OAuth access token, or None without credentials or if minting failed
+        """
+        if self.credentials is None:
+            return None
+        if not self.credentials.valid:
+            with self._refresh_lock:
+                # Another thread may have refreshed while we waited for the lock
+                if not self.credentials.valid:
+                    if not self._refresh(blocking=True):
+                        return None
+        self._ensure_refresher()
+        return self.credentials.token
+
+    def has_token(self):
+        """Whether a valid token is cached (used by the readiness probe)."""
+        return self.credentials is not None and self.credentials.valid
+
+    def _refresh(self, blocking):
+        """Refresh the token; the caller holds `_refresh_lock`. Returns True on success."""
+        try:
+            self.credentials.refresh(Request())
+        except Exception as e:
+            print(f"Google credentials: token refresh failed: {str(e)}")
+            with self._stats_lock:
+                self.refresh_failures += 1
+                self.last_error = str(e)
+            return False
+        with self._stats_lock:
+            if blocking:
+                self.blocking_refreshes += 1
+            else:
+                self.background_refreshes += 1
+            self.last_error = None
+        return True
+
+    def _seconds_until_refresh(self):
+        expiry = self.credentials.expiry
+        if expiry is None:
+            return self.retry_seconds
+        # google-auth stores expiry as naive UTC
+        now = datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+        return max(0.0, (expiry - self.refresh_margin - now).total_seconds())
+
+    def _ensure_refresher(self):
+        # is_alive() is also False in a forked worker, which then starts its own thread
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._thread_lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._refresh_loop, name="google-token-refresh", daemon=True)
+                self._thread.start()
+
+    def _refresh_loop(self):
+        delay = self._seconds_until_refresh()
+        while not self._stop.wait(delay):
+            with self._refresh_lock:
+                refreshed = self._refresh(blocking=False)
+            delay = self._seconds_until_refresh() if refreshed else self.retry_seconds
+            if refreshed and delay == 0:
+                # Token lifetime shorter than the margin; don't spin
+                delay = self.retry_seconds
+
+    def stop(self):
+        """Stop the background refresh thread."""
+        self._stop.set()
+
+    def stats(self):
+        """Return token state and refresh counters."""
+        expiry = self.credentials.expiry if self.credentials is not None else None
+        with self._stats_lock:
+            return {
+                "credentials_loaded": self.credentials is not None,
+                "token_valid": self.has_token(),
+                "expires_at": expiry.isoformat() + "Z" if expiry else None,
+                "background_refreshes": self.background_refreshes,
+                "blocking_refreshes": self.blocking_refreshes,
+                "refresh_failures": self.refresh_failures,
+                "last_error": self.last_error,
+                "refresher_running": self._thread is not None and self._thread.is_alive(),
+            }
+
+
+_credential_provider = None
+_credential_provider_lock = threading.Lock()
+
+
+def get_credential_provider():
+    """
+    Return the process-wide credential provider, creating it on first use.
+
+    The service-account path is read from GOOGLE_APPLICATION_CREDENTIALS at that point, so
+    callers should load their .env first.
+
+    Returns:
+        CredentialProvider: The shared provider
+    """
+    global _credential_provider
+    with _credential_provider_lock:
+        if _credential_provider is None:
+            _credential_provider = CredentialProvider(os.getenv("GOOGLE_APPLICATION_CREDENTIALS"))
+    return _credential_provider
@@ -0,0 +1,177 @@
+# backend/src/services/image_store.py
+"""
+Content-addressed image storage in GridFS.
+
+Each distinct image is stored once, keyed by the SHA-256 of its bytes, with a small
+thumbnail generated next to it. Items keep only the hash (`image_hash`) and the API
+serves the bytes from `/api/inventory/images/<hash>`; since content never changes for
+a given hash, responses can be cached indefinitely.
+
+Images are not deleted together with items: the same photo is usually shared by every
+item identified in it.
+"""
+import base64
+import binascii
+import hashlib
+import io
+import os
+import re
+import threading
+import gridfs
+from gridfs.errors import FileExists
+from PIL import Image, ImageOps
+from src.helper.image_ingress import sniff_mime_type
+
+IMAGE_BUCKET = "images"
+IMAGE_THUMBNAIL_SIZE = int(os.getenv("IMAGE_THUMBNAIL_SIZE", "256"))  # Long side in pixels
+IMAGE_THUMBNAIL_QUALITY = int(os.getenv("IMAGE_THUMBNAIL_QUALITY", "80"))
+
+VARIANTS = ("original", "thumb")
+_HASH_PATTERN = re.compile(r"^[0-9a-f]{64}$")
+
+
+def image_sha256(data):
+    """Return the hex SHA-256 of encoded image bytes."""
+    return hashlib.sha256(data).hexdigest()
+
+
+def is_image_hash(value):
+    """True if `value` looks like a hash produced by `image_sha256`."""
+    return isinstance(value, str) and bool(_HASH_PATTERN.match(value))
+
+
+def inline_image_bytes(doc):
+    """Return the inline image of a pre-image-store item as bytes, or None."""
+    image_data = doc.get("image_data")
+    if isinstance(image_data, bytes):
+        return image_data
+    image_url = doc.get("image_url")
+    if not image_data and isinstance(image_url, str) and image_url.startswith("data:image"):
+        image_data = image_url.split(",", 1)[-1]
+    if isinstance(image_data, str) and image_data:
+        try:
+            return base64.b64decode(image_data.split("base64,", 1)[-1])
+        except binascii.Error:
+            return None
+    return None
+
+
+def make_thumbnail(data, size=IMAGE_THUMBNAIL_SIZE, quality=IMAGE_THUMBNAIL_QUALITY):
+    """
+    Render a JPEG thumbnail with its long side at most `size` pixels.
+
+    Returns:
+        bytes: Encoded thumbnail
+    """
+    image = Image.open(io.BytesIO(data))
+    image.draft("RGB", (size, size))
+    image = ImageOps.exif_transpose(image)
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    image.thumbnail((size, size), Image.BICUBIC)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return buffer.getvalue()
+
+
+class ImageStore:
+    """
+    GridFS-backed image store. File ids are `<hash>` for the original and `<hash>.thumb`
+    for the thumbnail, so lookups never need a secondary index.
+
+    Args:
+        db: MongoDB database
+        bucket (str): GridFS bucket name
+    """
+
+    def __init__(self, db, bucket=IMAGE_BUCKET):
+        self.db = db
+        self.bucket = bucket
+        self.fs = gridfs.GridFS(db, collection=bucket)
+
+    @staticmethod
+    def _file_id(image_hash, variant):
+        return image_hash if variant == "original" else f"{image_hash}.{variant}"
+
+    def put(self, data, mime_type=None):
+        """
+        Store an image (and its thumbnail) unless it is already present.
+
+        Args:
+            data (bytes): Encoded image bytes
+            mime_type (str, optional): Content type; sniffed from the bytes if not given
+
+        Returns:
+            str: The image hash to keep on the item
+        """
+        if isinstance(data, (bytearray, memoryview)):
+            data = bytes(data)
+        image_hash = image_sha256(data)
+        if self.fs.exists(image_hash):
+            return image_hash
+
+        mime_type = mime_type or sniff_mime_type(data)
+        try:
+            thumbnail = make_thumbnail(data)
+        except Exception as e:
+            print(f"Could not create thumbnail for image {image_hash[:12]}: {str(e)}")
+            thumbnail = None
+
+        # Thumbnail first: once the original exists, readers assume the thumbnail does too
+        if thumbnail is not None:
+            self._put_file(thumbnail, self._file_id(image_hash, "thumb"), "image/jpeg", image_hash, "thumb")
+        self._put_file(data, image_hash, mime_type, image_hash, "original")
+        print(f"Stored image {image_hash[:12]} ({len(data) / 1024:.0f} KB"
+              + (f", thumbnail {len(thumbnail) / 1024:.0f} KB)" if thumbnail is not None else ")"))
+        return image_hash
+
+    def _put_file(self, data, file_id, mime_type, image_hash, variant):
+        try:
+            self.fs.put(data, _id=file_id, contentType=mime_type,
+                        metadata={"sha256": image_hash, "variant": variant})
+        except FileExists:
+            pass  # Stored concurrently by another request; content is identical by construction
+
+    def get(self, image_hash, variant="original"):
+        """
+        Read an image or its thumbnail.
+
+        Falls back to the original when a thumbnail couldn't be generated.
+
+        Returns:
+            tuple: (bytes, content type), or None if the image is unknown
+        """
+        if variant not in VARIANTS or not is_image_hash(image_hash):
+            return None
+        for file_id in dict.fromkeys((self._file_id(image_hash, variant), image_hash)):
+            try:
+                grid_out = self.fs.get(file_id)
+            except gridfs.NoFile:
+                continue
+            return grid_out.read(), grid_out.content_type or "application/octet-stream"
+        return None
+
+    def exists(self, image_hash):
+        return is_image_hash(image_hash) and self.fs.exists(image_hash)
+
+
+_image_store = None
+_image_store_lock = threading.Lock()
+
+
+def get_image_store(db):
+    """
+    Return the process-wide image store, creating it on first use.
+
+    Args:
+        db: MongoDB database
+
+    Returns:
+        ImageStore: The shared store
+    """
+    global _image_store
+    if _image_store is None:
+        with _image_store_lock:
+            if _image_store is None:
+                _image_store = ImageStore(db)
+    return _image_store
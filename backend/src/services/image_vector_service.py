@@ -1,161 +1,252 @@
+import io
 import os
+import time
+from datetime import datetime
 import numpy as np
 from pathlib import Path
 from PIL import Image
-from sentence_transformers import SentenceTransformer
+from bson.binary import Binary
+from pymongo.operations import SearchIndexModel
 from src.db_connector import get_db_instance, close_db_connection
+from src.services.model_registry import (get_image_encoder, get_encoder_id, get_model_dimensions,
+                                        prepare_encoder_image, DEFAULT_CLIP_MODEL)
+from src.services.vector_index import search_cached_vectors, add_to_vector_caches, RESULT_FIELDS
+from src.services.embedding_cache import get_embedding_cache, image_content_hash
+from src.services.embedding_codec import encode_embedding, ATLAS_SEARCHABLE_STORAGE
+from src.services.vector_metadata import get_collection_metadata
+
+VECTOR_SEARCH_NUM_CANDIDATES = int(os.getenv("VECTOR_SEARCH_NUM_CANDIDATES", "100"))
+
+# Vectors made by the original model keep living in the original collection
+LEGACY_VECTOR_MODEL = "clip-ViT-L-14"
+# Downscaled copies of the images behind each vector, so they can be re-embedded with another model
+SOURCE_IMAGE_COLLECTION = "image_vector_sources"
+STORE_SOURCE_IMAGES = os.getenv("STORE_VECTOR_SOURCE_IMAGES", "true").lower() in ("1", "true", "yes")
+
+
+def vector_collection_name(model_name):
+    """
+    Return the collection holding vectors produced by `model_name`.
+
+    Each model gets its own collection (and its own dimension-specific vector index),
+    so a new model can be backfilled next to the live one and switched to without downtime.
+    """
+    if model_name == LEGACY_VECTOR_MODEL:
+        return "image_vectors"
+    return "image_vectors_" + model_name.lower().replace("-", "_").replace("/", "_")
+
+
+def encode_source_image(image):
+    """Return a JPEG copy of `image`, prepared exactly as the encoders see it, for re-embedding later."""
+    image = prepare_encoder_image(image)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=90)
+    return buffer.getvalue()
+
+
+def _as_pil_image(image):
+    """Accept a PIL image or a file path and return a PIL image."""
+    if image is None or isinstance(image, Image.Image):
+        return image
+    return Image.open(image)
+
 
 class ImageVectorService:
-    def __init__(self):
+    def __init__(self, model_name=None):
         self.model = None
+        self.model_name = model_name or DEFAULT_CLIP_MODEL
+        self.collection_name = vector_collection_name(self.model_name)
         self.db = None
-        self.vector_dimensions = 768  # Dimensions for clip-ViT-L-14 model
+        self.embedding_cache = None
+        self._vector_dimensions = None
+    
+    @property
+    def vector_dimensions(self):
+        """Embedding size of the model; resolved on first use so constructing the service never loads it."""
+        if self._vector_dimensions is None:
+            self._vector_dimensions = get_model_dimensions(self.model_name)
+        return self._vector_dimensions
+    
+    @property
+    def encoder_id(self):
+        """Embedding cache key; differs per backend (e.g. ONNX int8) and is reported by the sidecar."""
+        return get_encoder_id(self.model_name)
     
     def initialize(self):
         """Initialize the model and database connection."""
         if self.model is None:
-            print("Loading CLIP model...")
-            self.model = SentenceTransformer("clip-ViT-L-14")
+            # Shared per process; only the first caller pays the load cost
+            self.model = get_image_encoder(self.model_name)
+        
+        self._connect_db()
         
+        if self.embedding_cache is None:
+            self.embedding_cache = get_embedding_cache(self.db)
+    
+    def _connect_db(self):
+        """Attach the shared MongoDB connection without loading the model."""
         if self.db is None:
             self.db = get_db_instance()
             if self.db is None:
                 raise ConnectionError("Failed to connect to MongoDB. Check your connection string.")
     
-    def search_similar_images(self, query_image_path, limit=5, threshold=0.7):
+    def encode_image(self, image):
+        """
+        Return the embedding for a PIL image, skipping the model when the same pixels were seen before.
+        
+        Args:
+            image (PIL.Image.Image): Image to encode
+            
+        Returns:
+            np.ndarray: The image embedding
+        """
+        self.initialize()
+        
+        # Identical input for every backend, so cached vectors don't depend on where they were computed
+        image = prepare_encoder_image(image)
+        content_hash = image_content_hash(image)
+        embedding = self.embedding_cache.get(self.encoder_id, content_hash)
+        if embedding is not None:
+            print("Embedding cache hit, skipping CLIP encode")
+            return embedding
+        
+        embedding = self.model.encode(image)
+        self.embedding_cache.put(self.encoder_id, content_hash, embedding)
+        return embedding
+    
+    def search_similar_images(self, query_image, limit=5, threshold=0.7, return_embedding=False,
+                              num_candidates=None):
         """
         Search for similar food images using vector search, comparing image to image.
         
         Args:
-            query_image_path (str): Path to the query image
+            query_image (PIL.Image.Image or str): Decoded query image, or a path to one
             limit (int): Maximum number of results to return
             threshold (float): Minimum similarity score (0.0-1.0) to be considered a match
+            return_embedding (bool): Also return the query embedding so callers can store it
+                                     without encoding the image a second time
+            num_candidates (int, optional): $vectorSearch numCandidates (default: VECTOR_SEARCH_NUM_CANDIDATES)
             
         Returns:
-            list: Similar food items with similarity above threshold
+            list: Similar food items with similarity above threshold, or
+            tuple: (results, query embedding) if return_embedding is True
         """
-        print(f"Searching for similar images to: {query_image_path}")
+        query_image = _as_pil_image(query_image)
+        results, query_embedding = self._search_similar_images(query_image, limit, threshold, num_candidates)
+        if return_embedding:
+            if query_embedding is None:
+                # Empty collection: nothing was encoded, but the caller wants the vector to store it
+                query_embedding = self.encode_image(query_image)
+            return results, query_embedding
+        return results
+    
+    def _search_similar_images(self, query_image, limit, threshold, num_candidates):
+        """Run the similarity search; returns (results, query embedding or None)."""
+        print(f"Searching for similar images to a {query_image.size[0]}x{query_image.size[1]} image")
         
         self.initialize()
         
         # Get the collection
-        collection = self.db["image_vectors"]
+        collection = self.db[self.collection_name]
         
-        # Check if collection has data
-        doc_count = collection.count_documents({})
-        print(f"Found {doc_count} documents in image_vectors collection")
+        # Check if collection has data (cached count, no per-request round trip)
+        metadata = get_collection_metadata(collection)
+        doc_count = metadata.get_doc_count(collection)
+        print(f"Found ~{doc_count} documents in {self.collection_name} collection")
         
         if doc_count == 0:
-            print("No data in the image_vectors collection.")
-            return []
+            print(f"No data in the {self.collection_name} collection.")
+            return [], None
         
         # Generate query embedding for the image
         print("Generating embedding for query image...")
-        image = Image.open(query_image_path)
-        query_embedding = self.model.encode(image)
+        query_embedding = self.encode_image(query_image)
         
-        # Try vector search
-        results = []
-        try:
-            print("Attempting vector search with $vectorSearch...")
-            vector_results = collection.aggregate([
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "path": "embedding",
-                        "queryVector": query_embedding.tolist(),
-                        "numCandidates": 100,
-                        "limit": 100  # Get more candidates so we can filter by threshold
-                    }
-                },
-                {
-                    "$project": {
-                        "_id": 1,
-                        "name": 1,
-                        "expirationPeriod": 1,
-                        "metadata": 1,
-                        "embedding": 1,
-                        "score": {"$meta": "vectorSearchScore"}
-                    }
-                }
-            ])
-            results = list(vector_results)
-            print(f"Vector search returned {len(results)} results")
-            
-            # Filter results by threshold
-            filtered_results = [r for r in results if r.get('score', 0) >= threshold]
-            
-            if filtered_results:
-                print(f"Found {len(filtered_results)} results above threshold {threshold:.2f}")
-                return filtered_results[:limit]  # Limit to requested number
-            else:
+        # Try vector search, unless Atlas can't serve it: float16 vectors aren't indexed at all,
+        # so $vectorSearch would silently miss them; otherwise the cached index state decides
+        if not ATLAS_SEARCHABLE_STORAGE:
+            print("Embeddings are stored as float16, which Atlas cannot index. Using the in-process vector index...")
+        elif metadata.index_queryable(collection):
+            try:
+                print("Attempting vector search with $vectorSearch...")
+                results = self.vector_search(
+                    collection, query_embedding, limit=limit, threshold=threshold, num_candidates=num_candidates
+                )
+                
                 if results:
-                    print(f"Found {len(results)} results, but none above threshold {threshold:.2f}")
-                    print(f"Best match was: {results[0].get('name', 'Unknown')} with score: {results[0].get('score', 0):.4f}")
+                    print(f"Found {len(results)} results above threshold {threshold:.2f}")
+                    return results, query_embedding
                 print("No results above threshold. Falling back to manual similarity calculation...")
-        except Exception as e:
-            print(f"Vector search failed: {str(e)}")
-            print("Falling back to manual similarity calculation...")
+            except Exception as e:
+                print(f"Vector search failed: {str(e)}")
+                print("Falling back to manual similarity calculation...")
+        else:
+            print("Vector search index is not queryable. Using manual similarity calculation...")
         
-        # Fallback: Load all documents and calculate similarity manually
-        print("Calculating similarity manually...")
-        all_docs = list(collection.find({}))
-        print(f"Loaded {len(all_docs)} documents for manual comparison")
+        # Fallback: search the in-process vector cache instead of rescanning the collection
+        manual_results = search_cached_vectors(
+            collection, self.vector_dimensions, query_embedding, limit=limit, threshold=threshold
+        )
         
-        if len(all_docs) == 0:
-            print("No documents found in the collection.")
-            return []
+        if manual_results:
+            print(f"Found {len(manual_results)} matches in local vector cache")
+        else:
+            print(f"No matches found with similarity above threshold {threshold:.2f}")
+        return manual_results, query_embedding
+    
+    def vector_search(self, collection, query_embedding, limit=5, threshold=0.0, num_candidates=None, fields=None):
+        """
+        Run a lean Atlas $vectorSearch query.
         
-        # Calculate cosine similarity manually
-        similarities = []
-        query_norm = np.linalg.norm(query_embedding)
+        Only the requested fields and the score come back (never the stored embeddings),
+        and the threshold is applied inside the aggregation. Results arrive sorted by
+        score, so limiting before the threshold filter keeps the best `limit` matches.
         
-        for doc in all_docs:
-            doc_embedding = doc.get("embedding", [])
-            if not doc_embedding:
-                print(f"WARNING: No embedding found in document {doc.get('_id', 'unknown')}")
-                continue
-                
-            doc_embedding = np.array(doc_embedding)
-            doc_norm = np.linalg.norm(doc_embedding)
-            
-            # Avoid division by zero
-            if query_norm == 0 or doc_norm == 0:
-                similarity = 0
-            else:
-                similarity = np.dot(query_embedding, doc_embedding) / (query_norm * doc_norm)
+        Args:
+            collection: MongoDB collection to search
+            query_embedding (np.ndarray): Query vector
+            limit (int): Maximum number of results
+            threshold (float): Minimum vectorSearchScore
+            num_candidates (int, optional): ANN candidates to consider (default: VECTOR_SEARCH_NUM_CANDIDATES)
+            fields (iterable, optional): Document fields to return (default: name, expirationPeriod, metadata)
             
-            similarities.append({
-                "_id": doc.get("_id"),
-                "name": doc.get("name"),
-                "expirationPeriod": doc.get("expirationPeriod"),
-                "metadata": doc.get("metadata"),
-                "score": float(similarity)
-            })
-        
-        # Sort by similarity (highest first)
-        similarities.sort(key=lambda x: x["score"], reverse=True)
-        
-        # Filter by threshold and take only the top results
-        filtered_similarities = [s for s in similarities if s["score"] >= threshold]
-        manual_results = filtered_similarities[:limit]
+        Returns:
+            list: Matching documents with a `score` field, best first
+        """
+        query_embedding = np.asarray(query_embedding, dtype=np.float32)
+        if query_embedding.shape[-1] != self.vector_dimensions:
+            raise ValueError(f"Query vector has {query_embedding.shape[-1]} dimensions, "
+                             f"{self.collection_name} expects {self.vector_dimensions}")
+        num_candidates = max(num_candidates or VECTOR_SEARCH_NUM_CANDIDATES, limit)
+        projection = {field: 1 for field in (fields or RESULT_FIELDS)}
+        projection["score"] = {"$meta": "vectorSearchScore"}
         
-        if manual_results:
-            print(f"Found {len(manual_results)} matches with manual similarity calculation")
-            return manual_results
-        else:
-            print(f"No matches found with similarity above threshold {threshold:.2f}")
-            return []
+        pipeline = [
+            {
+                "$vectorSearch": {
+                    "index": "vector_index",
+                    "path": "embedding",
+                    "queryVector": query_embedding.tolist(),
+                    "numCandidates": num_candidates,
+                    "limit": limit
+                }
+            },
+            {"$project": projection},
+            {"$match": {"score": {"$gte": threshold}}}
+        ]
+        return list(collection.aggregate(pipeline))
     
-    def store_image_embedding(self, image_path, item_name, expiration_period, metadata=None):
+    def store_image_embedding(self, image, item_name, expiration_period, metadata=None, embedding=None):
         """
         Store an image embedding in the MongoDB database.
         
         Args:
-            image_path (str): Path to the image file
+            image (PIL.Image.Image or str): Decoded image, or a path to one; only needed for
+                                            the source copy when `embedding` is given
             item_name (str): Name of the item
             expiration_period (int): Expiration period in days
             metadata (dict, optional): Additional metadata to store
+            embedding (np.ndarray, optional): Precomputed embedding, e.g. from search_similar_images
             
         Returns:
             str: ID of the stored document
@@ -165,18 +256,18 @@ class ImageVectorService:
         self.initialize()
         
         # Get the collection
-        collection = self.db["image_vectors"]
-        
-        # Ensure vector search index exists
-        self._ensure_vector_index(collection)
+        collection = self.db[self.collection_name]
         
         try:
-            # Generate embedding using the model
-            image = Image.open(image_path)
-            embedding = self.model.encode(image)
+            image = _as_pil_image(image)
+            
+            # Generate embedding using the model unless the caller already has it
+            if embedding is None:
+                embedding = self.encode_image(image)
+            if len(embedding) != self.vector_dimensions:
+                raise ValueError(f"Embedding has {len(embedding)} dimensions, {self.model_name} produces {self.vector_dimensions}")
             
             # Create document for MongoDB with a meaningful ID
-            import time
             timestamp = int(time.time() * 1000)  # milliseconds timestamp
             document_id = f"{item_name.lower().replace(' ', '_')}_{timestamp}"
             
@@ -184,8 +275,11 @@ class ImageVectorService:
                 "_id": document_id,  # Using item name + timestamp as the document ID
                 "name": item_name,
                 "expirationPeriod": expiration_period,
-                "embedding": embedding.tolist(),  # Convert numpy array to list
-                "metadata": metadata or {"category": "food"}
+                "embedding": encode_embedding(embedding),  # Packed binary vector, not a list of doubles
+                "model": self.model_name,
+                "dimensions": self.vector_dimensions,
+                "metadata": metadata or {"category": "food"},
+                "created_at": datetime.utcnow()  # Lets other workers' vector caches catch up incrementally
             }
             
             # Insert into MongoDB (with upsert to avoid duplicate key errors)
@@ -195,69 +289,130 @@ class ImageVectorService:
                 upsert=True
             )
             
+            # Keep the local vector caches in step without reloading the collection
+            add_to_vector_caches(collection, document["_id"], embedding, document)
+            
+            if image is not None and STORE_SOURCE_IMAGES:
+                self._store_source_image(document_id, image)
+            
             if result.upserted_id:
-                print(f"Added {item_name} to image_vectors collection")
+                get_collection_metadata(collection).increment_doc_count()
+                print(f"Added {item_name} to {self.collection_name} collection")
                 return str(result.upserted_id)
             else:
-                print(f"Updated {item_name} in image_vectors collection")
+                print(f"Updated {item_name} in {self.collection_name} collection")
                 return document["_id"]
             
         except Exception as e:
             print(f"Error storing image embedding: {str(e)}")
             raise
     
-    def _ensure_vector_index(self, collection):
+    def _store_source_image(self, document_id, image):
+        """Keep a downscaled copy of the image so the vector can be re-embedded with another model."""
+        try:
+            self.db[SOURCE_IMAGE_COLLECTION].replace_one(
+                {"_id": document_id},
+                {"_id": document_id, "image": Binary(encode_source_image(image)), "contentType": "image/jpeg"},
+                upsert=True
+            )
+        except Exception as e:
+            # The vector itself is stored; only a future re-embed of this item is affected
+            print(f"Failed to store source image for {document_id}: {str(e)}")
+    
+    def ensure_indexes(self, recreate_legacy=False):
+        """
+        Create the vector search index if needed and refresh the cached index state.
+        
+        Called at startup and from `manage.py ensure-indexes`, so the request path
+        never has to check the schema itself.
+        
+        Args:
+            recreate_legacy (bool): Replace an existing knnVector index with a vectorSearch one
+            
+        Returns:
+            bool: Whether the index is currently queryable
+        """
+        self._connect_db()
+        collection = self.db[self.collection_name]
+        # Vector caches in every worker poll this to pick up new vectors incrementally
+        collection.create_index("created_at")
+        self._ensure_vector_index(collection, recreate_legacy=recreate_legacy)
+        queryable = get_collection_metadata(collection).refresh_index_state(collection)
+        print(f"Vector search index queryable: {queryable}")
+        if not ATLAS_SEARCHABLE_STORAGE:
+            print("Warning: EMBEDDING_STORAGE_DTYPE=float16 vectors are not indexed by Atlas; "
+                  "searches use the in-process vector index instead of $vectorSearch")
+        return queryable
+    
+    def _ensure_vector_index(self, collection, recreate_legacy=False):
         """
         Create a vector search index on the collection if it doesn't exist.
         
+        Embeddings are stored as BSON float32 vectors, which only Atlas Vector Search
+        ("vectorSearch") indexes understand; older Atlas Search knnVector indexes are
+        reported and, with `recreate_legacy`, dropped and rebuilt. An index built for a
+        different number of dimensions is updated in place to match the model.
+        
         Args:
             collection: MongoDB collection to create the index on
+            recreate_legacy (bool): Replace an existing knnVector index with a vectorSearch one
         """
-        print("Checking vector search index...")
+        print(f"Checking vector search index on {collection.name} ({self.vector_dimensions} dimensions)...")
         
         # Check if the index already exists
-        index_exists = False
+        existing_index = None
         try:
-            # Get all search indexes for the collection
-            indexes = collection.database.command("listSearchIndexes", collection.name)
-            
-            # Check if our vector index already exists
-            if "cursor" in indexes and "firstBatch" in indexes["cursor"]:
-                for index in indexes["cursor"]["firstBatch"]:
-                    if index.get("name") == "vector_index":
-                        index_exists = True
-                        break
+            for index in collection.list_search_indexes("vector_index"):
+                existing_index = index
+                break
         except Exception:
             # This can happen if there are no search indexes yet
             pass
         
-        if not index_exists:
+        if existing_index is not None and existing_index.get("type") != "vectorSearch":
+            if not recreate_legacy:
+                print("Vector search index 'vector_index' is a legacy knnVector index; "
+                      "packed embeddings need a vectorSearch index (run manage.py migrate-embeddings --rebuild-index).")
+                return
+            print("Dropping legacy knnVector index 'vector_index'...")
+            try:
+                collection.drop_search_index("vector_index")
+                existing_index = None
+            except Exception as e:
+                print(f"Failed to drop legacy vector search index: {str(e)}")
+                return
+        
+        definition = {
+            "fields": [
+                {
+                    "type": "vector",
+                    "path": "embedding",
+                    "numDimensions": self.vector_dimensions,
+                    "similarity": "cosine"
+                }
+            ]
+        }
+        
+        if existing_index is not None:
+            fields = existing_index.get("latestDefinition", {}).get("fields", [])
+            index_dimensions = next((f.get("numDimensions") for f in fields if f.get("path") == "embedding"), None)
+            if index_dimensions is not None and index_dimensions != self.vector_dimensions:
+                print(f"Vector search index has {index_dimensions} dimensions, updating to {self.vector_dimensions}...")
+                try:
+                    collection.update_search_index("vector_index", definition)
+                except Exception as e:
+                    print(f"Failed to update vector search index: {str(e)}")
+                return
+        
+        if existing_index is None:
             print("Creating vector search index...")
             
             # Define the index configuration
-            index_config = {
-                "mappings": {
-                    "dynamic": True,
-                    "fields": {
-                        "embedding": {
-                            "dimensions": self.vector_dimensions,
-                            "similarity": "cosine",
-                            "type": "knnVector"
-                        }
-                    }
-                }
-            }
+            index_model = SearchIndexModel(definition=definition, name="vector_index", type="vectorSearch")
             
             # Create the index
             try:
-                collection.database.command(
-                    "createSearchIndex",
-                    collection.name,
-                    {
-                        "definition": index_config,
-                        "name": "vector_index"
-                    }
-                )
+                collection.create_search_index(index_model)
                 print("Vector search index 'vector_index' created successfully.")
             except Exception as e:
                 print(f"Failed to create vector search index: {str(e)}")
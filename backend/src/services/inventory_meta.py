@@ -0,0 +1,57 @@
+# backend/src/services/inventory_meta.py
+"""
+Indexes and change tracking for the items collection.
+
+Every write to `items` bumps a version counter in `inventory_meta`; listing endpoints
+derive their ETag and Last-Modified from it, so an unchanged inventory can be
+answered with a 304 after a single primary-key read.
+"""
+import datetime
+from pymongo.collation import Collation
+from src.services.shelf_life_cache import SHELF_LIFE_COLLECTION
+
+INVENTORY_META_COLLECTION = "inventory_meta"
+_VERSION_ID = "items"
+
+# Case-insensitive matching for item names; upserts must pass it to hit the unique index
+ITEM_NAME_COLLATION = Collation(locale="en", strength=2)
+ITEM_KEY_INDEX = "name_expiration_date_unique"
+
+
+def bump_inventory_version(db):
+    """Record that the items collection changed. Call after every write to `items`."""
+    try:
+        db[INVENTORY_META_COLLECTION].update_one(
+            {"_id": _VERSION_ID},
+            {"$inc": {"version": 1}, "$set": {"updated_at": datetime.datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        # A missed bump only costs a stale 304 until the next write; don't fail the write itself
+        print(f"Could not bump inventory version: {str(e)}")
+
+
+def get_inventory_version(db):
+    """
+    Return the current inventory version.
+
+    Returns:
+        tuple: (version number, last modification time or None)
+    """
+    meta = db[INVENTORY_META_COLLECTION].find_one({"_id": _VERSION_ID}) or {}
+    return meta.get("version", 0), meta.get("updated_at")
+
+
+def ensure_inventory_indexes(db):
+    """Create the indexes the inventory endpoints rely on (idempotent)."""
+    # Listing: sorted by expiration, paginated with an (expiration_date, _id) cursor
+    db.items.create_index([("expiration_date", 1), ("_id", 1)], name="expiration_date_id")
+    # One item per (name, expiration date): AI upserts $inc into it instead of adding duplicates.
+    # Undated items are exempt, as manual adds may not have a date yet.
+    # Fails while duplicates exist; `python -m src.manage dedupe-items` merges them.
+    db.items.create_index(
+        [("name", 1), ("expiration_date", 1)], name=ITEM_KEY_INDEX, unique=True,
+        collation=ITEM_NAME_COLLATION, partialFilterExpression={"expiration_date": {"$type": "string"}}
+    )
+    # Cached shelf-life estimates expire at their `expires_at`
+    db[SHELF_LIFE_COLLECTION].create_index("expires_at", expireAfterSeconds=0, name="expires_at_ttl")
@@ -0,0 +1,381 @@
+# backend/src/services/model_registry.py
+import os
+import threading
+import time
+
+# The model new embeddings are produced with; changing it needs `manage.py reembed` first
+DEFAULT_CLIP_MODEL = os.getenv("CLIP_MODEL_NAME", "clip-ViT-L-14")
+
+# Output dimensions of the supported sentence-transformers CLIP image encoders
+MODEL_DIMENSIONS = {
+    "clip-ViT-L-14": 768,
+    "clip-ViT-B-16": 512,
+    "clip-ViT-B-32": 512,
+}
+
+# Embedding size of CLIP_MODEL_NAME when it isn't one of MODEL_DIMENSIONS (needed with the sidecar backend)
+CLIP_MODEL_DIMENSIONS = os.getenv("CLIP_MODEL_DIMENSIONS")
+if CLIP_MODEL_DIMENSIONS and DEFAULT_CLIP_MODEL not in MODEL_DIMENSIONS:
+    MODEL_DIMENSIONS[DEFAULT_CLIP_MODEL] = int(CLIP_MODEL_DIMENSIONS)
+
+# Process-wide registry of loaded encoders, keyed by (model_name, device)
+_models = {}
+_model_stats = {}
+_registry_lock = threading.Lock()
+_load_locks = {}
+_warm_models = set()
+_encoders = {}
+
+# Route concurrent encode calls through a micro-batching queue (see batching_encoder.py)
+ENCODER_BATCHING = os.getenv("ENCODER_BATCHING", "true").lower() in ("1", "true", "yes")
+
+# "inprocess" runs sentence-transformers here, "onnx" runs the exported graph on ONNX Runtime,
+# "sidecar" sends images to the embedding server
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "inprocess").lower()
+
+# Images are shrunk to this short side before any backend sees them (CLIP resizes to 224
+# anyway); upload ingress, the encoders and the stored source images all use it through
+# prepare_encoder_image, so every path hands the model identical pixels. 0 disables.
+ENCODER_INPUT_SHORT_SIDE = int(os.getenv("ENCODER_INPUT_SHORT_SIDE", "448"))
+
+
+def _current_rss_bytes():
+    """Return the resident set size of this process in bytes, or None if unavailable."""
+    try:
+        with open("/proc/self/statm") as f:
+            resident_pages = int(f.read().split()[1])
+        return resident_pages * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        import resource
+        import sys
+        max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # ru_maxrss is reported in bytes on macOS and in kilobytes on Linux
+        return max_rss if sys.platform == "darwin" else max_rss * 1024
+    except Exception:
+        return None
+
+
+def _parameter_bytes(model):
+    """Return the total size of a torch model's parameters in bytes, or None."""
+    try:
+        return sum(p.numel() * p.element_size() for p in model.parameters())
+    except Exception:
+        return None
+
+
+def _load_cached(key, description, loader):
+    """
+    Return the model registered under `key`, calling `loader` to create it on first use.
+
+    The model is loaded at most once per process; concurrent callers asking for a model
+    that is still loading wait for the same load to finish. Load time and memory growth
+    are recorded for `get_model_stats`.
+
+    Args:
+        key (tuple): (model_name, device) registry key
+        description (str): What is being loaded, for the log lines
+        loader (callable): Returns (model, details); `details` may give "device" and "parameter_bytes"
+
+    Returns:
+        object: The shared model instance
+    """
+    model = _models.get(key)
+    if model is not None:
+        return model
+
+    with _registry_lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        # Another thread may have finished loading while we waited
+        model = _models.get(key)
+        if model is not None:
+            return model
+
+        print(f"Loading {description}...")
+        rss_before = _current_rss_bytes()
+        start = time.perf_counter()
+        model, details = loader()
+        load_seconds = time.perf_counter() - start
+        rss_after = _current_rss_bytes()
+
+        stats = {
+            "model_name": key[0],
+            "device": details.get("device", key[1]),
+            "load_seconds": round(load_seconds, 3),
+            "parameter_bytes": details.get("parameter_bytes"),
+            "rss_delta_bytes": (rss_after - rss_before) if rss_before is not None and rss_after is not None else None,
+            "rss_after_bytes": rss_after,
+            "loaded_at": time.time(),
+        }
+
+        with _registry_lock:
+            _models[key] = model
+            _model_stats[key] = stats
+
+        param_mb = stats["parameter_bytes"] / (1024 * 1024) if stats["parameter_bytes"] else 0
+        rss_mb = stats["rss_delta_bytes"] / (1024 * 1024) if stats["rss_delta_bytes"] else 0
+        print(f"Loaded {description} in {load_seconds:.2f}s "
+              f"(parameters: {param_mb:.0f} MB, RSS growth: {rss_mb:.0f} MB)")
+        return model
+
+
+def get_clip_model(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """
+    Return the shared SentenceTransformer encoder for `model_name`, loading it on first use.
+
+    Args:
+        model_name (str): sentence-transformers model id (default: CLIP_MODEL_NAME)
+        device (str, optional): Torch device such as "cpu" or "cuda"; None lets
+                                sentence-transformers pick one
+
+    Returns:
+        SentenceTransformer: The shared model instance
+    """
+    def load():
+        from sentence_transformers import SentenceTransformer
+
+        model = SentenceTransformer(model_name, device=device)
+        return model, {"device": str(getattr(model, "device", device)), "parameter_bytes": _parameter_bytes(model)}
+
+    return _load_cached((model_name, device), f"CLIP model {model_name} (device={device or 'auto'})", load)
+
+
+def get_onnx_model(model_name=DEFAULT_CLIP_MODEL, quantized=None):
+    """
+    Return the shared ONNX Runtime encoder for `model_name`, loading it on first use.
+
+    The graph must have been exported with `python -m src.manage export-onnx`.
+
+    Args:
+        model_name (str): sentence-transformers model id the graph was exported from
+        quantized (bool, optional): Use the int8 graph (default: ONNX_QUANTIZED)
+
+    Returns:
+        OnnxClipEncoder: The shared encoder instance
+    """
+    from src.services.onnx_encoder import OnnxClipEncoder, onnx_model_paths, ONNX_QUANTIZED
+
+    variant = "int8" if (ONNX_QUANTIZED if quantized is None else quantized) else "fp32"
+
+    def load():
+        paths = onnx_model_paths(model_name)
+        if not os.path.exists(paths[variant]):
+            raise FileNotFoundError(f"No {variant} ONNX export at {paths[variant]}; "
+                                    f"run `python -m src.manage export-onnx --model {model_name}`")
+        return OnnxClipEncoder(paths[variant], paths["config"]), {"parameter_bytes": os.path.getsize(paths[variant])}
+
+    return _load_cached((model_name, f"onnx-{variant}"), f"ONNX {variant} encoder for {model_name}", load)
+
+
+def prepare_encoder_image(image, short_side=ENCODER_INPUT_SHORT_SIDE):
+    """
+    Apply the preprocessing every encoder backend shares: RGB, short side capped at `short_side`.
+
+    Callers must run images through this before encoding (and before hashing them for the
+    embedding cache) so an embedding doesn't depend on which backend or path produced it.
+    It is idempotent, so images that were prepared upstream (upload ingress) pass unchanged.
+
+    Args:
+        image (PIL.Image.Image): Decoded image
+        short_side (int): Maximum short side in pixels (0 keeps the size)
+
+    Returns:
+        PIL.Image.Image: The prepared image (the same object if nothing had to change)
+    """
+    from PIL import Image
+
+    if image.mode != "RGB":
+        image = image.convert("RGB")
+    if short_side and min(image.size) > short_side:
+        scale = short_side / min(image.size)
+        image = image.resize((max(1, round(image.width * scale)), max(1, round(image.height * scale))),
+                             Image.LANCZOS, reducing_gap=3.0)
+    return image
+
+
+def get_encoder_id(model_name=DEFAULT_CLIP_MODEL, backend=None):
+    """
+    Return an identifier for the embeddings the configured backend produces.
+
+    Quantised ONNX vectors are close to, but not bit-identical with, the reference ones,
+    so caches key on this rather than on the model name alone. With the sidecar the
+    server reports the id of whatever backend it runs (one round trip, then cached).
+    """
+    backend = backend or EMBEDDING_BACKEND
+    if backend == "sidecar":
+        return get_image_encoder(model_name, backend="sidecar").get_encoder_id()
+    if backend == "onnx":
+        from src.services.onnx_encoder import ONNX_QUANTIZED
+        return f"{model_name}/onnx-{'int8' if ONNX_QUANTIZED else 'fp32'}"
+    return model_name
+
+
+def get_model_dimensions(model_name=DEFAULT_CLIP_MODEL):
+    """
+    Return the embedding size produced by `model_name`.
+
+    Known models come from MODEL_DIMENSIONS (plus CLIP_MODEL_DIMENSIONS for the configured
+    model). Anything else is loaded and asked, which only makes sense where the model runs
+    in this process anyway; with the sidecar backend the size has to be configured.
+
+    Raises:
+        ValueError: If the size of an unknown model is needed with the sidecar backend
+    """
+    dimensions = MODEL_DIMENSIONS.get(model_name)
+    if dimensions is None:
+        if EMBEDDING_BACKEND == "sidecar":
+            raise ValueError(f"Unknown embedding size for {model_name}; set CLIP_MODEL_DIMENSIONS "
+                             f"instead of loading the model in this process")
+        from PIL import Image
+        dimensions = int(get_clip_model(model_name).encode(Image.new("RGB", (224, 224))).shape[-1])
+        MODEL_DIMENSIONS[model_name] = dimensions
+    return dimensions
+
+
+def get_image_encoder(model_name=DEFAULT_CLIP_MODEL, device=None, backend=None):
+    """
+    Return the shared image encoder callers should use for `encode(image)`.
+
+    With the "sidecar" backend this is a client for the embedding server process and
+    the model is never loaded here. For "inprocess" (sentence-transformers) and "onnx",
+    with ENCODER_BATCHING enabled, it is a BatchingEncoder wrapped around the shared
+    model so concurrent requests are encoded together; otherwise it is the model itself.
+
+    Args:
+        model_name (str): sentence-transformers model id
+        device (str, optional): Torch device (ignored by the sidecar backend)
+        backend (str, optional): "inprocess", "onnx" or "sidecar" (default: EMBEDDING_BACKEND)
+
+    Returns:
+        object: Encoder exposing `encode(image)`
+    """
+    backend = backend or EMBEDDING_BACKEND
+    key = (model_name, device, backend)
+    encoder = _encoders.get(key)
+    if encoder is not None:
+        return encoder
+
+    if backend == "sidecar":
+        from src.services.embedding_server import SidecarEncoder
+        with _registry_lock:
+            return _encoders.setdefault(key, SidecarEncoder(model_name=model_name))
+    if backend == "onnx":
+        model = get_onnx_model(model_name)
+    elif backend == "inprocess":
+        model = get_clip_model(model_name, device)
+    else:
+        raise ValueError(f"Unknown EMBEDDING_BACKEND: {backend}")
+
+    with _registry_lock:
+        encoder = _encoders.get(key)
+        if encoder is None:
+            if ENCODER_BATCHING:
+                from src.services.batching_encoder import BatchingEncoder
+                encoder = BatchingEncoder(model)
+            else:
+                encoder = model
+            _encoders[key] = encoder
+    return encoder
+
+
+def get_encoder_stats():
+    """Return statistics for every shared encoder that reports them (batching queues, sidecar clients)."""
+    with _registry_lock:
+        encoders = dict(_encoders)
+    return [
+        {"model_name": name, "device": str(device), "backend": backend, **encoder.stats()}
+        for (name, device, backend), encoder in encoders.items()
+        if hasattr(encoder, "stats")
+    ]
+
+
+def is_encoder_ready(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """
+    Return True once images can be encoded without a cold start: warm-up encode done, or sidecar answered.
+
+    Only reads flags set by `warm_up_encoder`, so readiness probes never block on the model or the socket.
+    """
+    if EMBEDDING_BACKEND == "sidecar":
+        return is_model_warm(model_name, "sidecar")
+    if EMBEDDING_BACKEND == "onnx":
+        return is_model_warm(model_name, "onnx")
+    return is_model_warm(model_name, device)
+
+
+def warm_up_encoder(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """
+    Warm up whichever encoder backend is configured.
+
+    In-process (sentence-transformers or ONNX) this loads the model and runs a dummy
+    encode; with the sidecar it only checks that the embedding server answers, so the
+    worker never imports torch.
+    """
+    if EMBEDDING_BACKEND == "sidecar":
+        encoder = get_image_encoder(model_name, device)
+        if not encoder.ping():
+            raise ConnectionError(f"Embedding server not reachable at {encoder.socket_path}")
+        with _registry_lock:
+            _warm_models.add((model_name, "sidecar"))
+        return 0.0
+    if EMBEDDING_BACKEND == "onnx":
+        from PIL import Image
+
+        encoder = get_image_encoder(model_name, device)
+        start = time.perf_counter()
+        encoder.encode(Image.new("RGB", (224, 224), color="white"))
+        encode_seconds = time.perf_counter() - start
+        with _registry_lock:
+            _warm_models.add((model_name, "onnx"))
+        print(f"Warm-up encode for {get_encoder_id(model_name)} took {encode_seconds:.2f}s")
+        return encode_seconds
+    return warm_up_model(model_name, device)
+
+
+def is_model_loaded(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """Return True if the given model has already been loaded in this process."""
+    return (model_name, device) in _models
+
+
+def warm_up_model(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """
+    Load the model and run one dummy encode so the first real request is fast.
+
+    Args:
+        model_name (str): sentence-transformers model id
+        device (str, optional): Torch device
+
+    Returns:
+        float: Seconds spent on the dummy encode
+    """
+    from PIL import Image
+
+    model = get_clip_model(model_name, device)
+    start = time.perf_counter()
+    model.encode(Image.new("RGB", (224, 224), color="white"))
+    encode_seconds = time.perf_counter() - start
+
+    with _registry_lock:
+        _warm_models.add((model_name, device))
+        if (model_name, device) in _model_stats:
+            _model_stats[(model_name, device)]["warmup_encode_seconds"] = round(encode_seconds, 3)
+    print(f"Warm-up encode for {model_name} took {encode_seconds:.2f}s")
+    return encode_seconds
+
+
+def is_model_warm(model_name=DEFAULT_CLIP_MODEL, device=None):
+    """Return True once the model has completed a warm-up encode ("onnx"/"sidecar" as device for those backends)."""
+    return (model_name, device) in _warm_models
+
+
+def get_model_stats():
+    """
+    Return load statistics for every model loaded in this process.
+
+    Returns:
+        list: One dict per loaded model with load time and memory figures
+    """
+    with _registry_lock:
+        return [dict(stats) for stats in _model_stats.values()]
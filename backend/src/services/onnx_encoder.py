@@ -0,0 +1,187 @@
+# backend/src/services/onnx_encoder.py
+"""
+ONNX Runtime backend for the CLIP image encoder.
+
+The image tower of the sentence-transformers model is exported once to an ONNX graph
+(plus an optional copy with dynamic int8 quantisation of its MatMul weights) together with the
+preprocessing constants, so the request path needs only onnxruntime, numpy and PIL.
+The sentence-transformers model stays the reference implementation.
+
+Export from the backend directory:
+    python -m src.manage export-onnx
+"""
+import json
+import os
+import time
+import numpy as np
+from PIL import Image
+
+ONNX_MODEL_DIR = os.getenv("ONNX_MODEL_DIR", os.path.expanduser("~/.cache/smart-fridge/onnx"))
+# fp32 by default; int8 is opt-in since its vectors drift slightly from the reference model
+ONNX_QUANTIZED = os.getenv("ONNX_QUANTIZED", "false").lower() in ("1", "true", "yes")
+ONNX_INTRA_OP_THREADS = int(os.getenv("ONNX_INTRA_OP_THREADS", "0"))  # 0 lets onnxruntime decide
+
+
+def onnx_model_paths(model_name, output_dir=ONNX_MODEL_DIR):
+    """
+    Return the file paths used for an exported model.
+
+    Returns:
+        dict: Paths for the "fp32" graph, the "int8" graph and the preprocessing "config"
+    """
+    return {
+        "fp32": os.path.join(output_dir, f"{model_name}.onnx"),
+        "int8": os.path.join(output_dir, f"{model_name}.int8.onnx"),
+        "config": os.path.join(output_dir, f"{model_name}.json"),
+    }
+
+
+def _edge(value, key):
+    return value[key] if isinstance(value, dict) else int(value)
+
+
+def export_clip_onnx(model_name, output_dir=ONNX_MODEL_DIR, quantize=True, opset=17):
+    """
+    Export the image tower of a sentence-transformers CLIP model to ONNX.
+
+    Requires torch, sentence-transformers and (for quantisation) onnxruntime; none of
+    them are needed afterwards except onnxruntime.
+
+    Args:
+        model_name (str): sentence-transformers model id, e.g. "clip-ViT-L-14"
+        output_dir (str): Directory for the .onnx graphs and the preprocessing config
+        quantize (bool): Also write a dynamically int8-quantised copy
+        opset (int): ONNX opset version
+
+    Returns:
+        dict: Paths of the written files
+    """
+    import torch
+    from src.services.model_registry import get_clip_model
+
+    os.makedirs(output_dir, exist_ok=True)
+    paths = onnx_model_paths(model_name, output_dir)
+
+    clip_module = get_clip_model(model_name, "cpu")[0]  # sentence_transformers.models.CLIPModel
+    clip = clip_module.model.eval()
+    image_processor = clip_module.processor.image_processor
+
+    class ImageTower(torch.nn.Module):
+        # Same computation as CLIPModel.forward for pixel_values in sentence-transformers
+        def __init__(self):
+            super().__init__()
+            self.vision_model = clip.vision_model
+            self.visual_projection = clip.visual_projection
+
+        def forward(self, pixel_values):
+            return self.visual_projection(self.vision_model(pixel_values=pixel_values)[1])
+
+    crop_height = _edge(image_processor.crop_size, "height")
+    crop_width = _edge(image_processor.crop_size, "width")
+    dummy = torch.zeros(1, 3, crop_height, crop_width)
+
+    start = time.perf_counter()
+    with torch.no_grad():
+        dimensions = int(ImageTower()(dummy).shape[-1])
+        torch.onnx.export(
+            ImageTower(), dummy, paths["fp32"],
+            input_names=["pixel_values"], output_names=["image_embeds"],
+            dynamic_axes={"pixel_values": {0: "batch"}, "image_embeds": {0: "batch"}},
+            opset_version=opset,
+        )
+    print(f"Exported {model_name} image tower to {paths['fp32']} in {time.perf_counter() - start:.1f}s")
+
+    config = {
+        "model_name": model_name,
+        "dimensions": dimensions,
+        "shortest_edge": _edge(image_processor.size, "shortest_edge"),
+        "crop_size": [crop_height, crop_width],
+        "image_mean": list(image_processor.image_mean),
+        "image_std": list(image_processor.image_std),
+        "opset": opset,
+    }
+    with open(paths["config"], "w") as f:
+        json.dump(config, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import quantize_dynamic, QuantType
+
+        start = time.perf_counter()
+        # Only the transformer MatMuls; quantising the patch-embedding Conv costs accuracy for little gain
+        quantize_dynamic(paths["fp32"], paths["int8"], weight_type=QuantType.QInt8, op_types_to_quantize=["MatMul"])
+        fp32_mb = os.path.getsize(paths["fp32"]) / (1024 * 1024)
+        int8_mb = os.path.getsize(paths["int8"]) / (1024 * 1024)
+        print(f"Quantised to {paths['int8']} in {time.perf_counter() - start:.1f}s "
+              f"({fp32_mb:.0f} MB -> {int8_mb:.0f} MB)")
+    return paths
+
+
+class OnnxClipEncoder:
+    """
+    CLIP image encoder running an exported graph on ONNX Runtime (CPU).
+
+    Mirrors SentenceTransformer.encode for images: one PIL image gives a 1-D embedding,
+    a list gives a 2-D array. Preprocessing reproduces the CLIP processor (shortest edge
+    resize with bicubic resampling, centre crop, mean/std normalisation).
+
+    Args:
+        model_path (str): Path of the .onnx graph
+        config_path (str): Path of the preprocessing config written by export_clip_onnx
+        intra_op_threads (int): onnxruntime intra-op threads (0 = library default)
+    """
+
+    def __init__(self, model_path, config_path, intra_op_threads=ONNX_INTRA_OP_THREADS):
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if intra_op_threads:
+            options.intra_op_num_threads = intra_op_threads
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+        self.model_path = model_path
+
+        with open(config_path) as f:
+            self.config = json.load(f)
+        self.shortest_edge = self.config["shortest_edge"]
+        self.crop_height, self.crop_width = self.config["crop_size"]
+        self.mean = np.asarray(self.config["image_mean"], dtype=np.float32).reshape(3, 1, 1)
+        self.std = np.asarray(self.config["image_std"], dtype=np.float32).reshape(3, 1, 1)
+
+    def get_sentence_embedding_dimension(self):
+        return self.config["dimensions"]
+
+    def preprocess(self, image):
+        """Turn a PIL image into a normalised (3, H, W) float32 array."""
+        if image.mode != "RGB":
+            image = image.convert("RGB")
+
+        width, height = image.size
+        if width <= height:
+            size = (self.shortest_edge, int(self.shortest_edge * height / width))
+        else:
+            size = (int(self.shortest_edge * width / height), self.shortest_edge)
+        image = image.resize(size, Image.BICUBIC)
+
+        left = (image.width - self.crop_width) // 2
+        top = (image.height - self.crop_height) // 2
+        image = image.crop((left, top, left + self.crop_width, top + self.crop_height))
+
+        pixels = np.asarray(image, dtype=np.float32).transpose(2, 0, 1) / 255.0
+        return (pixels - self.mean) / self.std
+
+    def encode(self, images, batch_size=32):
+        """
+        Encode a PIL image or a list of PIL images.
+
+        Returns:
+            np.ndarray: 1-D embedding for a single image, (n, dims) array for a list
+        """
+        if not isinstance(images, list):
+            return self.encode([images], batch_size)[0]
+
+        embeddings = []
+        for start in range(0, len(images), batch_size):
+            batch = np.stack([self.preprocess(image) for image in images[start:start + batch_size]])
+            embeddings.append(self.session.run(None, {self.input_name: batch})[0])
+        return np.concatenate(embeddings).astype(np.float32, copy=False)
@@ -0,0 +1,245 @@
+# backend/src/services/reembedding.py
+"""
+Batch re-embedding of stored image vectors with a different CLIP model.
+
+Vectors for the target model are written to that model's own collection while the
+API keeps serving from the current one, so a migration looks like:
+
+    python -m src.manage reembed --target-model clip-ViT-B-32
+    # deploy with CLIP_MODEL_NAME=clip-ViT-B-32
+    python -m src.manage reembed --target-model clip-ViT-B-32 --catch-up
+
+Progress is checkpointed in the `migrations` collection after every batch, so an
+interrupted run resumes where it stopped.
+
+New vectors are re-embedded from the source image saved next to them. Vectors stored
+before source images were kept fall back to the photo of the inventory item with the
+same name; that photo is saved as their source image for later migrations. Vectors with
+neither cannot be migrated and make the run fail unless `allow_missing_sources` is set.
+"""
+import io
+import time
+from datetime import datetime
+from bson.binary import Binary
+from PIL import Image
+from pymongo import UpdateOne
+from src.services.embedding_codec import encode_embedding
+from src.services.image_store import get_image_store, inline_image_bytes
+from src.services.image_vector_service import (
+    ImageVectorService, vector_collection_name, encode_source_image, SOURCE_IMAGE_COLLECTION, LEGACY_VECTOR_MODEL
+)
+from src.services.model_registry import get_clip_model, get_onnx_model, get_model_dimensions, prepare_encoder_image, EMBEDDING_BACKEND
+
+MIGRATIONS_COLLECTION = "migrations"
+
+
+def backfill_model_fields(db, model_name):
+    """
+    Record `model` and `dimensions` on vectors stored before those fields existed.
+
+    Returns:
+        int: Number of documents updated
+    """
+    collection = db[vector_collection_name(model_name)]
+    result = collection.update_many(
+        {"model": {"$exists": False}},
+        {"$set": {"model": model_name, "dimensions": get_model_dimensions(model_name)}}
+    )
+    if result.modified_count:
+        print(f"Recorded model {model_name} on {result.modified_count} {collection.name} documents")
+    return result.modified_count
+
+
+def _item_source_images(db, docs):
+    """
+    Resolve photos for vectors that have no stored source image through their inventory item.
+
+    Vectors only record the item name, so the newest item of that name with a photo
+    (`image_hash` in the image store, or a legacy inline image) stands in for the upload
+    the vector was computed from.
+
+    Returns:
+        dict: Encoded image bytes keyed by vector `_id`
+    """
+    names = {doc["name"].lower() for doc in docs if isinstance(doc.get("name"), str)}
+    if not names:
+        return {}
+    store = get_image_store(db)
+    photos = {}
+    items = db.items.find(
+        {"name": {"$in": list(names)},
+         "$or": [{"image_hash": {"$nin": [None]}}, {"image_data": {"$nin": [None]}},
+                 {"image_url": {"$regex": "^data:image"}}]},
+        {"name": 1, "image_hash": 1, "image_data": 1, "image_url": 1}
+    ).sort("date_added", -1)
+    for item in items:
+        if item["name"] in photos:
+            continue
+        stored = store.get(item["image_hash"]) if item.get("image_hash") else None
+        data = stored[0] if stored else inline_image_bytes(item)
+        if data:
+            photos[item["name"]] = data
+    return {
+        doc["_id"]: photos[doc["name"].lower()]
+        for doc in docs
+        if isinstance(doc.get("name"), str) and doc["name"].lower() in photos
+    }
+
+
+def _load_batch_model(model_name):
+    # Batches go straight to the model; the per-request batching queue and sidecar don't apply here
+    if EMBEDDING_BACKEND == "onnx":
+        return get_onnx_model(model_name)
+    return get_clip_model(model_name)
+
+
+def reembed_collection(db, target_model, source_model=LEGACY_VECTOR_MODEL, batch_size=64, catch_up=False,
+                       dry_run=False, allow_missing_sources=False):
+    """
+    Re-embed every stored vector of `source_model` with `target_model`.
+
+    Documents are walked in `_id` order and the last processed `_id` is checkpointed after
+    each batch. Documents already present in the target collection are skipped and never
+    overwritten, so runs are idempotent; `catch_up` rescans from the start to pick up
+    vectors that were stored behind the checkpoint since the last run.
+
+    Re-embedding needs a source image: the one saved next to the vector or, for older
+    vectors, the photo of the matching inventory item (which is then saved as the source).
+    Vectors with neither are left in place, and the run raises once it is done unless
+    `allow_missing_sources` is set.
+
+    Args:
+        db: MongoDB database
+        target_model (str): Model to produce the new vectors with
+        source_model (str): Model whose collection is migrated
+        batch_size (int): Documents encoded and written per batch
+        catch_up (bool): Ignore the checkpoint and rescan the whole source collection
+        dry_run (bool): Only report how many documents are pending
+        allow_missing_sources (bool): Finish without the vectors that have no image to re-embed from
+
+    Returns:
+        dict: Counts of processed, re-embedded, already present, backfilled and skipped documents
+
+    Raises:
+        RuntimeError: If vectors had no image to re-embed from and `allow_missing_sources` is False
+    """
+    if target_model == source_model:
+        raise ValueError("Target model is the same as the source model")
+
+    source = db[vector_collection_name(source_model)]
+    target_service = ImageVectorService(target_model)
+    target_service.db = db
+    target = db[target_service.collection_name]
+    sources = db[SOURCE_IMAGE_COLLECTION]
+    migrations = db[MIGRATIONS_COLLECTION]
+    checkpoint_id = f"reembed:{source.name}->{target.name}"
+
+    checkpoint = migrations.find_one({"_id": checkpoint_id}) or {}
+    last_id = None if catch_up else checkpoint.get("last_id")
+    counts = {"processed": 0, "reembedded": 0, "already_present": 0, "backfilled_from_item": 0,
+              "skipped_no_source": 0}
+
+    if dry_run:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        pending = source.count_documents(query)
+        print(f"{pending} {source.name} documents to check (target {target.name} has "
+              f"{target.estimated_document_count()}, checkpoint {last_id!r})")
+        return {**counts, "pending": pending}
+
+    backfill_model_fields(db, source_model)
+    target_service.ensure_indexes()
+    model = _load_batch_model(target_model)
+    dimensions = target_service.vector_dimensions
+
+    print(f"Re-embedding {source.name} -> {target.name} with {target_model}"
+          + (f", resuming after {last_id!r}" if last_id is not None else ""))
+    start = time.perf_counter()
+
+    while True:
+        query = {"_id": {"$gt": last_id}} if last_id is not None else {}
+        docs = list(source.find(query, {"embedding": 0}).sort("_id", 1).limit(batch_size))
+        if not docs:
+            break
+
+        ids = [doc["_id"] for doc in docs]
+        present = {doc["_id"] for doc in target.find({"_id": {"$in": ids}}, {"_id": 1})}
+        pending = [doc for doc in docs if doc["_id"] not in present]
+        images_by_id = {
+            doc["_id"]: doc["image"]
+            for doc in sources.find({"_id": {"$in": [doc["_id"] for doc in pending]}}, {"image": 1})
+        }
+        item_images = _item_source_images(db, [doc for doc in pending if doc["_id"] not in images_by_id])
+
+        to_encode, images, backfill = [], [], []
+        for doc in pending:
+            image_bytes = images_by_id.get(doc["_id"], item_images.get(doc["_id"]))
+            try:
+                image = Image.open(io.BytesIO(image_bytes)) if image_bytes is not None else None
+                prepared = prepare_encoder_image(image) if image is not None else None
+                if prepared is not None and doc["_id"] not in images_by_id:
+                    backfill.append(UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": {
+                        "image": Binary(encode_source_image(image)), "contentType": "image/jpeg",
+                        "backfilled_from": "items",
+                    }}, upsert=True))
+            except Exception as e:
+                print(f"Unreadable source image for {doc['_id']}: {str(e)}")
+                prepared = None
+            if prepared is None:
+                counts["skipped_no_source"] += 1
+                continue
+            to_encode.append(doc)
+            images.append(prepared)
+
+        if backfill:
+            sources.bulk_write(backfill, ordered=False)
+            counts["backfilled_from_item"] += len(backfill)
+
+        reembedded = 0
+        if images:
+            embeddings = model.encode(images, batch_size=len(images))
+            operations = [
+                # $setOnInsert: a vector the live API already wrote for the target model wins
+                UpdateOne({"_id": doc["_id"]}, {"$setOnInsert": {
+                    "name": doc.get("name"),
+                    "expirationPeriod": doc.get("expirationPeriod"),
+                    "metadata": doc.get("metadata", {}),
+                    "embedding": encode_embedding(embedding),
+                    "model": target_model,
+                    "dimensions": dimensions,
+                    "created_at": datetime.utcnow(),
+                }}, upsert=True)
+                for doc, embedding in zip(to_encode, embeddings)
+            ]
+            reembedded = target.bulk_write(operations, ordered=False).upserted_count
+
+        last_id = ids[-1]
+        counts["processed"] += len(docs)
+        counts["reembedded"] += reembedded
+        counts["already_present"] += len(present)
+
+        migrations.update_one(
+            {"_id": checkpoint_id},
+            {
+                "$set": {"last_id": last_id, "source": source.name, "target": target.name,
+                         "target_model": target_model, "updated_at": datetime.now()},
+                "$inc": {"processed": len(docs), "reembedded": reembedded, "backfilled_from_item": len(backfill),
+                         "skipped_no_source": len(pending) - len(to_encode)},
+                "$setOnInsert": {"started_at": datetime.now()},
+            },
+            upsert=True
+        )
+        print(f"Processed {counts['processed']} documents ({counts['reembedded']} re-embedded, "
+              f"{counts['backfilled_from_item']} from item photos, "
+              f"{counts['skipped_no_source']} without source image)...")
+
+    print(f"Re-embedding finished in {time.perf_counter() - start:.1f}s: {counts}")
+    if counts["skipped_no_source"]:
+        message = (f"{counts['skipped_no_source']} {source.name} vectors have neither a stored source image "
+                   f"nor an item photo, so they cannot be re-embedded with {target_model}")
+        if not allow_missing_sources:
+            raise RuntimeError(f"{message}. Re-run with --allow-missing-sources to finish without them; "
+                               f"they are re-learned as those items are photographed again.")
+        print(f"{message}; they stay only in {source.name} and are re-learned as those items are "
+              f"photographed again.")
+    migrations.update_one({"_id": checkpoint_id}, {"$set": {"completed_at": datetime.now()}}, upsert=True)
+    return counts
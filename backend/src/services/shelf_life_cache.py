@@ -0,0 +1,136 @@
+# backend/src/services/shelf_life_cache.py
+import datetime
+import os
+import re
+import threading
+from src.helper.lru_cache import LRUCache
+
+SHELF_LIFE_CACHE_SIZE = int(os.getenv("SHELF_LIFE_CACHE_SIZE", "1024"))
+SHELF_LIFE_CACHE_PERSISTENT = os.getenv("SHELF_LIFE_CACHE_PERSISTENT", "true").lower() in ("1", "true", "yes")
+SHELF_LIFE_TTL_DAYS = int(os.getenv("SHELF_LIFE_TTL_DAYS", "30"))
+SHELF_LIFE_COLLECTION = "shelf_life"
+
+
+def normalize_item_name(item_name):
+    """
+    Normalise an item name into a cache key: "Milk_Carton " and "milk carton" share one entry.
+
+    Args:
+        item_name (str): Item name as given by the user or the AI
+
+    Returns:
+        str: Lower-cased name with separators collapsed to single spaces
+    """
+    return re.sub(r"[\s_\-]+", " ", item_name or "").strip().lower()
+
+
+class ShelfLifeCache:
+    """
+    Two-level cache of shelf lives (in days) keyed by normalised item name.
+
+    The first level is an in-process LRU; the second is a MongoDB collection shared by
+    every worker, whose entries expire through a TTL index (created with the inventory
+    indexes) so estimates are refreshed now and then. Only parsed answers from Vertex
+    are cached, never fallbacks.
+    """
+
+    def __init__(self, max_size=SHELF_LIFE_CACHE_SIZE, collection=None, ttl_days=SHELF_LIFE_TTL_DAYS):
+        self.memory = LRUCache(max_size)
+        self.collection = collection
+        self.ttl = datetime.timedelta(days=ttl_days)
+        self.persistent_hits = 0
+        self.persistent_misses = 0
+        self._lock = threading.Lock()
+
+    def get(self, item_name):
+        """
+        Look up a shelf life.
+
+        Args:
+            item_name (str): Item name (normalised here)
+
+        Returns:
+            int or None: Shelf life in days, or None on a miss
+        """
+        key = normalize_item_name(item_name)
+        now = datetime.datetime.utcnow()
+        entry = self.memory.get(key)
+        if entry is not None:
+            days, expires_at = entry
+            if expires_at > now:
+                return days
+            self.memory.pop(key)
+        if self.collection is None:
+            return None
+
+        try:
+            # The TTL monitor runs about once a minute, so check expiry here too
+            doc = self.collection.find_one({"_id": key, "expires_at": {"$gt": now}}, {"days": 1, "expires_at": 1})
+        except Exception as e:
+            print(f"Shelf life cache lookup failed: {str(e)}")
+            doc = None
+
+        with self._lock:
+            if doc is None:
+                self.persistent_misses += 1
+                return None
+            self.persistent_hits += 1
+        self.memory.put(key, (doc["days"], doc["expires_at"]))
+        return doc["days"]
+
+    def put(self, item_name, days, source="vertex"):
+        """Store a parsed shelf life in memory and, if enabled, in the persistent collection."""
+        key = normalize_item_name(item_name)
+        now = datetime.datetime.utcnow()
+        expires_at = now + self.ttl
+        self.memory.put(key, (days, expires_at))
+        if self.collection is None:
+            return
+        try:
+            self.collection.replace_one(
+                {"_id": key},
+                {"_id": key, "days": days, "source": source, "created_at": now, "expires_at": expires_at},
+                upsert=True
+            )
+        except Exception as e:
+            print(f"Shelf life cache write failed: {str(e)}")
+
+    def stats(self):
+        """Return hit/miss counters for both cache levels."""
+        memory_stats = self.memory.stats()
+        with self._lock:
+            persistent_hits = self.persistent_hits
+            persistent_misses = self.persistent_misses
+        lookups = memory_stats["hits"] + memory_stats["misses"]
+        return {
+            "memory": memory_stats,
+            "persistent_enabled": self.collection is not None,
+            "persistent_hits": persistent_hits,
+            "persistent_misses": persistent_misses,
+            "hit_rate": round((memory_stats["hits"] + persistent_hits) / lookups, 4) if lookups else 0.0,
+            "ttl_days": self.ttl.days,
+        }
+
+
+_shelf_life_cache = None
+_shelf_life_cache_lock = threading.Lock()
+
+
+def get_shelf_life_cache(db=None):
+    """
+    Return the process-wide shelf-life cache, creating it on first use.
+
+    Args:
+        db: MongoDB database for the persistent level (used if SHELF_LIFE_CACHE_PERSISTENT is set);
+            a cache created without one picks it up on a later call that passes it
+
+    Returns:
+        ShelfLifeCache: The shared cache
+    """
+    global _shelf_life_cache
+    with _shelf_life_cache_lock:
+        if _shelf_life_cache is None:
+            _shelf_life_cache = ShelfLifeCache()
+        if _shelf_life_cache.collection is None and SHELF_LIFE_CACHE_PERSISTENT and db is not None:
+            _shelf_life_cache.collection = db[SHELF_LIFE_COLLECTION]
+    return _shelf_life_cache
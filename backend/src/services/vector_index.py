@@ -0,0 +1,468 @@
+# backend/src/services/vector_index.py
+import datetime
+import os
+import threading
+import time
+import numpy as np
+from src.services.embedding_codec import decode_embedding, is_legacy_embedding
+
+try:
+    import hnswlib
+except ImportError:  # The exact search path is used when hnswlib isn't installed
+    hnswlib = None
+
+# Fields copied from image_vectors documents into search results
+RESULT_FIELDS = ("name", "expirationPeriod", "metadata")
+# Catch-up queries re-read this much history so writes from workers with skewed clocks,
+# or committed just after the previous catch-up started, are not missed
+SYNC_OVERLAP_SECONDS = int(os.getenv("VECTOR_INDEX_SYNC_OVERLAP_SECONDS", "120"))
+
+
+def _utcnow():
+    # Naive UTC, as pymongo returns stored datetimes
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+class EmbeddingMatrix:
+    """
+    In-memory cache of every embedding in an image_vectors collection for exact search.
+
+    Rows are L2-normalised float32 vectors, so cosine similarity against all documents is a
+    single matrix-vector product. Ids, names, expiration periods and metadata are kept in
+    parallel arrays. Capacity grows geometrically so appends are amortised O(1).
+
+    The collection is read in full once; afterwards `catch_up` appends only the vectors
+    written since the last sync (by `created_at`), so writes from other workers show up
+    without ever reloading the whole collection.
+    """
+
+    def __init__(self, dimensions, capacity=1024):
+        self.dimensions = dimensions
+        self._matrix = np.zeros((capacity, dimensions), dtype=np.float32)
+        self._count = 0
+        self._rows = {}               # document _id -> row
+        self.ids = []
+        self.names = []
+        self.expiration_periods = []
+        self.metadata = []
+        self._lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self.synced_at = None  # UTC time the last full load or successful catch-up query started
+        self._checked_at = time.monotonic()
+
+    def __len__(self):
+        return self._count
+
+    @staticmethod
+    def _normalise(vectors):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        norms = np.linalg.norm(vectors, axis=-1, keepdims=True)
+        # Zero vectors stay zero and score 0 against everything
+        return np.divide(vectors, norms, out=np.zeros_like(vectors), where=norms > 0)
+
+    def load(self, collection):
+        """
+        Load every embedding from `collection` in one pass.
+
+        Args:
+            collection: MongoDB collection holding image vectors
+
+        Returns:
+            EmbeddingMatrix: self, for chaining
+        """
+        start = time.perf_counter()
+        sync_start = _utcnow()
+        ids, vectors, docs, legacy = self._read(collection, {})
+        if vectors:
+            self.add_batch(ids, np.vstack(vectors), docs)
+        self.synced_at = sync_start
+        print(f"Loaded {self._count} image vectors into the embedding matrix in {time.perf_counter() - start:.2f}s")
+        if legacy:
+            print(f"WARNING: {legacy} vectors in {collection.name} are still lists of doubles "
+                  f"(not searchable by a vectorSearch index); run `python -m src.manage migrate-embeddings`")
+        return self
+
+    def needs_sync(self, interval_seconds):
+        """Return True if the last sync attempt is older than `interval_seconds`."""
+        return time.monotonic() - self._checked_at >= interval_seconds
+
+    def catch_up(self, collection):
+        """
+        Append the vectors stored (by any process) since the last sync.
+
+        Only documents with a recent `created_at` are read, so the cost is proportional to
+        the new writes, not to the collection. Rows already cached are replaced, which makes
+        the overlap with the previous sync harmless. If another thread is already catching
+        up, this returns immediately and the caller searches the current rows.
+
+        Args:
+            collection: MongoDB collection holding image vectors
+
+        Returns:
+            tuple or None: (ids, vectors, docs) that were applied, or None if nothing was read
+        """
+        if not self._sync_lock.acquire(blocking=False):
+            return None
+        try:
+            # Counts as an attempt even if the query fails, so an outage isn't retried on every search
+            self._checked_at = time.monotonic()
+            sync_start = _utcnow()
+            since = self.synced_at - datetime.timedelta(seconds=SYNC_OVERLAP_SECONDS)
+            ids, vectors, docs, _ = self._read(collection, {"created_at": {"$gte": since}})
+            self.synced_at = sync_start
+            if not vectors:
+                return None
+            vectors = np.vstack(vectors)
+            self.add_batch(ids, vectors, docs)
+            print(f"Caught up {len(ids)} recent image vectors from {collection.name}")
+            return ids, vectors, docs
+        finally:
+            self._sync_lock.release()
+
+    def _read(self, collection, query):
+        """Read and decode the embeddings matching `query`, skipping unusable ones."""
+        projection = {"embedding": 1, **{field: 1 for field in RESULT_FIELDS}}
+        ids, vectors, docs = [], [], []
+        legacy = 0
+        for doc in collection.find(query, projection):
+            if is_legacy_embedding(doc.get("embedding")):
+                legacy += 1
+            embedding = decode_embedding(doc.get("embedding"))
+            if embedding is None:
+                print(f"WARNING: No embedding found in document {doc.get('_id', 'unknown')}")
+                continue
+            if embedding.shape[0] != self.dimensions:
+                print(f"WARNING: Skipping document {doc['_id']} with {embedding.shape[0]}-d embedding "
+                      f"(expected {self.dimensions})")
+                continue
+            ids.append(doc["_id"])
+            vectors.append(embedding)
+            docs.append(doc)
+        return ids, vectors, docs, legacy
+
+    def add(self, doc_id, embedding, doc):
+        """Append a document's vector, or replace it if the id is already cached."""
+        self.add_batch([doc_id], np.asarray(embedding, dtype=np.float32).reshape(1, -1), [doc])
+
+    def add_batch(self, ids, vectors, docs):
+        """
+        Append or replace several rows at once.
+
+        Args:
+            ids (list): Document ids
+            vectors (np.ndarray): (n, dimensions) embeddings, not necessarily normalised
+            docs (list): Documents holding the result fields
+        """
+        normalised = self._normalise(vectors)
+        with self._lock:
+            for doc_id, vector, doc in zip(ids, normalised, docs):
+                row = self._rows.get(doc_id)
+                if row is None:
+                    row = self._count
+                    if row == self._matrix.shape[0]:
+                        grown = np.zeros((max(1, row) * 2, self.dimensions), dtype=np.float32)
+                        grown[:row] = self._matrix[:row]
+                        self._matrix = grown
+                    self._rows[doc_id] = row
+                    self.ids.append(doc_id)
+                    self.names.append(doc.get("name"))
+                    self.expiration_periods.append(doc.get("expirationPeriod"))
+                    self.metadata.append(doc.get("metadata"))
+                    self._count += 1
+                else:
+                    self.names[row] = doc.get("name")
+                    self.expiration_periods[row] = doc.get("expirationPeriod")
+                    self.metadata[row] = doc.get("metadata")
+                self._matrix[row] = vector
+
+    def vectors(self):
+        """Return a view of the normalised vectors currently cached."""
+        return self._matrix[:self._count]
+
+    def result(self, row, score):
+        """Build a search result dict for a row."""
+        return {
+            "_id": self.ids[row],
+            "name": self.names[row],
+            "expirationPeriod": self.expiration_periods[row],
+            "metadata": self.metadata[row],
+            "score": score,
+        }
+
+    def search(self, query_embedding, limit=5, threshold=0.0):
+        """
+        Exact cosine top-k: one matrix-vector product plus argpartition.
+
+        Args:
+            query_embedding (array-like): Query vector
+            limit (int): Maximum number of results
+            threshold (float): Minimum cosine similarity for a result
+
+        Returns:
+            list: Dicts with _id, name, expirationPeriod, metadata and score, best first
+        """
+        query = self._normalise(query_embedding)
+        with self._lock:
+            count = self._count
+            if count == 0:
+                return []
+            scores = self._matrix[:count] @ query
+            if count > limit:
+                top = np.argpartition(-scores, limit - 1)[:limit]
+            else:
+                top = np.arange(count)
+            top = top[np.argsort(-scores[top])]
+            return [self.result(row, float(scores[row])) for row in top if scores[row] >= threshold]
+
+
+class HNSWVectorIndex:
+    """
+    In-process approximate nearest-neighbour index (HNSW, cosine space) over image embeddings.
+
+    hnswlib works with integer labels, so documents are mapped to sequential labels and
+    their result fields are kept alongside. Re-adding a known document id replaces its vector.
+    """
+
+    def __init__(self, dimensions, max_elements=1024, ef_construction=200, m=16, ef_search=64):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed")
+        self.dimensions = dimensions
+        self.ef_search = ef_search
+        self._index = hnswlib.Index(space="cosine", dim=dimensions)
+        self._index.init_index(max_elements=max_elements, ef_construction=ef_construction, M=m)
+        self._index.set_ef(ef_search)
+        self._lock = threading.Lock()
+        self._labels = {}   # document _id -> label
+        self._docs = []     # label -> result fields (including _id)
+        self.built_at = None
+        self.ready = False  # Set once build_from_matrix has indexed the existing rows
+
+    def __len__(self):
+        return len(self._docs)
+
+    def build_from_matrix(self, matrix):
+        """
+        Index every vector held by an EmbeddingMatrix.
+
+        Args:
+            matrix (EmbeddingMatrix): Loaded embedding cache
+
+        Returns:
+            HNSWVectorIndex: self, for chaining
+        """
+        start = time.perf_counter()
+        with matrix._lock:
+            count = len(matrix)
+            vectors = matrix.vectors().copy()
+            ids = list(matrix.ids[:count])
+            docs = [{"name": matrix.names[row], "expirationPeriod": matrix.expiration_periods[row],
+                     "metadata": matrix.metadata[row]} for row in range(count)]
+        if count:
+            self.add_batch(ids, vectors, docs)
+        self.built_at = time.time()
+        self.ready = True
+        print(f"Built HNSW index over {count} image vectors in {time.perf_counter() - start:.2f}s")
+        return self
+
+    def add(self, doc_id, embedding, doc):
+        """
+        Add or replace a single document's vector.
+
+        Args:
+            doc_id: The document's _id
+            embedding (array-like): The image embedding
+            doc (dict): Document holding the result fields (name, expirationPeriod, metadata)
+        """
+        self.add_batch([doc_id], np.asarray(embedding, dtype=np.float32).reshape(1, -1), [doc])
+
+    def add_batch(self, ids, vectors, docs):
+        """Add or replace several vectors at once."""
+        with self._lock:
+            labels = []
+            for doc_id, doc in zip(ids, docs):
+                result_doc = {"_id": doc_id, **{field: doc.get(field) for field in RESULT_FIELDS}}
+                label = self._labels.get(doc_id)
+                if label is None:
+                    label = len(self._docs)
+                    self._labels[doc_id] = label
+                    self._docs.append(result_doc)
+                else:
+                    self._docs[label] = result_doc
+                labels.append(label)
+
+            needed = len(self._docs)
+            capacity = self._index.get_max_elements()
+            if needed > capacity:
+                self._index.resize_index(max(needed, capacity * 2))
+            self._index.add_items(np.asarray(vectors, dtype=np.float32), np.asarray(labels, dtype=np.int64))
+
+    def search(self, query_embedding, limit=5, threshold=0.0):
+        """
+        Return the most similar documents to `query_embedding`.
+
+        Args:
+            query_embedding (array-like): Query vector
+            limit (int): Maximum number of results
+            threshold (float): Minimum cosine similarity for a result
+
+        Returns:
+            list: Dicts with _id, name, expirationPeriod, metadata and score, best first
+        """
+        with self._lock:
+            if not self._docs:
+                return []
+            k = min(limit, len(self._docs))
+            # ef must be at least k for hnswlib to return k neighbours
+            self._index.set_ef(max(self.ef_search, k))
+            labels, distances = self._index.knn_query(np.asarray(query_embedding, dtype=np.float32), k=k)
+            docs = [self._docs[label] for label in labels[0]]
+
+        results = []
+        for doc, distance in zip(docs, distances[0]):
+            score = 1.0 - float(distance)  # hnswlib cosine distance is 1 - cosine similarity
+            if score >= threshold:
+                results.append({**doc, "score": score})
+        return results
+
+
+# Shared caches, one per collection, so every ImageVectorService instance reuses them
+_matrices = {}
+_indexes = {}
+_cache_lock = threading.Lock()
+# How often a search checks for vectors written by other processes (an indexed, incremental query)
+CACHE_REFRESH_SECONDS = int(os.getenv("VECTOR_INDEX_REFRESH_SECONDS", "60"))
+# Below this many vectors the exact matrix product is as fast as HNSW and has perfect recall
+ANN_MIN_VECTORS = int(os.getenv("VECTOR_INDEX_MIN_SIZE", "5000"))
+
+
+def _cache_key(collection):
+    return f"{collection.database.name}.{collection.name}"
+
+
+def get_embedding_matrix(collection, dimensions):
+    """
+    Return the shared embedding matrix for `collection`, loading it on first use.
+
+    Vectors stored by this process are appended as they are written. Every
+    VECTOR_INDEX_REFRESH_SECONDS a search also catches up on vectors written by other
+    processes, appending them to the matrix and to the HNSW index if one was built; the
+    collection is only read in full on first use.
+
+    Args:
+        collection: MongoDB collection holding image vectors
+        dimensions (int): Embedding dimensions
+
+    Returns:
+        EmbeddingMatrix: The loaded matrix
+    """
+    key = _cache_key(collection)
+    with _cache_lock:
+        matrix = _matrices.get(key)
+        if matrix is None:
+            matrix = EmbeddingMatrix(dimensions).load(collection)
+            _matrices[key] = matrix
+            return matrix
+
+    # Outside the global lock: searches on other threads keep using the current rows
+    if matrix.needs_sync(CACHE_REFRESH_SECONDS):
+        try:
+            added = matrix.catch_up(collection)
+        except Exception as e:
+            print(f"Vector cache catch-up failed, searching cached vectors: {str(e)}")
+            added = None
+        index = _indexes.get(key)
+        if added and index is not None:
+            index.add_batch(*added)
+    return matrix
+
+
+def get_vector_index(collection, dimensions, wait=True):
+    """
+    Return the shared HNSW index for `collection`, built once from its embedding matrix.
+
+    The index is registered before it is built, so vectors stored or caught up in the
+    meantime are added to it incrementally; after the build it is never rebuilt.
+
+    Args:
+        collection: MongoDB collection holding image vectors
+        dimensions (int): Embedding dimensions
+        wait (bool): Build in the calling thread; otherwise build in a background thread
+                     and return the index right away (check `index.ready` before searching)
+
+    Returns:
+        HNSWVectorIndex or None: None if hnswlib is not installed
+    """
+    if hnswlib is None:
+        return None
+
+    matrix = get_embedding_matrix(collection, dimensions)
+    key = _cache_key(collection)
+    with _cache_lock:
+        index = _indexes.get(key)
+        if index is not None:
+            return index
+        index = HNSWVectorIndex(dimensions, max_elements=max(1024, len(matrix)))
+        _indexes[key] = index
+
+    if wait:
+        _build_index(key, index, matrix)
+    else:
+        threading.Thread(target=_build_index, args=(key, index, matrix),
+                         name=f"hnsw-build-{collection.name}", daemon=True).start()
+    return index
+
+
+def _build_index(key, index, matrix):
+    """Fill a registered index from the matrix; unregister it on failure so a later search retries."""
+    try:
+        index.build_from_matrix(matrix)
+    except Exception as e:
+        print(f"Failed to build HNSW index for {key}: {str(e)}")
+        with _cache_lock:
+            if _indexes.get(key) is index:
+                _indexes.pop(key)
+
+
+def search_cached_vectors(collection, dimensions, query_embedding, limit=5, threshold=0.0):
+    """
+    Search the in-memory vector caches, using HNSW for large collections and exact search otherwise.
+
+    Args:
+        collection: MongoDB collection holding image vectors
+        dimensions (int): Embedding dimensions
+        query_embedding (array-like): Query vector
+        limit (int): Maximum number of results
+        threshold (float): Minimum cosine similarity for a result
+
+    Returns:
+        list: Dicts with _id, name, expirationPeriod, metadata and score, best first
+    """
+    matrix = get_embedding_matrix(collection, dimensions)
+    if hnswlib is not None and len(matrix) >= ANN_MIN_VECTORS:
+        # The first large search starts the build off the request path; exact search serves until it's done
+        index = get_vector_index(collection, dimensions, wait=False)
+        if index.ready:
+            print(f"Searching local HNSW index ({len(matrix)} vectors)...")
+            return index.search(query_embedding, limit, threshold)
+        print("HNSW index still building...")
+    print(f"Searching cached embedding matrix ({len(matrix)} vectors)...")
+    return matrix.search(query_embedding, limit, threshold)
+
+
+def add_to_vector_caches(collection, doc_id, embedding, doc):
+    """
+    Incrementally add a newly stored vector to whichever shared caches have been built.
+
+    Args:
+        collection: MongoDB collection the vector was stored in
+        doc_id: The document's _id
+        embedding (array-like): The image embedding
+        doc (dict): Document holding the result fields
+    """
+    key = _cache_key(collection)
+    matrix = _matrices.get(key)
+    if matrix is not None:
+        matrix.add(doc_id, embedding, doc)
+    index = _indexes.get(key)
+    if index is not None:
+        index.add(doc_id, embedding, doc)
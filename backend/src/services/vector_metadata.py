@@ -0,0 +1,103 @@
+# backend/src/services/vector_metadata.py
+import os
+import threading
+import time
+
+VECTOR_METADATA_TTL_SECONDS = int(os.getenv("VECTOR_METADATA_TTL_SECONDS", "300"))
+
+
+class VectorCollectionMetadata:
+    """
+    Cached schema and size information for an image_vectors collection.
+
+    Keeps Atlas round trips (listSearchIndexes, document counts) off the request path:
+    each value is fetched at most once per TTL, and the document count is bumped
+    locally whenever this process inserts a vector.
+    """
+
+    def __init__(self, ttl_seconds=VECTOR_METADATA_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._doc_count = None
+        self._doc_count_checked_at = 0.0
+        self._index_queryable = None
+        self._index_checked_at = 0.0
+
+    def _expired(self, checked_at):
+        return time.time() - checked_at >= self.ttl_seconds
+
+    def get_doc_count(self, collection):
+        """
+        Return the (approximate) number of documents in the collection.
+
+        Uses estimated_document_count, which reads collection metadata rather than
+        scanning, and only when the cached value is older than the TTL. A cached zero is
+        never trusted: callers skip the search on an empty collection, so another worker's
+        first insert must become visible immediately, not after the TTL.
+        """
+        with self._lock:
+            if self._doc_count and not self._expired(self._doc_count_checked_at):
+                return self._doc_count
+        count = collection.estimated_document_count()
+        with self._lock:
+            self._doc_count = count
+            self._doc_count_checked_at = time.time()
+        return count
+
+    def increment_doc_count(self, amount=1):
+        """Account for documents inserted by this process."""
+        with self._lock:
+            if self._doc_count is not None:
+                self._doc_count += amount
+
+    def index_queryable(self, collection, index_name="vector_index"):
+        """
+        Return whether the Atlas search index exists and is queryable, checking at most once per TTL.
+
+        Returns:
+            bool: False if the index is missing, still building, or cannot be listed
+        """
+        with self._lock:
+            if self._index_queryable is not None and not self._expired(self._index_checked_at):
+                return self._index_queryable
+        return self.refresh_index_state(collection, index_name)
+
+    def refresh_index_state(self, collection, index_name="vector_index"):
+        """Query Atlas for the index state now and cache the answer."""
+        queryable = False
+        try:
+            for index in collection.list_search_indexes(index_name):
+                # Older servers don't report `queryable`; treat an existing index as usable
+                queryable = index.get("queryable", True) and index.get("type", "vectorSearch") == "vectorSearch"
+                break
+        except Exception as e:
+            print(f"Could not list search indexes: {str(e)}")
+        self.set_index_state(queryable)
+        return queryable
+
+    def set_index_state(self, queryable):
+        with self._lock:
+            self._index_queryable = queryable
+            self._index_checked_at = time.time()
+
+    def stats(self):
+        with self._lock:
+            return {
+                "doc_count": self._doc_count,
+                "index_queryable": self._index_queryable,
+                "ttl_seconds": self.ttl_seconds,
+            }
+
+
+_metadata = {}
+_metadata_lock = threading.Lock()
+
+
+def get_collection_metadata(collection):
+    """Return the shared metadata cache for `collection`."""
+    key = f"{collection.database.name}.{collection.name}"
+    with _metadata_lock:
+        metadata = _metadata.get(key)
+        if metadata is None:
+            metadata = _metadata[key] = VectorCollectionMetadata()
+        return metadata
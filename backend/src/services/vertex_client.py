@@ -0,0 +1,176 @@
+# backend/src/services/vertex_client.py
+import os
+import random
+import threading
+import time
+import requests
+from requests.adapters import HTTPAdapter
+
+VERTEX_API_BASE = "https://aiplatform.googleapis.com/v1"
+VERTEX_CONNECT_TIMEOUT = float(os.getenv("VERTEX_CONNECT_TIMEOUT", "5"))
+VERTEX_READ_TIMEOUT = float(os.getenv("VERTEX_READ_TIMEOUT", "60"))
+VERTEX_POOL_SIZE = int(os.getenv("VERTEX_POOL_SIZE", "10"))
+VERTEX_MAX_RETRIES = int(os.getenv("VERTEX_MAX_RETRIES", "3"))
+VERTEX_BACKOFF_BASE = float(os.getenv("VERTEX_BACKOFF_BASE", "0.5"))
+VERTEX_BACKOFF_MAX = float(os.getenv("VERTEX_BACKOFF_MAX", "8"))
+
+# Quota errors and transient server errors; anything else is returned to the caller as-is
+RETRY_STATUS_CODES = frozenset({429, 500, 502, 503, 504})
+
+
+def generate_content_url(project_id, model="gemini-2.0-flash"):
+    """Return the generateContent endpoint for a Gemini model on the global Vertex AI location."""
+    return f"{VERTEX_API_BASE}/projects/{project_id}/locations/global/publishers/google/models/{model}:generateContent"
+
+
+class VertexClient:
+    """
+    Shared HTTP client for Vertex AI.
+
+    A single `requests.Session` keeps TLS connections to aiplatform.googleapis.com alive
+    between calls (up to `pool_size` concurrently). Every call has connect/read timeouts,
+    and 429/5xx responses or dropped connections are retried with full-jitter exponential
+    backoff, honouring a numeric Retry-After header. Read timeouts are not retried: the
+    model may still be generating and a retry would only multiply the wait.
+    """
+
+    def __init__(self, connect_timeout=VERTEX_CONNECT_TIMEOUT, read_timeout=VERTEX_READ_TIMEOUT,
+                 pool_size=VERTEX_POOL_SIZE, max_retries=VERTEX_MAX_RETRIES,
+                 backoff_base=VERTEX_BACKOFF_BASE, backoff_max=VERTEX_BACKOFF_MAX):
+        self.timeout = (connect_timeout, read_timeout)
+        self.pool_size = pool_size
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session = requests.Session()
+        self.session.mount("https://", self.adapter)
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.total_ms = 0.0
+        self._lock = threading.Lock()
+
+    def post(self, url, json=None, headers=None):
+        """
+        POST to Vertex AI through the pooled session, retrying transient failures.
+
+        Args:
+            url (str): Endpoint URL (see generate_content_url)
+            json (dict, optional): Request body
+            headers (dict, optional): Request headers, e.g. Authorization
+
+        Returns:
+            requests.Response: The final response (which may still be an error status)
+
+        Raises:
+            requests.exceptions.RequestException: If the last attempt failed without a response
+        """
+        attempt = 0
+        while True:
+            started = time.perf_counter()
+            try:
+                response = self.session.post(url, json=json, headers=headers, timeout=self.timeout)
+            except requests.exceptions.ConnectionError as e:
+                # Includes connect timeouts and keep-alive connections closed by the server
+                self._record(started, failed=attempt >= self.max_retries)
+                if attempt >= self.max_retries:
+                    raise
+                print(f"Vertex client: connection error ({str(e)}), retrying")
+                delay = self._backoff(attempt)
+            except requests.exceptions.RequestException:
+                self._record(started, failed=True)
+                raise
+            else:
+                retryable = response.status_code in RETRY_STATUS_CODES
+                self._record(started, failed=retryable and attempt >= self.max_retries)
+                if not retryable or attempt >= self.max_retries:
+                    return response
+                print(f"Vertex client: HTTP {response.status_code}, retrying")
+                delay = self._backoff(attempt, response.headers.get("Retry-After"))
+                response.close()
+
+            attempt += 1
+            with self._lock:
+                self.retries += 1
+            time.sleep(delay)
+
+    def generate_content(self, project_id, model, request_body, access_token):
+        """
+        Call a Gemini model's generateContent endpoint.
+
+        Args:
+            project_id (str): Google Cloud project
+            model (str): Model name, e.g. "gemini-2.0-flash"
+            request_body (dict): generateContent request body
+            access_token (str): OAuth access token
+
+        Returns:
+            requests.Response: The final response
+        """
+        headers = {
+            "Authorization": f"Bearer {access_token}",
+            "Content-Type": "application/json"
+        }
+        return self.post(generate_content_url(project_id, model), json=request_body, headers=headers)
+
+    def _backoff(self, attempt, retry_after=None):
+        """Seconds to wait before the next attempt: Retry-After if given, else full jitter."""
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass  # HTTP-date form; fall back to our own schedule
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _record(self, started, failed):
+        with self._lock:
+            self.requests += 1
+            self.total_ms += (time.perf_counter() - started) * 1000
+            if failed:
+                self.failures += 1
+
+    def stats(self):
+        """Return request, retry and connection-reuse counters for the Vertex AI host."""
+        # Each urllib3 pool counts the TCP+TLS connections it had to open; this session only talks to Vertex
+        pools = self.adapter.poolmanager.pools
+        connections = 0
+        for key in pools.keys():
+            pool = pools.get(key)
+            if pool is not None:
+                connections += pool.num_connections
+        with self._lock:
+            requests_sent = self.requests
+            retries = self.retries
+            failures = self.failures
+            total_ms = self.total_ms
+        reused = max(0, requests_sent - connections)
+        return {
+            "requests": requests_sent,
+            "retries": retries,
+            "failures": failures,
+            "connections_opened": connections,
+            "connections_reused": reused,
+            "reuse_rate": round(reused / requests_sent, 4) if requests_sent else 0.0,
+            "avg_ms": round(total_ms / requests_sent, 2) if requests_sent else 0.0,
+            "pool_size": self.pool_size,
+            "timeout": {"connect": self.timeout[0], "read": self.timeout[1]},
+        }
+
+
+_vertex_client = None
+_vertex_client_lock = threading.Lock()
+
+
+def get_vertex_client():
+    """
+    Return the process-wide Vertex AI client, creating it on first use.
+
+    Returns:
+        VertexClient: The shared client
+    """
+    global _vertex_client
+    with _vertex_client_lock:
+        if _vertex_client is None:
+            _vertex_client = VertexClient()
+    return _vertex_client
@@ -0,0 +1,102 @@
+import os
+import sys
+import time
+import argparse
+import threading
+import numpy as np
+from PIL import Image
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.batching_encoder import BatchingEncoder
+
+
+class SyntheticEncoder:
+    """
+    Stand-in for CLIP when the real model isn't available: a stack of dense layers, so a
+    batch of one is memory-bound on the weights just like a real transformer forward pass.
+    """
+
+    def __init__(self, width=2048, layers=6, seed=0):
+        rng = np.random.default_rng(seed)
+        self.weights = [rng.standard_normal((width, width), dtype=np.float32) / np.sqrt(width) for _ in range(layers)]
+        self.width = width
+
+    def encode(self, images, batch_size=32):
+        if not isinstance(images, list):
+            return self.encode([images])[0]
+        x = np.stack([np.resize(np.asarray(img, dtype=np.float32).ravel(), self.width) for img in images])
+        for w in self.weights:
+            x = np.tanh(x @ w)
+        return x
+
+
+def run_load(encode, concurrency, requests_per_thread, image):
+    """Hammer `encode` from `concurrency` threads and return (throughput, p50 ms, p99 ms)."""
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for _ in range(requests_per_thread):
+            start = time.perf_counter()
+            encode(image)
+            local.append(time.perf_counter() - start)
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    latencies_ms = np.array(latencies) * 1000
+    return len(latencies) / elapsed, np.percentile(latencies_ms, 50), np.percentile(latencies_ms, 99)
+
+
+def test_batching_encoder(real_model=False, concurrency=16, requests_per_thread=20):
+    """Compare unbatched concurrent encodes with the micro-batching front-end."""
+    if real_model:
+        from src.services.model_registry import get_clip_model
+        model = get_clip_model("clip-ViT-L-14")
+        requests_per_thread = max(1, requests_per_thread // 10)
+    else:
+        model = SyntheticEncoder()
+    image = Image.new("RGB", (224, 224), color="green")
+
+    print(f"Concurrency {concurrency}, {requests_per_thread} requests per thread "
+          f"({'clip-ViT-L-14' if real_model else 'synthetic encoder'})")
+    print(f"{'mode':<28}{'img/s':>10}{'p50 ms':>10}{'p99 ms':>10}{'avg batch':>11}")
+
+    throughput, p50, p99 = run_load(lambda img: model.encode(img), concurrency, requests_per_thread, image)
+    print(f"{'unbatched':<28}{throughput:>10.1f}{p50:>10.1f}{p99:>10.1f}{1:>11.2f}")
+
+    for max_batch_size, max_wait_ms in [(4, 2), (8, 5), (16, 5), (16, 10)]:
+        encoder = BatchingEncoder(model, max_batch_size=max_batch_size, max_wait_ms=max_wait_ms)
+        throughput, p50, p99 = run_load(encoder.encode, concurrency, requests_per_thread, image)
+        label = f"batch<={max_batch_size}, wait {max_wait_ms}ms"
+        print(f"{label:<28}{throughput:>10.1f}{p50:>10.1f}{p99:>10.1f}{encoder.stats()['avg_batch_size']:>11.2f}")
+
+
+def test_bad_image_isolation(concurrency=8):
+    """One undecodable image in a batch must fail only its own request."""
+    encoder = BatchingEncoder(SyntheticEncoder(width=256, layers=2), max_batch_size=concurrency, max_wait_ms=50)
+    good = Image.new("RGB", (224, 224), color="green")
+    futures = [encoder.submit("not an image" if i == 0 else good) for i in range(concurrency)]
+    failed = sum(1 for future in futures if future.exception() is not None)
+    print(f"Bad image isolation: {failed} of {concurrency} requests failed, stats: {encoder.stats()}")
+    assert failed == 1, "only the bad image should fail"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the micro-batching encoder: throughput vs p99 latency.')
+    parser.add_argument('--real', action='store_true', help='Use the real clip-ViT-L-14 model')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent request threads')
+    parser.add_argument('--requests', type=int, default=20, help='Requests per thread')
+    args = parser.parse_args()
+
+    test_bad_image_isolation()
+    test_batching_encoder(args.real, args.concurrency, args.requests)
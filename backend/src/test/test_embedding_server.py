@@ -0,0 +1,107 @@
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import numpy as np
+from PIL import Image
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.batching_encoder import BatchingEncoder
+from src.services.embedding_server import EmbeddingServer, SidecarEncoder
+from src.services.model_registry import prepare_encoder_image
+
+
+class SyntheticEncoder:
+    """Deterministic stand-in for CLIP: projects the pixels onto a fixed random basis."""
+
+    def __init__(self, dimensions=768, seed=0):
+        rng = np.random.default_rng(seed)
+        self.projection = rng.standard_normal((64 * 64 * 3, dimensions), dtype=np.float32)
+
+    def encode(self, images, batch_size=32):
+        if not isinstance(images, list):
+            return self.encode([images])[0]
+        pixels = np.stack([np.asarray(img.convert("RGB").resize((64, 64)), dtype=np.float32).ravel() / 255
+                           for img in images])
+        embeddings = pixels @ self.projection
+        return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+class RecordingEncoder:
+    """Wraps an encoder and keeps the pixels of the last batch it was given."""
+
+    def __init__(self, model):
+        self.model = model
+        self.last_pixels = []
+
+    def encode(self, images, batch_size=32):
+        if isinstance(images, list):
+            self.last_pixels = [img.tobytes() for img in images]
+        return self.model.encode(images, batch_size=batch_size)
+
+
+def test_embedding_server(real_model=False, concurrency=8, requests_per_thread=25):
+    """Check sidecar embeddings match in-process ones and report round-trip latency."""
+    if real_model:
+        from src.services.model_registry import get_clip_model
+        model = get_clip_model("clip-ViT-L-14")
+    else:
+        model = SyntheticEncoder()
+    recorder = RecordingEncoder(model)
+
+    socket_path = os.path.join(tempfile.mkdtemp(), "embeddings.sock")
+    server = EmbeddingServer(BatchingEncoder(recorder), socket_path, "clip-ViT-L-14")
+    server.start()
+    client = SidecarEncoder(socket_path, "clip-ViT-L-14")
+
+    test_dir = os.path.dirname(os.path.abspath(__file__))
+    images = [Image.open(os.path.join(test_dir, name)) for name in ("kiwi.jpeg", "ketchep.jpeg", "mandarin.jpeg")]
+
+    print("Checking parity with in-process encodes...")
+    for image in images:
+        # The in-process path (ImageVectorService.encode_image) prepares images the same way
+        prepared = prepare_encoder_image(image)
+        local = np.asarray(model.encode(prepared), dtype=np.float32)
+        remote = client.encode(image)
+        assert recorder.last_pixels == [prepared.tobytes()], "Sidecar encoded different pixels than in-process"
+        cosine = float(np.dot(local, remote) / (np.linalg.norm(local) * np.linalg.norm(remote)))
+        print(f"  {os.path.basename(image.filename)}: {remote.shape[0]} dims, cosine vs in-process {cosine:.6f}")
+        assert cosine > 0.9999, "Sidecar embedding differs from in-process embedding"
+
+    print(f"\nLoad: {concurrency} threads x {requests_per_thread} requests")
+    image = images[0]
+
+    def worker():
+        for _ in range(requests_per_thread):
+            client.encode(image)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    print(f"  {concurrency * requests_per_thread / elapsed:.1f} img/s")
+
+    stats = client.stats()
+    server_stats = stats["server"]
+    print(f"  client round trip: p50 {stats['p50_ms']} ms, p99 {stats['p99_ms']} ms")
+    print(f"  server: {server_stats['requests']} requests, p50 {server_stats['p50_ms']} ms, "
+          f"p99 {server_stats['p99_ms']} ms, avg batch {server_stats['encoder']['avg_batch_size']}, "
+          f"queue depth {server_stats['queue_depth']}")
+
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exercise the embedding sidecar over a Unix socket.')
+    parser.add_argument('--real', action='store_true', help='Use the real clip-ViT-L-14 model')
+    parser.add_argument('--concurrency', type=int, default=8, help='Concurrent client threads')
+    parser.add_argument('--requests', type=int, default=25, help='Requests per thread')
+    args = parser.parse_args()
+
+    test_embedding_server(args.real, args.concurrency, args.requests)
@@ -0,0 +1,65 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+from PIL import Image
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.onnx_encoder import OnnxClipEncoder, onnx_model_paths, ONNX_MODEL_DIR
+
+
+def load_encoders(model_name, model_dir):
+    """Return (label, encoder) pairs for every backend available locally."""
+    encoders = []
+    try:
+        from src.services.model_registry import get_clip_model
+        encoders.append(("sentence-transformers fp32", get_clip_model(model_name, "cpu")))
+    except ImportError as e:
+        print(f"Skipping sentence-transformers: {str(e)}")
+
+    paths = onnx_model_paths(model_name, model_dir)
+    for variant in ("fp32", "int8"):
+        if os.path.exists(paths[variant]):
+            encoders.append((f"onnx {variant}", OnnxClipEncoder(paths[variant], paths["config"])))
+        else:
+            print(f"Skipping onnx {variant}: {paths[variant]} not found")
+    return encoders
+
+
+def test_encoder_latency(model_name="clip-ViT-L-14", model_dir=ONNX_MODEL_DIR, runs=20, batch_size=8):
+    """Compare single-image latency and batched throughput across encoder backends."""
+    test_dir = os.path.dirname(os.path.abspath(__file__))
+    image = Image.open(os.path.join(test_dir, "kiwi.jpeg")).convert("RGB")
+    batch = [image] * batch_size
+
+    print(f"{'backend':<28}{'p50 ms':>10}{'p99 ms':>10}{f'img/s @{batch_size}':>14}")
+    for label, encoder in load_encoders(model_name, model_dir):
+        encoder.encode(image)  # Warm-up
+
+        latencies = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            encoder.encode(image)
+            latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        for _ in range(max(1, runs // batch_size)):
+            encoder.encode(batch, batch_size=batch_size)
+        throughput = max(1, runs // batch_size) * batch_size / (time.perf_counter() - start)
+
+        latencies_ms = np.array(latencies) * 1000
+        print(f"{label:<28}{np.percentile(latencies_ms, 50):>10.1f}{np.percentile(latencies_ms, 99):>10.1f}"
+              f"{throughput:>14.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Latency/throughput comparison of the CLIP encoder backends.')
+    parser.add_argument('--model', default='clip-ViT-L-14', help='sentence-transformers model id')
+    parser.add_argument('--model-dir', default=ONNX_MODEL_DIR, help='Directory with the exported graphs')
+    parser.add_argument('--runs', type=int, default=20, help='Single-image encodes per backend')
+    parser.add_argument('--batch-size', type=int, default=8, help='Batch size for the throughput run')
+    args = parser.parse_args()
+
+    test_encoder_latency(args.model, args.model_dir, args.runs, args.batch_size)
@@ -0,0 +1,57 @@
+import io
+import os
+import sys
+import time
+import argparse
+from PIL import Image, ImageOps
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.helper.image_ingress import IngressImage, get_ingress_stats, calibrate_decode_cost
+
+
+def full_decode(data):
+    """The pre-ingress path: decode every pixel, then rotate and convert."""
+    image = ImageOps.exif_transpose(Image.open(io.BytesIO(data)))
+    return image.convert("RGB")
+
+
+def test_image_ingress(runs=5):
+    """Compare full-resolution decoding with the draft-mode ingress on the test photos."""
+    calibrate_decode_cost()  # Done by the server warm-up; needed for the "decode ms saved" totals
+    test_dir = os.path.dirname(os.path.abspath(__file__))
+    names = sorted(name for name in os.listdir(test_dir) if name.endswith((".jpeg", ".jpg", ".png")))
+
+    print(f"{'image':<32}{'full ms':>10}{'ingress ms':>12}{'source KB':>11}{'payload KB':>12}{'working':>12}")
+    for name in names:
+        with open(os.path.join(test_dir, name), "rb") as f:
+            data = f.read()
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            reference = full_decode(data)
+        full_ms = (time.perf_counter() - start) * 1000 / runs
+
+        start = time.perf_counter()
+        for _ in range(runs):
+            upload = IngressImage(data)
+            upload.image
+        ingress_ms = (time.perf_counter() - start) * 1000 / runs
+
+        # Orientation must survive draft decoding: same aspect ratio as the fully decoded image
+        working = upload.image
+        assert abs(working.width / working.height - reference.width / reference.height) < 0.01, name
+        assert Image.open(io.BytesIO(upload.payload)).size[0] > 0, name
+
+        print(f"{name:<32}{full_ms:>10.1f}{ingress_ms:>12.1f}{len(data) / 1024:>11.0f}"
+              f"{len(upload.payload) / 1024:>12.0f}{f'{working.width}x{working.height}':>12}")
+
+    print(f"\nTotals: {get_ingress_stats()}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark the image ingress normaliser against a full decode.')
+    parser.add_argument('--runs', type=int, default=5, help='Decodes per image and path')
+    args = parser.parse_args()
+
+    test_image_ingress(args.runs)
@@ -4,12 +4,13 @@ import numpy as np
 from pathlib import Path
 from PIL import Image
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 import argparse
 
 # Add the src directory to the path so we can import the db_connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from db_connector import get_db_instance, close_db_connection
+from services.model_registry import get_clip_model
+from services.embedding_codec import decode_embedding
 
 # Load environment variables
 load_dotenv("../../../.venv/.env", override=True)
@@ -30,7 +31,7 @@ def search_similar_images(query_image_path, limit=5, threshold=0.7):
     
     # Initialize the model for image embeddings
     print("Loading CLIP model...")
-    model = SentenceTransformer("clip-ViT-L-14", device="cuda")
+    model = get_clip_model("clip-ViT-L-14", device="cuda")
     
     # Connect to MongoDB
     print("Connecting to MongoDB...")
@@ -55,7 +56,7 @@ def search_similar_images(query_image_path, limit=5, threshold=0.7):
         print("\nSample document in collection:")
         for key, value in sample_doc.items():
             if key == "embedding":
-                print(f"  {key}: [vector with {len(value)} dimensions]")
+                print(f"  {key}: [vector with {len(decode_embedding(value))} dimensions]")
             else:
                 print(f"  {key}: {value}")
     
@@ -105,7 +106,6 @@ def search_similar_images(query_image_path, limit=5, threshold=0.7):
                     "name": 1,
                     "expirationPeriod": 1,
                     "metadata": 1,
-                    "embedding": 1,
                     "score": {"$meta": "vectorSearchScore"}
                 }
             }
@@ -143,12 +143,11 @@ def search_similar_images(query_image_path, limit=5, threshold=0.7):
     query_norm = np.linalg.norm(query_embedding)
     
     for doc in all_docs:
-        doc_embedding = doc.get("embedding", [])
-        if not doc_embedding:
+        doc_embedding = decode_embedding(doc.get("embedding"))
+        if doc_embedding is None:
             print(f"WARNING: No embedding found in document {doc.get('_id', 'unknown')}")
             continue
             
-        doc_embedding = np.array(doc_embedding)
         doc_norm = np.linalg.norm(doc_embedding)
         
         # Avoid division by zero
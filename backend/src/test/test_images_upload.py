@@ -1,14 +1,17 @@
 import os
 import sys
 import pymongo
+from pymongo.operations import SearchIndexModel
+from datetime import datetime
 from pathlib import Path
 from PIL import Image
 from dotenv import load_dotenv
-from sentence_transformers import SentenceTransformer
 
 # Add the src directory to the path so we can import the db_connector
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from db_connector import get_db_instance, close_db_connection
+from services.model_registry import get_clip_model
+from services.embedding_codec import encode_embedding
 
 # Load environment variables
 load_dotenv("../../../.venv/.env", override=True)
@@ -31,7 +34,7 @@ def main():
     
     # Load CLIP model
     print("Loading CLIP model (this may take a moment)...")
-    model = SentenceTransformer("clip-ViT-L-14")  # Using the model specified in the tutorial
+    model = get_clip_model("clip-ViT-L-14")  # Using the model specified in the tutorial
     
     # Create vector search index if it doesn't exist
     create_vector_search_index(collection)
@@ -84,8 +87,11 @@ def main():
                 "_id": item["filename"],  # Using filename as the document ID
                 "name": item["name"],
                 "expirationPeriod": item["expirationPeriod"],
-                "embedding": embedding.tolist(),  # Convert numpy array to list
-                "metadata": {"category": "food"}
+                "embedding": encode_embedding(embedding),  # Packed binary vector
+                "model": "clip-ViT-L-14",
+                "dimensions": 768,
+                "metadata": {"category": "food"},
+                "created_at": datetime.utcnow()
             }
             
             # Insert into MongoDB (with upsert to avoid duplicate key errors)
@@ -136,29 +142,22 @@ def create_vector_search_index(collection):
     if not index_exists:
         print("Creating vector search index...")
         
-        # Define the index configuration
+        # Packed float32 embeddings need an Atlas Vector Search index, not a knnVector one
         index_config = {
-            "mappings": {
-                "dynamic": True,
-                "fields": {
-                    "embedding": {
-                        "dimensions": 768,
-                        "similarity": "cosine",
-                        "type": "knnVector"
-                    }
+            "fields": [
+                {
+                    "type": "vector",
+                    "path": "embedding",
+                    "numDimensions": 768,
+                    "similarity": "cosine"
                 }
-            }
+            ]
         }
         
         # Create the index
         try:
-            collection.database.command(
-                "createSearchIndex",
-                collection.name,
-                {
-                    "definition": index_config,
-                    "name": "vector_index"
-                }
+            collection.create_search_index(
+                SearchIndexModel(definition=index_config, name="vector_index", type="vectorSearch")
             )
             print("Vector search index 'vector_index' created successfully.")
         except Exception as e:
@@ -166,21 +165,19 @@ def create_vector_search_index(collection):
             print("\nYou'll need to create the index manually in MongoDB Atlas following these steps:")
             print("1. Log in to MongoDB Atlas")
             print("2. Navigate to your cluster")
-            print("3. Go to the 'Search' tab")
-            print("4. Click 'Create Search Index'")
+            print("3. Go to the 'Atlas Search' tab")
+            print("4. Click 'Create Search Index' and pick 'Atlas Vector Search'")
             print("5. Choose 'JSON Editor' and enter:")
             print("""
             {
-              "mappings": {
-                "dynamic": true,
-                "fields": {
-                  "embedding": {
-                    "dimensions": 768,
-                    "similarity": "cosine",
-                    "type": "knnVector"
-                  }
+              "fields": [
+                {
+                  "type": "vector",
+                  "path": "embedding",
+                  "numDimensions": 768,
+                  "similarity": "cosine"
                 }
-              }
+              ]
             }
             """)
             print("6. Name your index 'vector_index'")
@@ -0,0 +1,84 @@
+import os
+import sys
+import argparse
+import numpy as np
+from PIL import Image
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.model_registry import get_clip_model
+from src.services.onnx_encoder import OnnxClipEncoder, onnx_model_paths, ONNX_MODEL_DIR
+
+
+def load_test_images():
+    test_dir = os.path.dirname(os.path.abspath(__file__))
+    names = sorted(name for name in os.listdir(test_dir) if name.endswith((".jpeg", ".jpg")))
+    return names, [Image.open(os.path.join(test_dir, name)).convert("RGB") for name in names]
+
+
+def normalize(embeddings):
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    return embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+
+
+def test_onnx_parity(model_name="clip-ViT-L-14", model_dir=ONNX_MODEL_DIR, min_cosine_fp32=0.9999,
+                     min_cosine_int8=0.98):
+    """
+    Check ONNX embeddings against the sentence-transformers reference on the test photos.
+
+    Reports per-image cosine similarity for the fp32 and int8 graphs and whether each
+    photo's nearest neighbour among the others is unchanged.
+    """
+    names, images = load_test_images()
+    print(f"Encoding {len(images)} test images with the sentence-transformers reference...")
+    reference_model = get_clip_model(model_name, "cpu")
+    reference = normalize(reference_model.encode(images))
+
+    paths = onnx_model_paths(model_name, model_dir)
+    clip_processor = reference_model[0].processor.image_processor
+    failures = []
+
+    for variant, min_cosine in (("fp32", min_cosine_fp32), ("int8", min_cosine_int8)):
+        if not os.path.exists(paths[variant]):
+            print(f"\nSkipping {variant}: {paths[variant]} not found (run `python -m src.manage export-onnx`)")
+            continue
+
+        encoder = OnnxClipEncoder(paths[variant], paths["config"])
+        if variant == "fp32":
+            # Preprocessing must match the CLIP processor before the graphs can be compared
+            ours = np.stack([encoder.preprocess(image) for image in images])
+            theirs = clip_processor(images=images, return_tensors="np")["pixel_values"]
+            print(f"\nPreprocessing max abs difference vs CLIP processor: {np.abs(ours - theirs).max():.5f}")
+
+        candidate = normalize(encoder.encode(images))
+        cosines = np.sum(reference * candidate, axis=1)
+        print(f"\n{variant} vs reference (min allowed {min_cosine}):")
+        for name, cosine in zip(names, cosines):
+            print(f"  {name:<32} cosine {cosine:.6f}")
+        print(f"  min {cosines.min():.6f}, mean {cosines.mean():.6f}, max drift {1 - cosines.min():.6f}")
+
+        # Nearest neighbour of each photo among the rest, as the similarity search would see it
+        reference_sim = reference @ reference.T
+        candidate_sim = candidate @ candidate.T
+        np.fill_diagonal(reference_sim, -np.inf)
+        np.fill_diagonal(candidate_sim, -np.inf)
+        agreement = np.mean(reference_sim.argmax(axis=1) == candidate_sim.argmax(axis=1))
+        print(f"  nearest-neighbour agreement: {agreement:.0%}")
+
+        if cosines.min() < min_cosine:
+            failures.append(f"{variant}: min cosine {cosines.min():.6f} < {min_cosine}")
+
+    if failures:
+        raise AssertionError("; ".join(failures))
+    print("\nParity check passed")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Compare ONNX CLIP embeddings with the fp32 sentence-transformers ones.')
+    parser.add_argument('--model', default='clip-ViT-L-14', help='sentence-transformers model id')
+    parser.add_argument('--model-dir', default=ONNX_MODEL_DIR, help='Directory with the exported graphs')
+    parser.add_argument('--min-cosine-fp32', type=float, default=0.9999, help='Lowest acceptable fp32 cosine')
+    parser.add_argument('--min-cosine-int8', type=float, default=0.98, help='Lowest acceptable int8 cosine')
+    args = parser.parse_args()
+
+    test_onnx_parity(args.model, args.model_dir, args.min_cosine_fp32, args.min_cosine_int8)
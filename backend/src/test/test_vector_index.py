@@ -0,0 +1,95 @@
+import os
+import sys
+import time
+import argparse
+import numpy as np
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.vector_index import HNSWVectorIndex, EmbeddingMatrix
+
+
+def make_embeddings(count, dimensions, clusters, seed=42):
+    """
+    Create synthetic embeddings grouped around a number of centres, the way photos of
+    the same product cluster together in CLIP space.
+    """
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimensions)).astype(np.float32)
+    assignments = rng.integers(0, clusters, size=count)
+    noise = rng.normal(scale=0.35, size=(count, dimensions)).astype(np.float32)
+    return centres[assignments] + noise
+
+
+def percentile_ms(samples, pct):
+    return float(np.percentile(samples, pct)) * 1000
+
+
+# Recall@k HNSW must reach at its default ef against exact search
+MIN_RECALL = 0.9
+
+
+def benchmark_vector_index(count=20000, dimensions=768, queries=200, k=5, clusters=500):
+    """
+    Compare HNSW recall and latency against exact brute-force search.
+
+    Returns:
+        dict: Recall@k, HNSW build seconds and per-query latencies (seconds) of both searches
+    """
+    embeddings = make_embeddings(count, dimensions, clusters)
+    # Queries are re-shots of stored items: a stored vector plus a little noise
+    rng = np.random.default_rng(7)
+    picks = rng.integers(0, count, size=queries)
+    query_vectors = embeddings[picks] + rng.normal(scale=0.2, size=(queries, dimensions)).astype(np.float32)
+
+    matrix = EmbeddingMatrix(dimensions)
+    matrix.add_batch(list(range(count)), embeddings, [{"name": f"item_{i}"} for i in range(count)])
+
+    start = time.perf_counter()
+    index = HNSWVectorIndex(dimensions, max_elements=count).build_from_matrix(matrix)
+    build_seconds = time.perf_counter() - start
+
+    exact_latencies, ann_latencies, hits = [], [], 0
+    for query in query_vectors:
+        start = time.perf_counter()
+        expected = [r["_id"] for r in matrix.search(query, limit=k)]
+        exact_latencies.append(time.perf_counter() - start)
+
+        start = time.perf_counter()
+        found = index.search(query, limit=k)
+        ann_latencies.append(time.perf_counter() - start)
+
+        hits += len(set(expected) & {r["_id"] for r in found})
+
+    return {
+        "recall": hits / (queries * k),
+        "build_seconds": build_seconds,
+        "exact_latencies": exact_latencies,
+        "ann_latencies": ann_latencies,
+    }
+
+
+def test_vector_index():
+    """HNSW must find nearly all of the exact top-k neighbours."""
+    results = benchmark_vector_index(count=5000, dimensions=256, queries=100, k=5, clusters=200)
+    assert results["recall"] >= MIN_RECALL, f"HNSW recall@5 {results['recall']:.4f} is below {MIN_RECALL}"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Measure HNSW recall and latency against exact matrix search.')
+    parser.add_argument('--count', type=int, default=20000, help='Number of indexed vectors')
+    parser.add_argument('--dimensions', type=int, default=768, help='Embedding dimensions')
+    parser.add_argument('--queries', type=int, default=200, help='Number of queries')
+    parser.add_argument('--k', type=int, default=5, help='Neighbours per query')
+    args = parser.parse_args()
+
+    print(f"Building {args.count} synthetic {args.dimensions}-d embeddings...")
+    results = benchmark_vector_index(args.count, args.dimensions, args.queries, args.k)
+    print(f"HNSW build time: {results['build_seconds']:.2f}s")
+    print(f"\n=== {args.queries} queries, top-{args.k} ===")
+    print(f"Recall@{args.k}: {results['recall']:.4f} (floor {MIN_RECALL})")
+    print(f"Exact matrix latency: p50 {percentile_ms(results['exact_latencies'], 50):.3f} ms, "
+          f"p99 {percentile_ms(results['exact_latencies'], 99):.3f} ms")
+    print(f"HNSW latency: p50 {percentile_ms(results['ann_latencies'], 50):.3f} ms, "
+          f"p99 {percentile_ms(results['ann_latencies'], 99):.3f} ms")
+    assert results["recall"] >= MIN_RECALL, f"HNSW recall@{args.k} is below {MIN_RECALL}"
@@ -9,6 +9,7 @@ from dotenv import load_dotenv
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 from src.helper.process_image_vectors import store_image_vector
 from src.services.image_vector_service import ImageVectorService
+from src.services.embedding_codec import decode_embedding
 from src.db_connector import get_db_instance, close_db_connection
 
 # Load environment variables
@@ -52,7 +53,7 @@ def test_vector_storage():
             print("✓ Document successfully stored in database")
             print(f"  Name: {stored_doc.get('name')}")
             print(f"  Expiration Period: {stored_doc.get('expirationPeriod')} days")
-            print(f"  Embedding dimensions: {len(stored_doc.get('embedding', []))}")
+            print(f"  Embedding dimensions: {len(decode_embedding(stored_doc.get('embedding')))}")
             print(f"  Metadata: {stored_doc.get('metadata')}")
         else:
             print("✗ Document not found in database")
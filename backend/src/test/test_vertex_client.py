@@ -0,0 +1,68 @@
+import os
+import sys
+import time
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+# Add the backend directory to the path so we can import the src package
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..')))
+from src.services.vertex_client import VertexClient
+
+
+class FlakyVertexHandler(BaseHTTPRequestHandler):
+    """Keep-alive stand-in for Vertex AI that answers every `fail_every`-th request with a 503."""
+    protocol_version = "HTTP/1.1"
+    fail_every = 0
+    latency = 0.0
+    calls = 0
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        FlakyVertexHandler.calls += 1
+        time.sleep(self.latency)
+        failing = self.fail_every and FlakyVertexHandler.calls % self.fail_every == 0
+        body = b'{"candidates": [{"content": {"parts": [{"text": "ok"}]}}]}'
+        self.send_response(503 if failing else 200)
+        if failing:
+            self.send_header("Retry-After", "0")
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def test_vertex_client(calls=20, fail_every=5, latency=0.01):
+    """Check retries and connection reuse of the pooled client against a local server."""
+    FlakyVertexHandler.fail_every = fail_every
+    FlakyVertexHandler.latency = latency
+    server = ThreadingHTTPServer(("127.0.0.1", 0), FlakyVertexHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    url = f"http://127.0.0.1:{server.server_port}/v1/models/test:generateContent"
+
+    client = VertexClient(backoff_base=0.01)
+    client.session.mount("http://", client.adapter)  # Production only mounts the pool for https
+
+    start = time.perf_counter()
+    statuses = [client.post(url, json={"contents": []}).status_code for _ in range(calls)]
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    server.shutdown()
+
+    stats = client.stats()
+    print(f"{calls} calls in {elapsed_ms:.0f} ms, statuses: {sorted(set(statuses))}")
+    print(f"Stats: {stats}")
+    assert all(status == 200 for status in statuses), "503s should have been retried"
+    assert stats["connections_opened"] == 1, "keep-alive should reuse a single connection"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Exercise the pooled Vertex AI client against a local flaky server.')
+    parser.add_argument('--calls', type=int, default=20, help='Number of sequential calls')
+    parser.add_argument('--fail-every', type=int, default=5, help='Answer every Nth request with a 503 (0 to disable)')
+    parser.add_argument('--latency', type=float, default=0.01, help='Server latency per request in seconds')
+    args = parser.parse_args()
+
+    test_vertex_client(args.calls, args.fail_every, args.latency)
@@ -2,6 +2,7 @@ import React, { useState, useEffect } from 'react';
 import { InventoryItem } from '../../types';
 import { DeleteConfirmationDialog } from './DeleteConfirmationDialog';
 import { ExpirationAlerts } from './ExpirationAlerts';
+import { getItemImageSrc } from '../../util/imageUtils';
 
 interface InventoryManagementProps {
   inventory: InventoryItem[];
@@ -185,9 +186,9 @@ export const InventoryManagement: React.FC<InventoryManagementProps> = ({
 
                 {/* Item Image */}
                 <div style={{ textAlign: 'center', marginBottom: '15px' }}>
-                  {item.image_data ? (
+                  {getItemImageSrc(item, true) ? (
                     <img
-                      src={`data:image/jpeg;base64,${item.image_data}`}
+                      src={getItemImageSrc(item, true)}
                       alt={item.name}
                       style={{
                         width: '80px',
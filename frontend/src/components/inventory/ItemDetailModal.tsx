@@ -1,7 +1,7 @@
 import React from "react";
 import { InventoryItem } from "../../types";
 import { getCategoryEmoji } from "../../util/foodUtils";
-import { getImageSrc } from "../../util/imageUtils";
+import { getItemImageSrc } from "../../util/imageUtils";
 
 interface ItemDetailModalProps {
   selectedItem: InventoryItem | null;
@@ -36,9 +36,9 @@ export const ItemDetailModal: React.FC<ItemDetailModalProps> = ({
         <button className="close-detail-btn" onClick={onClose}>×</button>
         <div className="detail-card-header">
           <div className="detail-card-icon">
-            {selectedItem.image_data ? (
+            {getItemImageSrc(selectedItem) ? (
               <img
-                src={getImageSrc(selectedItem.image_data)}
+                src={getItemImageSrc(selectedItem)}
                 alt={selectedItem.name}
                 style={{ width: '100%', height: '100%', objectFit: 'cover' }}
               />
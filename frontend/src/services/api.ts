@@ -17,6 +17,9 @@ interface InventoryItem {
   quantity: string;
   expiration_date?: string;
   image_data?: string;
+  image_hash?: string;
+  image_path?: string;
+  thumbnail_path?: string;
 }
 
 interface Recipe {
@@ -40,8 +43,23 @@ interface ExpirationAlerts {
 }
 
 // API functions with proper typing
-export const getInventoryItems = (): Promise<AxiosResponse<InventoryItem[]>> => {
-  return apiClient.get('/inventory/items');
+const INVENTORY_PAGE_SIZE = 200;
+
+// Follows the X-Next-Cursor pages; unchanged pages come back as cheap 304 revalidations
+export const getInventoryItems = async (): Promise<AxiosResponse<InventoryItem[]>> => {
+  let response = await apiClient.get<InventoryItem[]>('/inventory/items', {
+    params: { limit: INVENTORY_PAGE_SIZE },
+  });
+  const items = [...response.data];
+  let cursor = response.headers['x-next-cursor'];
+  while (cursor) {
+    response = await apiClient.get<InventoryItem[]>('/inventory/items', {
+      params: { limit: INVENTORY_PAGE_SIZE, after: cursor },
+    });
+    items.push(...response.data);
+    cursor = response.headers['x-next-cursor'];
+  }
+  return { ...response, data: items };
 };
 
 export const addItemToInventory = (itemData: { name: string; quantity: string }): Promise<AxiosResponse<InventoryItem>> => {
@@ -5,6 +5,9 @@ export interface InventoryItem {
   quantity: string;
   expiration_date?: string;
   image_data?: string;
+  image_hash?: string;
+  image_path?: string;
+  thumbnail_path?: string;
   category?: string;
 }
 
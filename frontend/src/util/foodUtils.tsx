@@ -1,7 +1,7 @@
 // foodUtils.tsx - Utility functions for food-related operations
 
 import { InventoryItem } from '../types';
-import { getImageSrc } from './imageUtils';
+import { getItemImageSrc } from './imageUtils';
 
 // Helper function to get emoji for food category
 export const getCategoryEmoji = (category: string): string => {
@@ -35,10 +35,11 @@ export const getCategoryEmoji = (category: string): string => {
 export const renderFoodIcon = (item: InventoryItem, category?: string) => {
   const categoryToUse = category || item.category || 'Other';
 
-  if (item.image_data) {
+  const imageSrc = getItemImageSrc(item, true);
+  if (imageSrc) {
     return (
       <img
-        src={getImageSrc(item.image_data)}
+        src={imageSrc}
         alt={item.name}
         className="food-image"
         onError={(e) => {
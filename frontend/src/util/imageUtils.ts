@@ -14,4 +14,15 @@ export const getImageSrc = (imageData: string | undefined): string | undefined =
   
   // If it already has the data URL prefix
   return imageData;
-}; 
\ No newline at end of file
+}; 
+const API_URL = import.meta.env.VITE_API_BASE_URL || 'http://localhost:5001';
+
+// Prefer the stored image (served with long-lived caching) over legacy inline data
+export const getItemImageSrc = (
+  item: { image_path?: string; thumbnail_path?: string; image_data?: string },
+  thumbnail = false
+): string | undefined => {
+  const path = thumbnail ? item.thumbnail_path : item.image_path;
+  if (path) return `${API_URL}${path}`;
+  return getImageSrc(item.image_data);
+};